@@ -175,6 +175,17 @@ class GarbageCollectionSubsystem(AppSubsystem):
         #: passed, etc.)
         self.last_actual_collect_time: float | None = None
 
+        #: How many actual :func:`gc.collect()` passes we've done.
+        self.actual_collect_count = 0
+
+        #: Total time spent in actual :func:`gc.collect()` passes
+        #: (seconds).
+        self.actual_collect_duration_total = 0.0
+
+        #: Duration of our most recent actual :func:`gc.collect()` pass
+        #: (seconds).
+        self.last_actual_collect_duration: float | None = None
+
         self._total_num_gc_objects = 0
         self._last_collection_time: float | None = None
         self._showed_standard_mode_warning = False
@@ -332,6 +343,7 @@ class GarbageCollectionSubsystem(AppSubsystem):
         num_affected_objs = gc.collect()
         now2 = self.last_actual_collect_time = time.monotonic()
         duration = now2 - starttime
+        self._note_actual_collect(duration)
         self._total_num_gc_objects += num_affected_objs
 
         if (
@@ -411,6 +423,7 @@ class GarbageCollectionSubsystem(AppSubsystem):
         num_affected_objs = gc.collect()
         now2 = self.last_actual_collect_time = time.monotonic()
         duration = now2 - starttime
+        self._note_actual_collect(duration)
         self._total_num_gc_objects += num_affected_objs
 
         # Just report some general stats on what we collected. The
@@ -429,6 +442,11 @@ class GarbageCollectionSubsystem(AppSubsystem):
             self._total_num_gc_objects,
         )
 
+    def _note_actual_collect(self, duration: float) -> None:
+        self.actual_collect_count += 1
+        self.actual_collect_duration_total += duration
+        self.last_actual_collect_duration = duration
+
     def _apply_mode(self, mode: Mode) -> None:
         cls = type(mode)
         if mode is cls.DISABLED:
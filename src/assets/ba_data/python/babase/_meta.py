@@ -5,19 +5,38 @@
 from __future__ import annotations
 
 import os
+import json
 import time
 import logging
 from pathlib import Path
-from threading import Thread
+from collections import deque
 from functools import partial
+from threading import Thread, Event, Condition
 from typing import TYPE_CHECKING
 from dataclasses import dataclass, field
 
 import _babase
 
+from babase._logging import cachelog, perflog
+
 if TYPE_CHECKING:
-    from typing import Callable
+    from typing import Any, Callable, Iterator
+    from concurrent.futures import Executor, Future
+
+
+# Bump this if the contents of our scan cache change.
+_SCAN_CACHE_VERSION = 1
+
+# Module files are read in batches of this size (individual files are
+# generally small so per-file executor overhead would add up).
+_READ_BATCH_SIZE = 4
+
+# Max read batches we have queued in our executor at once (so we don't
+# flood a shared threadpool with work).
+_MAX_PENDING_READ_BATCHES = 8
 
+# How long loaders will wait for a scan to complete before giving up.
+_SCAN_WAIT_TIMEOUT = 10.0
 
 # Meta export lines can use these names to represent these classes.
 # This is purely a convenience; it is possible to use full class paths
@@ -63,6 +82,11 @@ class MetadataSubsystem:
 
         self._scan_complete_cb: Callable[[], None] | None = None
 
+        # Exports as they are found by the scan (exporttype, classname)
+        # plus a condition for waiting on them and on scanresults.
+        self._found_exports: list[tuple[str, str]] = []
+        self._scan_cond = Condition()
+
     def start_scan(self, scan_complete_cb: Callable[[], None]) -> None:
         """Begin the overall scan.
 
@@ -85,7 +109,10 @@ class MetadataSubsystem:
                     env.python_directory_user,
                 ]
                 if path is not None
-            ]
+            ],
+            cache_path=os.path.join(env.cache_directory, 'metascan.json'),
+            executor=_babase.app.threadpool,
+            export_found_cb=self._on_export_found,
         )
 
         Thread(target=self._run_scan_in_bg).start()
@@ -108,6 +135,8 @@ class MetadataSubsystem:
         cls: type[T],
         completion_cb: Callable[[list[type[T]]], None],
         completion_cb_in_bg_thread: bool = False,
+        *,
+        found_cb: Callable[[type[T]], None] | None = None,
     ) -> None:
         """High level function to load meta-exported classes.
 
@@ -118,6 +147,11 @@ class MetadataSubsystem:
         regardless.
         To run the completion callback directly in the bg thread where the
         loading work happens, pass ``completion_cb_in_bg_thread=True``.
+
+        Classes are loaded as the scan finds them, so loading overlaps
+        with scanning. To be handed each class as soon as it is loaded,
+        pass ``found_cb`` (which is called in the same thread as the
+        completion callback).
         """
         Thread(
             target=partial(
@@ -126,6 +160,7 @@ class MetadataSubsystem:
                 cls,
                 completion_cb,
                 completion_cb_in_bg_thread,
+                found_cb,
             )
         ).start()
 
@@ -135,51 +170,72 @@ class MetadataSubsystem:
         cls: type[T],
         completion_cb: Callable[[list[type[T]]], None],
         completion_cb_in_bg_thread: bool,
+        found_cb: Callable[[type[T]], None] | None,
     ) -> None:
+        # pylint: disable=too-many-positional-arguments
         from babase._general import getclass
 
-        classes: list[type[T]] = []
+        loaded: list[tuple[str, type[T]]] = []
         try:
-            # classnames = self._wait_for_scan_results().exports_of_class(cls)
-            classnames = self._wait_for_scan_results().exports.get(
-                exportname, []
-            )
-            for classname in classnames:
+            for classname in self._iter_exports(exportname):
                 try:
-                    classes.append(getclass(classname, cls))
+                    loadedcls = getclass(classname, cls)
                 except Exception:
                     logging.exception('error importing %s', classname)
+                    continue
+                loaded.append((classname, loadedcls))
+                if found_cb is not None:
+                    found_call = partial(found_cb, loadedcls)
+                    if completion_cb_in_bg_thread:
+                        found_call()
+                    else:
+                        _babase.pushcall(found_call, from_other_thread=True)
 
         except Exception:
             logging.exception('Error loading exported classes.')
 
-        completion_call = partial(completion_cb, classes)
+        # Provide results in the same (sorted) order as scan results.
+        loaded.sort(key=lambda l: l[0])
+        completion_call = partial(completion_cb, [l[1] for l in loaded])
         if completion_cb_in_bg_thread:
             completion_call()
         else:
             _babase.pushcall(completion_call, from_other_thread=True)
 
-    def _wait_for_scan_results(self) -> ScanResults:
-        """Return scan results, blocking if the scan is not yet complete."""
-        if self.scanresults is None:
-            if _babase.in_logic_thread():
-                logging.warning(
-                    'babase.meta._wait_for_scan_results()'
-                    ' called in logic thread before scan completed;'
-                    ' this can cause hitches.'
-                )
+    def _on_export_found(self, exporttype: str, classname: str) -> None:
+        """Called by our scan (in its thread) for each export found."""
+        with self._scan_cond:
+            self._found_exports.append((exporttype, classname))
+            self._scan_cond.notify_all()
 
-            # Now wait a bit for the scan to complete. Eventually error
-            # though if it doesn't.
-            starttime = time.time()
-            while self.scanresults is None:
-                time.sleep(0.05)
-                if time.time() - starttime > 10.0:
-                    raise TimeoutError(
-                        'timeout waiting for meta scan to complete.'
-                    )
+    def _iter_exports(self, exportname: str) -> Iterator[str]:
+        """Yield class names for an export as the scan finds them.
+
+        Blocks until the scan completes.
+        """
+        index = 0
+        deadline = time.monotonic() + _SCAN_WAIT_TIMEOUT
+        while True:
+            with self._scan_cond:
+                while (
+                    index >= len(self._found_exports)
+                    and self.scanresults is None
+                ):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0.0:
+                        raise TimeoutError(
+                            'timeout waiting for meta scan to complete.'
+                        )
+                    self._scan_cond.wait(remaining)
+                found = self._found_exports[index:]
+                index = len(self._found_exports)
+                done = self.scanresults is not None
 
-        return self.scanresults
+            for exporttype, classname in found:
+                if exporttype == exportname:
+                    yield classname
+            if done:
+                return
 
     def _run_scan_in_bg(self) -> None:
         """Runs a scan (for use in background thread)."""
@@ -192,8 +248,11 @@ class MetadataSubsystem:
             logging.exception('metascan: Error running scan in bg.')
             results = ScanResults(announce_errors_occurred=True)
 
-        # Place results and tell the logic thread they're ready.
-        self.scanresults = results
+        # Place results and tell the logic thread (and anyone waiting on
+        # them) they're ready.
+        with self._scan_cond:
+            self.scanresults = results
+            self._scan_cond.notify_all()
         _babase.pushcall(self._handle_scan_results, from_other_thread=True)
 
     def _handle_scan_results(self) -> None:
@@ -252,11 +311,25 @@ class MetadataSubsystem:
 class DirectoryScan:
     """Scans directories for metadata."""
 
-    def __init__(self, paths: list[str]):
+    def __init__(
+        self,
+        paths: list[str],
+        cache_path: str | None = None,
+        executor: Executor | None = None,
+        export_found_cb: Callable[[str, str], None] | None = None,
+    ):
         """Given one or more paths, parses available meta information.
 
         It is assumed that these paths are also in PYTHONPATH.
         It is also assumed that any subdirectories are Python packages.
+
+        If cache_path is provided, meta lines found in each module are
+        stored there (keyed by path, mtime, and size) so that unchanged
+        modules can skip being read on subsequent scans.
+
+        If executor is provided, module files are read in parallel using
+        it. If export_found_cb is provided, it is called with the type
+        and class name of each export as it is found.
         """
 
         # Skip non-existent paths completely.
@@ -264,24 +337,45 @@ class DirectoryScan:
         self.extra_paths: list[Path] = []
         self.extra_paths_set = False
         self.results = ScanResults()
+        self.cache_path = cache_path
+        self._extra_paths_event = Event()
+        self._executor = executor
+        self._export_found_cb = export_found_cb
+
+        # Module files waiting to be read, in the order we'll process
+        # them, and reads in progress.
+        self._read_queue = deque[Path]()
+        self._reads: dict[Path, Future[dict[Path, Any]]] = {}
+        self._read_batch_remaining: dict[Future[dict[Path, Any]], int] = {}
+        self._first_export_time: float | None = None
+
+        # Cache entries loaded from disk and ones for modules seen
+        # during this scan (which is what we write back out).
+        self._cache_in: dict[str, list[Any]] = {}
+        self._cache_out: dict[str, list[Any]] = {}
+        self._cache_hits = 0
+        self._cache_misses = 0
 
     def set_extras(self, paths: list[str]) -> None:
         """Set extra portion."""
         # Skip non-existent paths completely.
         self.extra_paths += [Path(p) for p in paths if os.path.isdir(p)]
         self.extra_paths_set = True
+        self._extra_paths_event.set()
 
     def run(self) -> None:
         """Do the thing."""
+        starttime = time.monotonic()
+        self._load_cache()
         for pathlist in [self.base_paths, self.extra_paths]:
-            # Spin and wait until extra paths are provided before doing them.
+            # Wait until extra paths are provided before doing them.
             if pathlist is self.extra_paths:
-                while not self.extra_paths_set:
-                    time.sleep(0.001)
+                self._extra_paths_event.wait()
 
             modules: list[tuple[Path, Path]] = []
             for path in pathlist:
                 self._get_path_module_entries(path, '', modules)
+            self._queue_reads(modules)
             for moduledir, subpath in modules:
                 try:
                     self._scan_module(moduledir, subpath)
@@ -292,6 +386,206 @@ class DirectoryScan:
         for exportlist in self.results.exports.values():
             exportlist.sort()
 
+        self._save_cache()
+        perflog.info(
+            'metascan: scanned %d modules (%d from cache) in %.1fms'
+            ' (first export found at %s).',
+            self._cache_hits + self._cache_misses,
+            self._cache_hits,
+            (time.monotonic() - starttime) * 1000.0,
+            (
+                'n/a'
+                if self._first_export_time is None
+                else f'{(self._first_export_time - starttime) * 1000.0:.1f}ms'
+            ),
+        )
+
+    def _load_cache(self) -> None:
+        """Load existing scan results from disk (if any)."""
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, encoding='utf-8') as infile:
+                cache = json.load(infile)
+            if (
+                cache.get('v') == _SCAN_CACHE_VERSION
+                and cache.get('api') == _babase.app.env.api_version
+            ):
+                self._cache_in = cache['files']
+            else:
+                cachelog.debug('metascan: ignoring outdated scan cache.')
+        except Exception:
+            # A bad cache just means a slower scan.
+            cachelog.warning(
+                'metascan: error loading scan cache.', exc_info=True
+            )
+
+    def _save_cache(self) -> None:
+        """Write our scan results to disk (if anything changed)."""
+        if self.cache_path is None or self._cache_out == self._cache_in:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmppath = f'{self.cache_path}.tmp'
+            with open(tmppath, 'w', encoding='utf-8') as outfile:
+                json.dump(
+                    {
+                        'v': _SCAN_CACHE_VERSION,
+                        'api': _babase.app.env.api_version,
+                        'files': self._cache_out,
+                    },
+                    outfile,
+                    separators=(',', ':'),
+                )
+            os.replace(tmppath, self.cache_path)
+        except Exception:
+            cachelog.warning(
+                'metascan: error saving scan cache.', exc_info=True
+            )
+
+    def _queue_reads(
+        self, modules: list[tuple[Path, Path]], front: bool = False
+    ) -> None:
+        """Queue module files for reading ahead of processing them.
+
+        Files must be queued in the order they will be processed.
+        """
+        if self._executor is None:
+            return
+        fpaths = [
+            self._module_file_path(moduledir, subpath)
+            for moduledir, subpath in modules
+        ]
+        if front:
+            self._read_queue.extendleft(reversed(fpaths))
+        else:
+            self._read_queue.extend(fpaths)
+        self._pump_reads()
+
+    def _pump_reads(self) -> None:
+        """Keep our executor busy reading queued module files."""
+        assert self._executor is not None
+        while (
+            self._read_queue
+            and len(self._read_batch_remaining) < _MAX_PENDING_READ_BATCHES
+        ):
+            batch = [
+                self._read_queue.popleft()
+                for _ in range(min(_READ_BATCH_SIZE, len(self._read_queue)))
+            ]
+            future = self._executor.submit(self._read_module_metas, batch)
+            self._read_batch_remaining[future] = len(batch)
+            for fpath in batch:
+                self._reads[fpath] = future
+
+    def _take_read(self, fpath: Path) -> Future[dict[Path, Any]] | None:
+        """Pull the read for a file (if there is one)."""
+        future = self._reads.pop(fpath, None)
+        if future is not None:
+            self._read_batch_remaining[future] -= 1
+            if not self._read_batch_remaining[future]:
+                del self._read_batch_remaining[future]
+                self._pump_reads()
+        return future
+
+    def _drop_reads(self, modules: list[tuple[Path, Path]]) -> None:
+        """Forget any reads for modules we won't be processing."""
+        if self._executor is None:
+            return
+        for moduledir, subpath in modules:
+            fpath = self._module_file_path(moduledir, subpath)
+            if self._take_read(fpath) is None:
+                try:
+                    self._read_queue.remove(fpath)
+                except ValueError:
+                    pass
+
+    def _module_file_path(self, moduledir: Path, subpath: Path) -> Path:
+        if subpath.name.endswith('.py'):
+            return Path(moduledir, subpath)
+        return Path(moduledir, subpath, '__init__.py')
+
+    def _get_module_meta(
+        self, fpath: Path
+    ) -> tuple[dict[int, list[str]], dict[int, str | None]]:
+        """Return meta lines and export class names for a module file."""
+        future = self._take_read(fpath)
+        if future is None:
+            # Not read ahead; just do it ourself.
+            if self._read_queue and self._read_queue[0] == fpath:
+                self._read_queue.popleft()
+            entry, from_cache = self._read_module_meta(fpath)
+        else:
+            result = future.result()[fpath]
+            if isinstance(result, Exception):
+                raise result
+            entry, from_cache = result
+
+        if from_cache:
+            self._cache_hits += 1
+        else:
+            self._cache_misses += 1
+        self._cache_out[str(fpath)] = entry
+        meta_lines: dict[int, list[str]] = {}
+        export_class_names: dict[int, str | None] = {}
+        for lnum, tokens, classname in entry[2]:
+            meta_lines[lnum] = tokens
+            export_class_names[lnum] = classname
+        return meta_lines, export_class_names
+
+    def _read_module_metas(self, fpaths: list[Path]) -> dict[Path, Any]:
+        """Read a batch of module files (generally in another thread).
+
+        Returns results from _read_module_meta() or errors by path.
+        """
+        results: dict[Path, Any] = {}
+        for fpath in fpaths:
+            try:
+                results[fpath] = self._read_module_meta(fpath)
+            except Exception as exc:
+                results[fpath] = exc
+        return results
+
+    def _read_module_meta(self, fpath: Path) -> tuple[list[Any], bool]:
+        """Return a cache entry for a module file and whether it was cached.
+
+        Uses cached values when the file is unchanged since they were
+        stored; otherwise reads the file. This may be run in any thread.
+        """
+        stat = fpath.stat()
+        entry = self._cache_in.get(str(fpath))
+        if (
+            entry is None
+            or entry[0] != stat.st_mtime_ns
+            or entry[1] != stat.st_size
+        ):
+            with fpath.open(encoding='utf-8') as infile:
+                flines = infile.readlines()
+            metas: list[list[Any]] = []
+            for lnum, line in enumerate(flines):
+                # Do a simple 'in' check for speed but then make sure
+                # its also at the beginning of the line. This allows
+                # disabling meta-lines and avoids false positives from
+                # code that wrangles them.
+                if '# ba_meta' not in line or not line.strip().startswith(
+                    '# ba_meta '
+                ):
+                    continue
+                tokens = line[1:].split()
+
+                # Export lines also need the name of the class below
+                # them (which is why we can't just cache tokens).
+                classname = (
+                    self._get_export_class_name(flines, lnum)
+                    if len(tokens) == 3
+                    and tokens[0] == 'ba_meta'
+                    and tokens[1] == 'export'
+                    else None
+                )
+                metas.append([lnum, tokens, classname])
+            return [stat.st_mtime_ns, stat.st_size, metas], False
+        return entry, True
+
     def _get_path_module_entries(
         self, path: Path, subpath: str | Path, modules: list[tuple[Path, Path]]
     ) -> None:
@@ -325,23 +619,10 @@ class DirectoryScan:
 
     def _scan_module(self, moduledir: Path, subpath: Path) -> None:
         """Scan an individual module and add the findings to results."""
-        if subpath.name.endswith('.py'):
-            fpath = Path(moduledir, subpath)
-            ispackage = False
-        else:
-            fpath = Path(moduledir, subpath, '__init__.py')
-            ispackage = True
-        with fpath.open(encoding='utf-8') as infile:
-            flines = infile.readlines()
-        meta_lines = {
-            lnum: l[1:].split()
-            for lnum, l in enumerate(flines)
-            # Do a simple 'in' check for speed but then make sure its
-            # also at the beginning of the line. This allows disabling
-            # meta-lines and avoids false positives from code that
-            # wrangles them.
-            if ('# ba_meta' in l and l.strip().startswith('# ba_meta '))
-        }
+        ispackage = not subpath.name.endswith('.py')
+        meta_lines, export_class_names = self._get_module_meta(
+            self._module_file_path(moduledir, subpath)
+        )
         is_top_level = len(subpath.parts) <= 1
         required_api = self._get_api_requirement(
             subpath, meta_lines, is_top_level
@@ -370,18 +651,24 @@ class DirectoryScan:
             return
 
         # Ok; can proceed with a full scan of this module.
-        self._process_module_meta_tags(subpath, flines, meta_lines)
+        self._process_module_meta_tags(subpath, meta_lines, export_class_names)
 
         # If its a package, recurse into its subpackages.
         if ispackage:
+            submodules: list[tuple[Path, Path]] = []
             try:
-                submodules: list[tuple[Path, Path]] = []
                 self._get_path_module_entries(moduledir, subpath, submodules)
+                submodules = [
+                    s for s in submodules if s[1].name != '__init__.py'
+                ]
+                # These get processed next; read them before anything
+                # else we've got queued.
+                self._queue_reads(submodules, front=True)
                 for submodule in submodules:
-                    if submodule[1].name != '__init__.py':
-                        self._scan_module(submodule[0], submodule[1])
+                    self._scan_module(submodule[0], submodule[1])
             except Exception:
                 logging.exception('metascan: Error scanning %s.', subpath)
+                self._drop_reads(submodules)
 
     def _module_name_for_subpath(self, subpath: Path) -> str:
         # (should not be getting these)
@@ -390,7 +677,10 @@ class DirectoryScan:
         return '.'.join(subpath.parts).removesuffix('.py')
 
     def _process_module_meta_tags(
-        self, subpath: Path, flines: list[str], meta_lines: dict[int, list[str]]
+        self,
+        subpath: Path,
+        meta_lines: dict[int, list[str]],
+        export_class_names: dict[int, str | None],
     ) -> None:
         """Pull data from a module based on its ba_meta tags."""
         for lindex, mline in meta_lines.items():
@@ -425,10 +715,16 @@ class DirectoryScan:
                 # Looks like we've got a valid export line!
                 modulename = self._module_name_for_subpath(subpath)
                 exporttypestr = mline[2]
-                export_class_name = self._get_export_class_name(
-                    subpath, flines, lindex
-                )
-                if export_class_name is not None:
+                export_class_name = export_class_names.get(lindex)
+                if export_class_name is None:
+                    logging.warning(
+                        'metascan: %s:%d: class definition not found below'
+                        " 'ba_meta export' statement.",
+                        subpath,
+                        lindex + 1,
+                    )
+                    self.results.announce_errors_occurred = True
+                else:
                     classname = modulename + '.' + export_class_name
 
                     # Migrating away from the 'plugin' name shortcut;
@@ -461,15 +757,19 @@ class DirectoryScan:
                     exporttype = EXPORT_CLASS_NAME_SHORTCUTS.get(exporttypestr)
                     if exporttype is None:
                         exporttype = exporttypestr
-                    self.results.exports.setdefault(exporttype, []).append(
-                        classname
-                    )
+                    self._add_export(exporttype, classname)
+
+    def _add_export(self, exporttype: str, classname: str) -> None:
+        self.results.exports.setdefault(exporttype, []).append(classname)
+        if self._first_export_time is None:
+            self._first_export_time = time.monotonic()
+        if self._export_found_cb is not None:
+            self._export_found_cb(exporttype, classname)
 
     def _get_export_class_name(
-        self, subpath: Path, lines: list[str], lindex: int
+        self, lines: list[str], lindex: int
     ) -> str | None:
         """Given line num of an export tag, returns its operand class name."""
-        lindexorig = lindex
         classname = None
         while True:
             lindex += 1
@@ -485,14 +785,6 @@ class DirectoryScan:
                 if len(cbits) > 1 and cbits[0].isidentifier():
                     classname = cbits[0]
                     break  # Success!
-        if classname is None:
-            logging.warning(
-                'metascan: %s:%d: class definition not found below'
-                " 'ba_meta export' statement.",
-                subpath,
-                lindexorig + 1,
-            )
-            self.results.announce_errors_occurred = True
         return classname
 
     def _get_api_requirement(
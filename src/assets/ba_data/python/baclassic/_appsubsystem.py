@@ -5,6 +5,7 @@
 """Provides classic app subsystem."""
 from __future__ import annotations
 
+import os
 import random
 import logging
 import weakref
@@ -33,7 +34,10 @@ if TYPE_CHECKING:
     from bascenev1lib.actor import spazappearance
     from bauiv1lib.party import PartyWindow
 
-    from baclassic._servermode import ServerController
+    from baclassic._servermode import (
+        ServerController,
+        ServerControlChannel,
+    )
     from baclassic._net import MasterServerCallback
 
 
@@ -93,6 +97,7 @@ class ClassicAppSubsystem(babase.AppSubsystem):
 
         # Server Mode.
         self.server: ServerController | None = None
+        self.server_control: ServerControlChannel | None = None
 
         self.log_have_new = False
         self.log_upload_timer_started = False
@@ -236,6 +241,14 @@ class ClassicAppSubsystem(babase.AppSubsystem):
 
         self.accounts.on_app_loading()
 
+        # If we're being run by a server manager that gave us a control
+        # channel, start listening for its commands.
+        control_fd = os.environ.get('BA_SERVER_CONTROL_FD')
+        if control_fd is not None:
+            from baclassic._servermode import ServerControlChannel
+
+            self.server_control = ServerControlChannel(int(control_fd))
+
     @override
     def on_app_suspend(self) -> None:
         self.accounts.on_app_suspend()
@@ -5,10 +5,16 @@ from __future__ import annotations
 
 import sys
 import time
+import socket
+import asyncio
 import logging
+import threading
 from typing import TYPE_CHECKING
 
+from efro.rpc import RPCEndpoint
+from efro.error import CommunicationError
 from efro.terminal import Clr
+from efro.message import MessageSender, MessageReceiver, BoolResponse
 from bacommon.servermanager import (
     ServerCommand,
     StartServerModeCommand,
@@ -17,19 +23,27 @@ from bacommon.servermanager import (
     ChatMessageCommand,
     ScreenMessageCommand,
     ClientListCommand,
+    ClientListResponse,
+    ClientInfo,
     KickCommand,
+    StatusCommand,
+    StatusResponse,
+    ServerMetrics,
+    ServerMetricsMessage,
+    get_server_control_protocol,
 )
 import babase
 import bascenev1
 
 if TYPE_CHECKING:
-    from typing import Any
+    from typing import Any, Callable, Awaitable
 
     from bacommon.servermanager import ServerConfig
 
 
 def _cmd(command_data: bytes) -> None:
     """Handle commands coming in from our server manager parent process."""
+    # pylint: disable=too-many-return-statements
     import pickle
 
     assert babase.app.classic is not None
@@ -80,15 +94,180 @@ def _cmd(command_data: bytes) -> None:
         )
         return
 
+    if isinstance(command, StatusCommand):
+        assert babase.app.classic.server is not None
+        babase.app.classic.server.print_status()
+        return
+
     print(
         f'{Clr.SRED}ERROR: server process'
         f' got unknown command: {type(command)}{Clr.RST}'
     )
 
 
+class ServerControlChannel:
+    """Handles commands from our server manager over a control channel.
+
+    The channel runs in its own thread so that round trips don't have
+    to wait on the logic thread's event loop; commands themselves are
+    handed off to the logic thread as they arrive.
+    """
+
+    _sender = MessageSender(get_server_control_protocol())
+
+    def __init__(self, fd: int) -> None:
+        self._sock = socket.socket(fileno=fd)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._endpoint: RPCEndpoint | None = None
+        self._send_tasks: set[asyncio.Task] = set()
+        self._receiver = MessageReceiver(get_server_control_protocol())
+        handlers: list[Callable[..., Any]] = [
+            ServerControlChannel._handle_start_server_mode,
+            ServerControlChannel._handle_shutdown,
+            ServerControlChannel._handle_chat_message,
+            ServerControlChannel._handle_screen_message,
+            ServerControlChannel._handle_client_list,
+            ServerControlChannel._handle_kick,
+            ServerControlChannel._handle_status,
+        ]
+        for handler in handlers:
+            self._receiver.register_handler(handler)
+        self._thread = threading.Thread(
+            target=self._thread_main, name='ba-server-control', daemon=True
+        )
+        self._thread.start()
+
+    def _thread_main(self) -> None:
+        try:
+            asyncio.run(self._run())
+        except Exception:
+            logging.exception('Error in server control channel.')
+
+    def send_metrics(self, metrics: ServerMetrics) -> None:
+        """Send a metrics snapshot to our server manager.
+
+        Can be called from any thread. Snapshots are dropped if we are
+        not connected.
+        """
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(
+                self._send_message, ServerMetricsMessage(metrics)
+            )
+
+    async def _run(self) -> None:
+        reader, writer = await asyncio.open_connection(sock=self._sock)
+        self._endpoint = RPCEndpoint(
+            self._handle_raw_message, reader, writer, 'server_control'
+        )
+        self._loop = asyncio.get_running_loop()
+        await self._endpoint.run()
+        self._loop = None
+        logging.warning('Server control channel closed.')
+
+    def _send_message(self, message: ServerMetricsMessage) -> None:
+        if self._endpoint is None or self._endpoint.is_closing():
+            return
+        task = asyncio.create_task(
+            self._finish_send(self._sender.send_async(self, message))
+        )
+        self._send_tasks.add(task)
+        task.add_done_callback(self._send_tasks.discard)
+
+    async def _finish_send(self, response: Awaitable[Any]) -> None:
+        try:
+            await response
+        except CommunicationError:
+            pass
+        except Exception:
+            logging.exception('Error sending server control message.')
+
+    @_sender.send_async_method
+    def _send_raw_message(self, message: str) -> Awaitable[str]:
+        assert self._endpoint is not None
+        return self._decode_response(
+            self._endpoint.send_message(message.encode())
+        )
+
+    @staticmethod
+    async def _decode_response(response: Awaitable[bytes]) -> str:
+        return (await response).decode()
+
+    async def _handle_raw_message(self, message: bytes) -> bytes:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[str] = loop.create_future()
+
+        def _handle_in_logic_thread() -> None:
+            response = self._receiver.handle_raw_message(self, message.decode())
+            loop.call_soon_threadsafe(future.set_result, response)
+
+        babase.pushcall(_handle_in_logic_thread, from_other_thread=True)
+        return (await future).encode()
+
+    @staticmethod
+    def _server() -> ServerController:
+        assert babase.app.classic is not None
+        server = babase.app.classic.server
+        if server is None:
+            raise RuntimeError('Server mode has not been started.')
+        return server
+
+    def _handle_start_server_mode(self, msg: StartServerModeCommand) -> None:
+        assert babase.app.classic is not None
+        if babase.app.classic.server is not None:
+            raise RuntimeError('Server mode has already been started.')
+        babase.app.classic.server = ServerController(msg.config)
+
+    def _handle_shutdown(self, msg: ShutdownCommand) -> None:
+        self._server().shutdown(reason=msg.reason, immediate=msg.immediate)
+
+    def _handle_chat_message(self, msg: ChatMessageCommand) -> None:
+        self._server()
+        bascenev1.chatmessage(msg.message, clients=msg.clients)
+
+    def _handle_screen_message(self, msg: ScreenMessageCommand) -> None:
+        self._server()
+        bascenev1.broadcastmessage(
+            msg.message,
+            color=msg.color,
+            clients=msg.clients,
+            transient=msg.clients is not None,
+        )
+
+    def _handle_client_list(self, msg: ClientListCommand) -> ClientListResponse:
+        del msg  # Unused.
+        return ClientListResponse(clients=self._server().get_client_list())
+
+    def _handle_kick(self, msg: KickCommand) -> BoolResponse:
+        return BoolResponse(
+            value=self._server().kick(
+                client_id=msg.client_id, ban_time=msg.ban_time
+            )
+        )
+
+    def _handle_status(self, msg: StatusCommand) -> StatusResponse:
+        del msg  # Unused.
+        assert babase.app.classic is not None
+        server = babase.app.classic.server
+        if server is not None:
+            return server.get_status()
+        return StatusResponse(
+            server_mode=False,
+            session_type=None,
+            activity_type=None,
+            client_count=0,
+            player_count=0,
+            shutdown_pending=False,
+        )
+
+
 class ServerController:
     """Overall controller for the app in server mode."""
 
+    #: How often we send metrics snapshots to our server manager (when
+    #: we have a control channel to it).
+    METRICS_INTERVAL = 5.0
+
     def __init__(self, config: ServerConfig) -> None:
         self._config = config
         self._playlist_name = '__default__'
@@ -99,6 +278,7 @@ class ServerController:
         self._first_run = True
         self._shutdown_reason: ShutdownReason | None = None
         self._executing_shutdown = False
+        self._metrics_timer: babase.AppTimer | None = None
 
         # Make note if they want us to import a playlist; we'll need to
         # do that first if so.
@@ -115,11 +295,101 @@ class ServerController:
                 0.25, self._prepare_to_serve, repeat=True
             )
 
-    def print_client_list(self) -> None:
-        """Print info about all connected clients."""
+        # If we can talk to our server manager, keep it informed.
+        assert babase.app.classic is not None
+        if babase.app.classic.server_control is not None:
+            with babase.ContextRef.empty():
+                self._metrics_timer = babase.AppTimer(
+                    self.METRICS_INTERVAL, self._send_metrics, repeat=True
+                )
+
+    def get_client_list(self) -> list[ClientInfo]:
+        """Return info about all connected clients."""
         import json
 
-        roster = bascenev1.get_game_roster()
+        clients: list[ClientInfo] = []
+        for client in bascenev1.get_game_roster():
+            if client['client_id'] == -1:
+                continue
+            spec = json.loads(client['spec_string'])
+            clients.append(
+                ClientInfo(
+                    client_id=client['client_id'],
+                    account_name=spec['n'],
+                    players=[n['name'] for n in client['players']],
+                )
+            )
+        return clients
+
+    def get_status(self) -> StatusResponse:
+        """Return the current state of the server."""
+        session = bascenev1.get_foreground_host_session()
+        activity = bascenev1.get_foreground_host_activity()
+        clients = self.get_client_list()
+        return StatusResponse(
+            server_mode=True,
+            session_type=(
+                None if session is None else babase.get_type_name(type(session))
+            ),
+            activity_type=(
+                None
+                if activity is None
+                else babase.get_type_name(type(activity))
+            ),
+            client_count=len(clients),
+            player_count=sum(len(c.players) for c in clients),
+            shutdown_pending=self._shutdown_reason is not None,
+        )
+
+    def get_metrics(self) -> ServerMetrics:
+        """Return a metrics snapshot for the server.
+
+        Logic step stats cover the time since the last call.
+        """
+        status = self.get_status()
+        gcsys = babase.app.gc
+        netstats = bascenev1.get_client_net_stats()
+        stepstats = bascenev1.get_logic_step_stats()
+        stepcount = stepstats['count']
+        metrics = ServerMetrics(
+            session_type=status.session_type,
+            activity_type=status.activity_type,
+            client_count=status.client_count,
+            player_count=status.player_count,
+            logic_step_count=stepcount,
+            logic_step_duration_mean=(
+                0.0
+                if stepcount == 0
+                else stepstats['duration_total'] / stepcount
+            ),
+            logic_step_duration_max=stepstats['duration_max'],
+            gc_pass_count=gcsys.actual_collect_count,
+            gc_pass_duration_total=gcsys.actual_collect_duration_total,
+            gc_pass_duration_last=gcsys.last_actual_collect_duration,
+            net_bytes_in=sum(s['bytes_in'] for s in netstats),
+            net_bytes_out=sum(s['bytes_out'] for s in netstats),
+            net_bytes_resent=sum(s['bytes_resent'] for s in netstats),
+            net_ping_max=max((s['ping'] for s in netstats), default=None),
+        )
+        return metrics
+
+    def print_status(self) -> None:
+        """Print the current state of the server."""
+        status = self.get_status()
+        print(
+            f'{status.client_count} client(s),'
+            f' {status.player_count} player(s),'
+            f' session {status.session_type},'
+            f' activity {status.activity_type}'
+            + (
+                ' (exiting at next clean opportunity)'
+                if status.shutdown_pending
+                else ''
+            )
+        )
+
+    def print_client_list(self) -> None:
+        """Print info about all connected clients."""
         title1 = 'Client ID'
         title2 = 'Account Name'
         title3 = 'Players'
@@ -130,29 +400,28 @@ class ServerController:
             f'{title1:<{col1}} {title2:<{col2}} {title3}'
             f'{Clr.RST}'
         )
-        for client in roster:
-            if client['client_id'] == -1:
-                continue
-            spec = json.loads(client['spec_string'])
-            name = spec['n']
-            players = ', '.join(n['name'] for n in client['players'])
-            clientid = client['client_id']
-            out += f'\n{clientid:<{col1}} {name:<{col2}} {players}'
+        for client in self.get_client_list():
+            name = client.account_name
+            players = ', '.join(client.players)
+            out += f'\n{client.client_id:<{col1}} {name:<{col2}} {players}'
         print(out)
 
-    def kick(self, client_id: int, ban_time: int | None) -> None:
+    def kick(self, client_id: int, ban_time: int | None) -> bool:
         """Kick the provided client id.
 
         ban_time is provided in seconds.
         If ban_time is None, ban duration will be determined automatically.
         Pass 0 or a negative number for no ban time.
+        Returns whether the client was found and disconnected.
         """
 
         # FIXME: this case should be handled under the hood.
         if ban_time is None:
             ban_time = 300
 
-        bascenev1.disconnect_client(client_id=client_id, ban_time=ban_time)
+        return bascenev1.disconnect_client(
+            client_id=client_id, ban_time=ban_time
+        )
 
     def shutdown(self, reason: ShutdownReason, immediate: bool) -> None:
         """Set the app to quit either now or at the next clean opportunity."""
@@ -206,6 +475,12 @@ class ServerController:
         with babase.ContextRef.empty():
             babase.apptimer(2.0, babase.quit)
 
+    def _send_metrics(self) -> None:
+        assert babase.app.classic is not None
+        server_control = babase.app.classic.server_control
+        if server_control is not None:
+            server_control.send_metrics(self.get_metrics())
+
     def _run_access_check(self) -> None:
         """Check with the master server to see if we're likely joinable."""
         assert babase.app.classic is not None
@@ -86,6 +86,7 @@ from _bascenev1 import (
     emitfx,
     end_host_scanning,
     get_chat_messages,
+    get_client_net_stats,
     get_connection_to_host_info,
     get_connection_to_host_info_2,
     get_foreground_host_activity,
@@ -93,6 +94,7 @@ from _bascenev1 import (
     get_game_port,
     get_game_roster,
     get_local_active_input_devices_count,
+    get_logic_step_stats,
     get_public_party_enabled,
     get_public_party_max_size,
     get_random_names,
@@ -329,6 +331,7 @@ __all__ = [
     'GameResults',
     'GameTip',
     'get_chat_messages',
+    'get_client_net_stats',
     'get_connection_to_host_info',
     'get_connection_to_host_info_2',
     'get_default_free_for_all_playlist',
@@ -341,6 +344,7 @@ __all__ = [
     'get_game_roster',
     'get_game_roster',
     'get_local_active_input_devices_count',
+    'get_logic_step_stats',
     'get_map_class',
     'get_map_display_string',
     'get_player_colors',
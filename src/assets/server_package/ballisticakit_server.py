@@ -9,12 +9,17 @@ import os
 import sys
 import time
 import json
+import shutil
 import signal
+import socket
+import asyncio
 import tomllib
 import logging
-import subprocess
 from pathlib import Path
-from threading import Lock, Thread, current_thread
+from functools import partial
+from dataclasses import dataclass
+from concurrent.futures import Future
+from threading import Thread, current_thread
 from typing import TYPE_CHECKING
 
 # We make use of the bacommon and efro packages as well as site-packages
@@ -25,19 +30,76 @@ sys.path += [
     str(Path(Path(__file__).parent, 'dist', 'ba_data', 'python-site-packages')),
 ]
 
-from bacommon.servermanager import ServerConfig, StartServerModeCommand
-from efro.dataclassio import dataclass_from_dict, dataclass_validate
+from bacommon.servermanager import (
+    ServerConfig,
+    StartServerModeCommand,
+    FleetConfig,
+    RestartPolicy,
+    get_server_control_protocol,
+)
+
+# Types taken by our message handlers need to be available at runtime
+# for handler registration. pylint: disable=unused-import
+from bacommon.servermanager import ServerMetricsMessage
+
+# pylint: enable=unused-import
+from efro.dataclassio import (
+    dataclass_from_dict,
+    dataclass_to_dict,
+    dataclass_validate,
+)
+from efro.rpc import RPCEndpoint
 from efro.error import CleanError
+from efro.message import MessageSender, MessageReceiver
 from efro.terminal import Clr
 
 if TYPE_CHECKING:
     from types import FrameType
-    from bacommon.servermanager import ServerCommand
-
-VERSION_STR = '1.3.5'
+    from typing import Any, Callable, Awaitable
+    from efro.message import Response
+    from bacommon.servermanager import (
+        ServerCommand,
+        FleetInstanceConfig,
+        ClientInfo,
+        StatusResponse,
+        ServerMetrics,
+    )
+
+VERSION_STR = '1.6.0'
+
+# Whether we can give server subprocesses a socket to receive commands
+# through. Elsewhere we fall back to exec'ing commands through stdin,
+# in which case no responses are available.
+CONTROL_CHANNEL_SUPPORTED = os.name != 'nt'
 
 # Version history:
 #
+# 1.6.0
+#
+#  - Servers now send periodic metrics snapshots to the manager (player
+#    counts, session/activity, logic step timing, gc passes, and network
+#    traffic). These can be served to scrapers in Prometheus text format
+#    with --metrics-port and are available via mgr.get_metrics_text().
+#
+# 1.5.0
+#
+#  - Commands are now sent to server subprocesses as typed messages over
+#    a socket (on platforms other than Windows) instead of being
+#    exec'ed through stdin. This lets them return data; clientlist()
+#    now prints what the server sends back, kick() returns whether the
+#    client was found, and the new status() command shows what each
+#    server is up to. Instances also provide get_clients() and
+#    get_status() for fetching this data directly.
+#
+# 1.4.0
+#
+#  - Added fleet mode (--fleet) for running many server instances from
+#    a single manager, with per-instance config overrides, restart
+#    policies, and cpu affinity.
+#
+#  - Server subprocesses are now managed from a single asyncio event
+#    loop instead of a thread polling each one 4 times per second.
+#
 # 1.3.5
 #
 #  - Minor updates accounting for the fact that the game binary no longer
@@ -123,37 +185,41 @@ class ServerManagerApp:
 
     Handles configuring, launching, re-launching, and otherwise
     managing BallisticaKit operating in server mode.
+
+    In fleet mode (see --fleet) a single manager runs many servers; the
+    commands here then apply to all of them and individual servers can
+    be accessed through 'instances'.
     """
 
     # How many seconds we wait after asking our subprocess to do an immediate
     # shutdown before bringing down the hammer.
     IMMEDIATE_SHUTDOWN_TIME_LIMIT = 5.0
 
+    # Servers whose latest metrics snapshot is older than this many
+    # seconds are reported as down.
+    METRICS_STALE_TIME = 15.0
+
     def __init__(self) -> None:
         self._user_provided_config_path: str | None = None
+        self._fleet_config_path: str | None = None
         self._config = ServerConfig()
+        self._fleet_config: FleetConfig | None = None
+        self._config_mtimes: tuple[float | None, float | None] = (None, None)
         self._ba_root_path = os.path.abspath('dist/ba_root')
         self._interactive = sys.stdin.isatty()
-        self._wrapper_shutdown_desired = False
         self._done = False
-        self._subprocess_commands: list[str | ServerCommand] = []
-        self._subprocess_commands_lock = Lock()
-        self._subprocess_force_kill_time: float | None = None
         self._auto_restart = True
         self._config_auto_restart = True
-        self._config_mtime: float | None = None
-        self._last_config_mtime_check_time: float | None = None
         self._should_report_subprocess_error = False
         self._running = False
         self._interpreter_start_time: float | None = None
-        self._subprocess: subprocess.Popen[bytes] | None = None
-        self._subprocess_launch_time: float | None = None
-        self._subprocess_sent_config_auto_restart = False
-        self._subprocess_sent_clean_exit = False
-        self._subprocess_sent_unclean_exit = False
-        self._subprocess_thread: Thread | None = None
-        self._subprocess_exited_cleanly: bool | None = None
+        self._bg_thread: Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._done_event: asyncio.Event | None = None
+        self._config_lock: asyncio.Lock | None = None
         self._did_multi_config_warning = False
+        self._instances: dict[str, ServerInstance] = {}
+        self._metrics_port: int | None = None
 
         # This may override the above defaults.
         self._parse_command_line_args()
@@ -163,6 +229,24 @@ class ServerManagerApp:
         # attempts.
         self.load_config(strict=True, print_confirmation=False)
 
+        self._create_instances()
+
+    def _create_instances(self) -> None:
+        # Our set of instances is fixed at launch (though their configs
+        # are reloaded each time they restart).
+        if self._fleet_config is None:
+            self._instances['default'] = ServerInstance(
+                self, 'default', self._ba_root_path, tagged=False
+            )
+        else:
+            for instcfg in self._fleet_config.instances:
+                self._instances[instcfg.name] = ServerInstance(
+                    self,
+                    instcfg.name,
+                    os.path.join(self._ba_root_path, instcfg.name),
+                    tagged=True,
+                )
+
     @property
     def config(self) -> ServerConfig:
         """The current config for the app."""
@@ -173,6 +257,14 @@ class ServerManagerApp:
         dataclass_validate(value)
         self._config = value
 
+    @property
+    def instances(self) -> dict[str, ServerInstance]:
+        """The server instances being managed, by name.
+
+        In fleet mode, use these to interact with individual servers.
+        """
+        return dict(self._instances)
+
     def _prerun(self) -> None:
         """Common code at the start of any run."""
 
@@ -199,24 +291,35 @@ class ServerManagerApp:
         # not be the case (we support being called from any location).
         os.chdir(os.path.abspath(os.path.dirname(__file__)))
 
-        # Fire off a background thread to wrangle our server binaries.
-        self._subprocess_thread = Thread(target=self._bg_thread_main)
-        self._subprocess_thread.start()
+        # Fire off a background thread running an event loop to wrangle
+        # our server binaries.
+        self._bg_thread = Thread(target=self._bg_thread_main)
+        self._bg_thread.start()
+
+        # Wait until the loop is up so commands can be sent to it.
+        while self._done_event is None:
+            time.sleep(0.001)
 
     def _postrun(self) -> None:
         """Common code at the end of any run."""
         print(f'{Clr.CYN}Server manager shutting down...{Clr.RST}', flush=True)
 
-        assert self._subprocess_thread is not None
-        if self._subprocess_thread.is_alive():
+        assert self._bg_thread is not None
+        if self._bg_thread.is_alive():
             print(
                 f'{Clr.CYN}Waiting for subprocess exit...{Clr.RST}', flush=True
             )
 
-        # Mark ourselves as shutting down and wait for the process to
+        # Mark ourselves as shutting down and wait for our processes to
         # wrap up.
         self._done = True
-        self._subprocess_thread.join()
+        assert self._loop is not None and self._done_event is not None
+        try:
+            self._loop.call_soon_threadsafe(self._done_event.set)
+        except RuntimeError:
+            # Our loop has already finished up on its own.
+            pass
+        self._bg_thread.join()
 
         # If there's a server error we should care about, exit the
         # entire wrapper uncleanly.
@@ -294,29 +397,8 @@ class ServerManagerApp:
         Note that commands are executed asynchronously and no status or
         return value is accessible from this manager app.
         """
-        if not isinstance(statement, str):
-            raise TypeError(f'Expected a string arg; got {type(statement)}')
-        with self._subprocess_commands_lock:
-            self._subprocess_commands.append(statement)
-        self._block_for_command_completion()
-
-    def _block_for_command_completion(self) -> None:
-        # Ideally we'd block here until the command was run so our
-        # prompt would print after it's results. We currently don't get
-        # any response from the app so the best we can do is block until
-        # our bg thread has sent it. In the future we can perhaps add a
-        # proper 'command port' interface for proper blocking two way
-        # communication.
-        while True:
-            with self._subprocess_commands_lock:
-                if not self._subprocess_commands:
-                    break
-            time.sleep(0.1)
-
-        # One last short delay so if we come out *just* as the command
-        # is sent we'll hopefully still give it enough time to
-        # process/print.
-        time.sleep(0.1)
+        for instance in self._instances.values():
+            instance.cmd(statement)
 
     def screenmessage(
         self,
@@ -329,11 +411,8 @@ class ServerManagerApp:
         This will have no name attached and not show up in chat history.
         They will show up in replays, however (unless clients is passed).
         """
-        from bacommon.servermanager import ScreenMessageCommand
-
-        self._enqueue_server_command(
-            ScreenMessageCommand(message=message, color=color, clients=clients)
-        )
+        for instance in self._instances.values():
+            instance.screenmessage(message, color=color, clients=clients)
 
     def chatmessage(
         self, message: str, clients: list[int] | None = None
@@ -343,32 +422,39 @@ class ServerManagerApp:
         This will have the server's name attached and will be logged
         in client chat windows, just like other chat messages.
         """
-        from bacommon.servermanager import ChatMessageCommand
-
-        self._enqueue_server_command(
-            ChatMessageCommand(message=message, clients=clients)
-        )
+        for instance in self._instances.values():
+            instance.chatmessage(message, clients=clients)
 
     def clientlist(self) -> None:
         """Print a list of connected clients."""
-        from bacommon.servermanager import ClientListCommand
+        for instance in self._instances.values():
+            instance.clientlist()
 
-        self._enqueue_server_command(ClientListCommand())
-        self._block_for_command_completion()
+    def status(self) -> None:
+        """Print the current state of the server."""
+        for instance in self._instances.values():
+            instance.status()
 
-    def kick(self, client_id: int, ban_time: int | None = None) -> None:
+    def kick(self, client_id: int, ban_time: int | None = None) -> bool:
         """Kick the client with the provided id.
 
         If ban_time is provided, the client will be banned for that
         length of time in seconds. If it is None, ban duration will
         be determined automatically. Pass 0 or a negative number for no
         ban time.
-        """
-        from bacommon.servermanager import KickCommand
 
-        self._enqueue_server_command(
-            KickCommand(client_id=client_id, ban_time=ban_time)
-        )
+        Returns whether the client was found and disconnected (always
+        False where commands go through stdin).
+
+        Client ids are specific to a server, so in fleet mode this must
+        be called on one of our 'instances' instead.
+        """
+        if len(self._instances) != 1:
+            raise RuntimeError(
+                "In fleet mode, use mgr.instances['name'].kick() instead."
+            )
+        instance = next(iter(self._instances.values()))
+        return instance.kick(client_id, ban_time=ban_time)
 
     def restart(self, immediate: bool = True) -> None:
         """Restart the server subprocess.
@@ -377,20 +463,8 @@ class ServerManagerApp:
         If 'immediate' is passed as False, however, it will instead exit at
         the next clean transition point (the end of a series, etc).
         """
-        from bacommon.servermanager import ShutdownCommand, ShutdownReason
-
-        self._enqueue_server_command(
-            ShutdownCommand(
-                reason=ShutdownReason.RESTARTING, immediate=immediate
-            )
-        )
-
-        # If we're asking for an immediate restart but don't get one
-        # within the grace period, bring down the hammer.
-        if immediate:
-            self._subprocess_force_kill_time = (
-                time.time() + self.IMMEDIATE_SHUTDOWN_TIME_LIMIT
-            )
+        for instance in self._instances.values():
+            instance.restart(immediate=immediate)
 
     def shutdown(self, immediate: bool = True) -> None:
         """Shut down the server subprocess and exit the wrapper.
@@ -399,26 +473,15 @@ class ServerManagerApp:
         If 'immediate' is passed as False, however, it will instead exit at
         the next clean transition point (the end of a series, etc).
         """
-        from bacommon.servermanager import ShutdownCommand, ShutdownReason
-
-        self._enqueue_server_command(
-            ShutdownCommand(reason=ShutdownReason.NONE, immediate=immediate)
-        )
-
-        # An explicit shutdown means we know to bail completely once
-        # this subprocess completes.
-        self._wrapper_shutdown_desired = True
-
-        # If we're asking for an immediate shutdown but don't get one
-        # within the grace period, bring down the hammer.
-        if immediate:
-            self._subprocess_force_kill_time = (
-                time.time() + self.IMMEDIATE_SHUTDOWN_TIME_LIMIT
-            )
+        # Once all our instances have stopped for good, we bail
+        # completely.
+        for instance in self._instances.values():
+            instance.shutdown(immediate=immediate)
 
     def _parse_command_line_args(self) -> None:
         """Parse command line args."""
         # pylint: disable=too-many-branches
+        # pylint: disable=too-many-statements
 
         i = 1
         argc = len(sys.argv)
@@ -438,6 +501,16 @@ class ServerManagerApp:
                 # cwd currently than we will be during the run.
                 self._user_provided_config_path = os.path.abspath(path)
                 i += 2
+            elif arg == '--fleet':
+                if i + 1 >= argc:
+                    raise CleanError(
+                        'Expected a fleet config path as next arg.'
+                    )
+                path = sys.argv[i + 1]
+                if not os.path.exists(path):
+                    raise CleanError(f"Supplied path does not exist: '{path}'.")
+                self._fleet_config_path = os.path.abspath(path)
+                i += 2
             elif arg == '--root':
                 if i + 1 >= argc:
                     raise CleanError('Expected a path as next arg.')
@@ -472,6 +545,16 @@ class ServerManagerApp:
             elif arg == '--no-config-auto-restart':
                 self._config_auto_restart = False
                 i += 1
+            elif arg == '--metrics-port':
+                if i + 1 >= argc:
+                    raise CleanError('Expected a port as next arg.')
+                try:
+                    self._metrics_port = int(sys.argv[i + 1])
+                except ValueError as exc:
+                    raise CleanError(
+                        f"Invalid port: '{sys.argv[i + 1]}'."
+                    ) from exc
+                i += 2
             else:
                 raise CleanError(f"Invalid arg: '{arg}'.")
 
@@ -509,6 +592,20 @@ class ServerManagerApp:
                 ' \'config.json\' in the same directory as the script.'
             )
             + '\n'
+            f'{Clr.BLD}--fleet [path]{Clr.RST}\n'
+            + cls._par(
+                'Run a fleet of servers from this one manager. The fleet'
+                ' file (toml or json) contains an \'instances\' list, each'
+                ' entry having a unique \'name\', a \'config\' table of'
+                ' values overriding the regular config (port, party_name,'
+                ' playlist_code, etc.), and optionally a \'restart_policy\''
+                ' (\'always\', \'on_failure\', or \'never\') and a'
+                ' \'cpu_affinity\' list of cpus to pin to (Linux only).'
+                ' Each instance uses a directory under the root path'
+                ' named after it. The set of instances is fixed at launch,'
+                ' but config changes apply whenever instances restart.'
+            )
+            + '\n'
             f'{Clr.BLD}--root [path]{Clr.RST}\n'
             + cls._par(
                 'Set the ballistica root directory. This is where the server'
@@ -547,6 +644,15 @@ class ServerManagerApp:
                 ' will be automatically restarted if changes to the server'
                 ' config file are detected. This disables that behavior.'
             )
+            + '\n'
+            f'{Clr.BLD}--metrics-port [port]{Clr.RST}\n'
+            + cls._par(
+                'Serve metrics for running servers (player counts, logic'
+                ' step timing, gc passes, network traffic, etc.) in'
+                ' Prometheus text format over http on this port. Only'
+                ' local connections (127.0.0.1) are accepted. Not'
+                ' available on Windows.'
+            )
         )
         print(out)
 
@@ -562,9 +668,17 @@ class ServerManagerApp:
         maxtries = 11
         for trynum in range(maxtries):
             try:
-                self._config = self._load_config_from_file(
+                config = self._load_config_from_file(
                     print_confirmation=print_confirmation
                 )
+                fleet_config = (
+                    None
+                    if self._fleet_config_path is None
+                    else self._load_fleet_config_from_file(config)
+                )
+                self._config = config
+                self._fleet_config = fleet_config
+                self._config_mtimes = self.get_config_mtimes()
                 return
             except Exception as exc:
                 if strict:
@@ -643,29 +757,14 @@ class ServerManagerApp:
                         f' config.{Clr.RST}',
                         flush=True,
                     )
-                self._config_mtime = None
-                self._last_config_mtime_check_time = time.time()
                 return ServerConfig()
 
             # Don't be so lenient if the user pointed us at one though.
             raise RuntimeError(f"Config file not found: '{config_path}'.")
 
-        with open(config_path, encoding='utf-8') as infile:
-            if config_path.endswith('.toml'):
-                user_config_raw = tomllib.loads(infile.read())
-            elif config_path.endswith('.json'):
-                user_config_raw = json.loads(infile.read())
-            else:
-                raise CleanError(
-                    f"Invalid config file path '{config_path}';"
-                    f" path must end with '.toml' or '.json'."
-                )
-
-        out = dataclass_from_dict(ServerConfig, user_config_raw)
-
-        # Update our known mod-time since we know it exists.
-        self._config_mtime = Path(config_path).stat().st_mtime
-        self._last_config_mtime_check_time = time.time()
+        out = dataclass_from_dict(
+            ServerConfig, self._read_config_file(config_path)
+        )
 
         if print_confirmation:
             print(
@@ -674,6 +773,257 @@ class ServerManagerApp:
             )
         return out
 
+    def _load_fleet_config_from_file(self, config: ServerConfig) -> FleetConfig:
+        assert self._fleet_config_path is not None
+        fleet_config = dataclass_from_dict(
+            FleetConfig, self._read_config_file(self._fleet_config_path)
+        )
+        if not fleet_config.instances:
+            raise RuntimeError('Fleet config contains no instances.')
+        names: set[str] = set()
+        for instcfg in fleet_config.instances:
+            # Names become directory names so keep them simple.
+            if (
+                not instcfg.name
+                or instcfg.name.startswith('.')
+                or os.path.basename(instcfg.name) != instcfg.name
+            ):
+                raise RuntimeError(
+                    f"Invalid fleet instance name '{instcfg.name}'."
+                )
+            if instcfg.name in names:
+                raise RuntimeError(
+                    f"Duplicate fleet instance name '{instcfg.name}'."
+                )
+            names.add(instcfg.name)
+
+            # Make sure overrides are valid.
+            self._apply_instance_config(config, instcfg)
+        if self._instances and names != set(self._instances):
+            raise RuntimeError(
+                'Fleet instances cannot be added or removed while running;'
+                ' restart the server manager to do so.'
+            )
+        return fleet_config
+
+    @staticmethod
+    def _apply_instance_config(
+        config: ServerConfig, instcfg: FleetInstanceConfig
+    ) -> ServerConfig:
+        return dataclass_from_dict(
+            ServerConfig, dataclass_to_dict(config) | instcfg.config
+        )
+
+    @staticmethod
+    def _read_config_file(path: str) -> Any:
+        with open(path, encoding='utf-8') as infile:
+            if path.endswith('.toml'):
+                return tomllib.loads(infile.read())
+            if path.endswith('.json'):
+                return json.loads(infile.read())
+        raise CleanError(
+            f"Invalid config file path '{path}';"
+            f" path must end with '.toml' or '.json'."
+        )
+
+    def get_config_mtimes(self) -> tuple[float | None, float | None]:
+        """Return modification times for our config and fleet files.
+
+        Values are None for files which do not exist.
+        """
+        out: list[float | None] = []
+        for path in (self._get_config_path(), self._fleet_config_path):
+            try:
+                out.append(None if path is None else Path(path).stat().st_mtime)
+            except FileNotFoundError:
+                out.append(None)
+        return out[0], out[1]
+
+    async def reload_config(self) -> None:
+        """Reload config if it has changed since it was last loaded.
+
+        Used by instances before each launch.
+        """
+        assert self._config_lock is not None
+        async with self._config_lock:
+            if self.get_config_mtimes() != self._config_mtimes:
+                # This can sit and retry for a while if things are
+                # broken, so keep it out of our event loop.
+                await asyncio.to_thread(
+                    self.load_config, strict=False, print_confirmation=True
+                )
+
+    def get_instance_settings(self, name: str) -> InstanceSettings:
+        """Return current settings for a named instance."""
+        config = self._config
+        restart_policy = (
+            RestartPolicy.ALWAYS if self._auto_restart else RestartPolicy.NEVER
+        )
+        cpu_affinity: list[int] | None = None
+        if self._fleet_config is not None:
+            for instcfg in self._fleet_config.instances:
+                if instcfg.name == name:
+                    config = self._apply_instance_config(config, instcfg)
+                    if instcfg.restart_policy is not None:
+                        restart_policy = instcfg.restart_policy
+                    cpu_affinity = instcfg.cpu_affinity
+                    break
+        return InstanceSettings(
+            config=config,
+            restart_policy=restart_policy,
+            config_auto_restart=self._config_auto_restart,
+            cpu_affinity=cpu_affinity,
+            config_mtimes=self._config_mtimes,
+        )
+
+    def call_in_loop(self, call: Callable[[], None]) -> None:
+        """Run a call in our event loop (can be called from any thread)."""
+        if current_thread() is self._bg_thread:
+            call()
+            return
+        assert self._loop is not None
+        self._loop.call_soon_threadsafe(call)
+
+    def get_metrics_text(self) -> str:
+        """Return metrics for our servers in Prometheus text format."""
+        # pylint: disable=too-many-locals
+        families: list[tuple[str, str, str, list[tuple[str, float]]]] = []
+
+        def _add(
+            name: str, mtype: str, helptext: str, vals: list[tuple[str, float]]
+        ) -> None:
+            families.append(
+                (f'ballistica_server_{name}', mtype, helptext, vals)
+            )
+
+        snapshots: list[tuple[str, ServerMetrics]] = []
+        up: list[tuple[str, float]] = []
+        launches: list[tuple[str, float]] = []
+        for instance in self._instances.values():
+            labels = f'instance="{_prometheus_escape(instance.name)}"'
+            metrics = instance.metrics
+            age = instance.metrics_age
+            fresh = (
+                metrics is not None
+                and age is not None
+                and age < self.METRICS_STALE_TIME
+            )
+            up.append((labels, 1.0 if fresh else 0.0))
+            launches.append((labels, float(instance.launch_count)))
+            if fresh:
+                assert metrics is not None
+                snapshots.append((labels, metrics))
+
+        _add('up', 'gauge', 'Whether the server is reporting metrics.', up)
+        _add(
+            'launches_total',
+            'counter',
+            'Server subprocess launches.',
+            launches,
+        )
+
+        def _add_each(
+            name: str,
+            mtype: str,
+            helptext: str,
+            getval: Callable[[ServerMetrics], float | None],
+        ) -> None:
+            vals: list[tuple[str, float]] = []
+            for labels, metrics in snapshots:
+                val = getval(metrics)
+                if val is not None:
+                    vals.append((labels, val))
+            _add(name, mtype, helptext, vals)
+
+        _add(
+            'activity_info',
+            'gauge',
+            'Current host session and activity types.',
+            [
+                (
+                    f'{labels},session="'
+                    f'{_prometheus_escape(str(m.session_type))}",activity="'
+                    f'{_prometheus_escape(str(m.activity_type))}"',
+                    1.0,
+                )
+                for labels, m in snapshots
+            ],
+        )
+        _add_each(
+            'clients', 'gauge', 'Connected clients.', lambda m: m.client_count
+        )
+        _add_each(
+            'players', 'gauge', 'Players in the game.', lambda m: m.player_count
+        )
+        _add_each(
+            'logic_steps',
+            'gauge',
+            'Logic-thread steps run since the last snapshot.',
+            lambda m: m.logic_step_count,
+        )
+        _add_each(
+            'logic_step_duration_mean_seconds',
+            'gauge',
+            'Mean logic-thread step duration since the last snapshot.',
+            lambda m: m.logic_step_duration_mean,
+        )
+        _add_each(
+            'logic_step_duration_max_seconds',
+            'gauge',
+            'Max logic-thread step duration since the last snapshot.',
+            lambda m: m.logic_step_duration_max,
+        )
+        _add_each(
+            'gc_passes_total',
+            'counter',
+            'Explicit garbage-collection passes.',
+            lambda m: m.gc_pass_count,
+        )
+        _add_each(
+            'gc_seconds_total',
+            'counter',
+            'Time spent in explicit garbage-collection passes.',
+            lambda m: m.gc_pass_duration_total,
+        )
+        _add_each(
+            'gc_last_pass_seconds',
+            'gauge',
+            'Duration of the most recent garbage-collection pass.',
+            lambda m: m.gc_pass_duration_last,
+        )
+        _add_each(
+            'net_receive_bytes_per_second',
+            'gauge',
+            'Bytes received from clients over the last second.',
+            lambda m: m.net_bytes_in,
+        )
+        _add_each(
+            'net_transmit_bytes_per_second',
+            'gauge',
+            'Bytes sent to clients over the last second.',
+            lambda m: m.net_bytes_out,
+        )
+        _add_each(
+            'net_resend_bytes_per_second',
+            'gauge',
+            'Bytes resent to clients over the last second.',
+            lambda m: m.net_bytes_resent,
+        )
+        _add_each(
+            'client_ping_max_seconds',
+            'gauge',
+            'Highest ping among connected clients.',
+            lambda m: None if m.net_ping_max is None else m.net_ping_max / 1000,
+        )
+
+        lines: list[str] = []
+        for name, mtype, helptext, vals in families:
+            lines.append(f'# HELP {name} {helptext}')
+            lines.append(f'# TYPE {name} {mtype}')
+            for labels, val in vals:
+                lines.append(f'{name}{{{labels}}} {val!r}')
+        return '\n'.join(lines) + '\n'
+
     def _enable_tab_completion(self, locs: dict) -> None:
         """Enable tab-completion on platforms where available (linux/mac)."""
         try:
@@ -688,130 +1038,682 @@ class ServerManagerApp:
 
     def _bg_thread_main(self) -> None:
         """Top level method run by our bg thread."""
-        while not self._done:
-            self._run_server_cycle()
+        asyncio.run(self._run_instances())
+
+    async def _run_instances(self) -> None:
+        """Run all of our instances in our event loop until done."""
+        self._config_lock = asyncio.Lock()
+        self._loop = asyncio.get_running_loop()
+        done_event = self._done_event = asyncio.Event()
+
+        metrics_server: asyncio.Server | None = None
+        if self._metrics_port is not None:
+            try:
+                metrics_server = await asyncio.start_server(
+                    self._handle_metrics_request,
+                    '127.0.0.1',
+                    self._metrics_port,
+                )
+            except OSError as exc:
+                print(
+                    f'{Clr.RED}Error serving metrics on port'
+                    f' {self._metrics_port}: {exc}{Clr.RST}',
+                    flush=True,
+                )
+
+        instances = list(self._instances.values())
+        await asyncio.gather(*(i.run(done_event) for i in instances))
+
+        if metrics_server is not None:
+            metrics_server.close()
+            await metrics_server.wait_closed()
+
+        if any(i.failed for i in instances):
+            self._should_report_subprocess_error = True
+
+        # If all instances have stopped for good on their own, tell the
+        # main thread to die. Only do this if the main thread is not
+        # already waiting for us to die; otherwise it can lead to
+        # deadlock. (we hang in os.kill while main thread is blocked in
+        # Thread.join)
+        if not self._done:
+            # EW: it seems that if we die before the main thread has
+            # fully started up the interpreter, its possible that it
+            # will not break out of its loop via the usual SystemExit
+            # that gets sent when we die.
+            if self._interactive:
+                while (
+                    self._interpreter_start_time is None
+                    or time.time() - self._interpreter_start_time < 0.5
+                ):
+                    await asyncio.sleep(0.1)
+
+            self._done = True
+
+            # This should break the main thread out of its blocking
+            # interpreter call.
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    async def _handle_metrics_request(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve a single (minimal) http request for metrics."""
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 5.0)
+            reqline = request.split(b'\r\n', 1)[0].split()
+            if reqline[:1] == [b'GET'] and reqline[1:2] in (
+                [b'/'],
+                [b'/metrics'],
+            ):
+                status = '200 OK'
+                body = self.get_metrics_text().encode()
+            else:
+                status = '404 Not Found'
+                body = b'Not found.\n'
+            writer.write(
+                f'HTTP/1.1 {status}\r\n'
+                f'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: close\r\n\r\n'.encode() + body
+            )
+            await writer.drain()
+        except (OSError, TimeoutError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.LimitOverrunError:
+            pass
+        finally:
+            writer.close()
 
     def _handle_term_signal(self, sig: int, frame: FrameType | None) -> None:
         """Handle signals (will always run in the main thread)."""
         del sig, frame  # Unused.
         sys.exit(1 if self._should_report_subprocess_error else 0)
 
-    def _run_server_cycle(self) -> None:
-        """Spin up the server subprocess and run it until exit."""
-        # pylint: disable=consider-using-with
 
-        # Reload our config, and update our overall behavior based on
-        # it. We do non-strict this time to give the user repeated
-        # attempts if if they mess up while modifying the config on the
-        # fly.
-        self.load_config(strict=False, print_confirmation=True)
+@dataclass
+class InstanceSettings:
+    """Settings for a server instance's next launch."""
 
-        self._prep_subprocess_environment()
+    config: ServerConfig
+    restart_policy: RestartPolicy
+    config_auto_restart: bool
+    cpu_affinity: list[int] | None
+    config_mtimes: tuple[float | None, float | None]
 
-        # Launch the binary and grab its stdin; we'll use this to feed
-        # it commands.
-        self._subprocess_launch_time = time.time()
 
-        # Set an environment var so the server process knows its being
-        # run under us. This causes it to ignore ctrl-c presses and
-        # other slight behavior tweaks. Hmm; should this be an argument
-        # instead?
-        os.environ['BA_SERVER_WRAPPER_MANAGED'] = '1'
+class ServerInstance:
+    """A single server subprocess run by a ServerManagerApp.
+
+    In fleet mode, these are available through the manager's
+    'instances' dict for interacting with individual servers.
+    """
+
+    _control_sender = MessageSender(get_server_control_protocol())
+
+    def __init__(
+        self,
+        app: ServerManagerApp,
+        name: str,
+        ba_root_path: str,
+        tagged: bool,
+    ) -> None:
+        self._app = app
+        self._name = name
+        self._ba_root_path = ba_root_path
+        self._tag = f'[{name}] ' if tagged else ''
+        self._commands: list[tuple[str | ServerCommand, Future | None]] = []
+        self._control_endpoint: RPCEndpoint | None = None
+        self._control_tasks: set[asyncio.Task] = set()
+        self._control_receiver = MessageReceiver(get_server_control_protocol())
+        handler: Callable[..., Any] = ServerInstance._handle_metrics_message
+        self._control_receiver.register_handler(handler)
+        self._metrics: ServerMetrics | None = None
+        self._metrics_time: float | None = None
+        self._launch_count = 0
+        self._settings: InstanceSettings | None = None
+        self._subprocess: asyncio.subprocess.Process | None = None
+        self._subprocess_started = False
+        self._subprocess_exited_cleanly: bool | None = None
+        self._subprocess_timers: list[asyncio.TimerHandle] = []
+        self._subprocess_kill_event = asyncio.Event()
+        self._subprocess_sent_config_auto_restart = False
+        self._restart_desired = False
+        self._shutdown_desired = False
+        self._failed = False
+        self._stopped = False
+        self._did_affinity_warning = False
+
+    @property
+    def name(self) -> str:
+        """The name of this instance."""
+        return self._name
+
+    @property
+    def failed(self) -> bool:
+        """Whether we stopped for good after our server exited uncleanly."""
+        return self._failed
+
+    @property
+    def metrics(self) -> ServerMetrics | None:
+        """The latest metrics snapshot from our running server (if any)."""
+        return self._metrics
+
+    @property
+    def metrics_age(self) -> float | None:
+        """How many seconds ago our latest metrics snapshot arrived."""
+        metrics_time = self._metrics_time
+        return None if metrics_time is None else time.monotonic() - metrics_time
+
+    @property
+    def launch_count(self) -> int:
+        """How many times we've launched a server subprocess."""
+        return self._launch_count
+
+    def cmd(self, statement: str) -> None:
+        """Exec a Python command on the current running server subprocess.
+
+        Note that commands are executed asynchronously and no status or
+        return value is accessible from this manager app.
+        """
+        if not isinstance(statement, str):
+            raise TypeError(f'Expected a string arg; got {type(statement)}')
+        self._submit_command(statement, block=True)
+
+    def screenmessage(
+        self,
+        message: str,
+        color: tuple[float, float, float] | None = None,
+        clients: list[int] | None = None,
+    ) -> None:
+        """Display a screen-message.
+
+        This will have no name attached and not show up in chat history.
+        They will show up in replays, however (unless clients is passed).
+        """
+        from bacommon.servermanager import ScreenMessageCommand
+
+        self._submit_command(
+            ScreenMessageCommand(message=message, color=color, clients=clients)
+        )
+
+    def chatmessage(
+        self, message: str, clients: list[int] | None = None
+    ) -> None:
+        """Send a chat message from the server.
+
+        This will have the server's name attached and will be logged
+        in client chat windows, just like other chat messages.
+        """
+        from bacommon.servermanager import ChatMessageCommand
+
+        self._submit_command(
+            ChatMessageCommand(message=message, clients=clients)
+        )
+
+    def clientlist(self) -> None:
+        """Print a list of connected clients."""
+        from bacommon.servermanager import ClientListCommand
+
+        # Without a control channel, the server prints this itself.
+        if not CONTROL_CHANNEL_SUPPORTED:
+            self._submit_command(ClientListCommand(), block=True)
+            return
+
+        title1 = 'Client ID'
+        title2 = 'Account Name'
+        title3 = 'Players'
+        col1 = 10
+        col2 = 16
+        out = (
+            f'{Clr.BLD}{self._tag}'
+            f'{title1:<{col1}} {title2:<{col2}} {title3}'
+            f'{Clr.RST}'
+        )
+        for client in self.get_clients():
+            name = client.account_name
+            players = ', '.join(client.players)
+            out += f'\n{client.client_id:<{col1}} {name:<{col2}} {players}'
+        print(out, flush=True)
+
+    def status(self) -> None:
+        """Print the current state of the server."""
+        from bacommon.servermanager import StatusCommand
+
+        # Without a control channel, the server prints this itself.
+        if not CONTROL_CHANNEL_SUPPORTED:
+            self._submit_command(StatusCommand(), block=True)
+            return
+
+        status = self.get_status()
+        if not status.server_mode:
+            desc = 'starting up'
+        else:
+            desc = (
+                f'{status.client_count} client(s),'
+                f' {status.player_count} player(s),'
+                f' session {status.session_type},'
+                f' activity {status.activity_type}'
+            )
+            if status.shutdown_pending:
+                desc += ' (exiting at next clean opportunity)'
+        self._log(desc)
+
+    def get_clients(self) -> list[ClientInfo]:
+        """Return info about connected clients."""
+        from bacommon.servermanager import (
+            ClientListCommand,
+            ClientListResponse,
+        )
+
+        response = self._request(ClientListCommand())
+        assert isinstance(response, ClientListResponse)
+        return response.clients
+
+    def get_status(self) -> StatusResponse:
+        """Return the current state of the server."""
+        from bacommon.servermanager import StatusCommand, StatusResponse
+
+        response = self._request(StatusCommand())
+        assert isinstance(response, StatusResponse)
+        return response
+
+    def kick(self, client_id: int, ban_time: int | None = None) -> bool:
+        """Kick the client with the provided id.
+
+        If ban_time is provided, the client will be banned for that
+        length of time in seconds. If it is None, ban duration will
+        be determined automatically. Pass 0 or a negative number for no
+        ban time.
+
+        Returns whether the client was found and disconnected (always
+        False where commands go through stdin).
+        """
+        from efro.message import BoolResponse
+        from bacommon.servermanager import KickCommand
+
+        command = KickCommand(client_id=client_id, ban_time=ban_time)
+        if not CONTROL_CHANNEL_SUPPORTED:
+            self._submit_command(command)
+            return False
+        response = self._request(command)
+        assert isinstance(response, BoolResponse)
+        return response.value
+
+    def restart(self, immediate: bool = True) -> None:
+        """Restart the server subprocess.
+
+        By default, the current server process will exit immediately.
+        If 'immediate' is passed as False, however, it will instead exit at
+        the next clean transition point (the end of a series, etc).
+        """
+        self._app.call_in_loop(partial(self._stop_subprocess, immediate, True))
+
+    def shutdown(self, immediate: bool = True) -> None:
+        """Shut down the server subprocess without restarting it.
+
+        By default, the current server process will exit immediately.
+        If 'immediate' is passed as False, however, it will instead exit at
+        the next clean transition point (the end of a series, etc).
+        """
+        self._app.call_in_loop(partial(self._stop_subprocess, immediate, False))
+
+    async def run(self, done: asyncio.Event) -> None:
+        """Run server subprocesses until done or stopped for good.
+
+        Servers are relaunched as they exit according to our restart
+        policy.
+        """
+        try:
+            while not done.is_set():
+                if not await self._run_server_cycle(done):
+                    break
+        finally:
+            # Don't leave anyone waiting on commands that will never go
+            # out (or let anyone queue more).
+            self._stopped = True
+            for _command, future in self._commands:
+                if future is not None:
+                    future.set_exception(
+                        RuntimeError('Server stopped before command was sent.')
+                    )
+            self._commands = []
+
+    def _log(self, text: str, color: str = Clr.CYN) -> None:
+        print(f'{color}{self._tag}{text}{Clr.RST}', flush=True)
+
+    def _request(self, command: ServerCommand) -> Response | None:
+        """Send a command to our server and block until it responds."""
+        if not CONTROL_CHANNEL_SUPPORTED:
+            raise RuntimeError(
+                f'{type(command).__name__} is not supported on this platform.'
+            )
+        response: Response | None = self._submit_command(command, block=True)
+        return response
+
+    def _submit_command(
+        self, command: str | ServerCommand, block: bool = False
+    ) -> Any:
+        """Submit a command to be sent to our server.
+
+        Can be called from any thread (but only blocked on from outside
+        of our event loop). When blocking, returns the server's response
+        if there is one. Raises a RuntimeError if we have stopped for
+        good.
+        """
+        if self._stopped:
+            raise RuntimeError(f'Server instance {self._name} has stopped.')
+        future: Future | None = Future() if block else None
+        self._app.call_in_loop(partial(self._add_command, command, future))
+        if future is None:
+            return None
+        result = future.result()
+
+        # Commands going through stdin get no response, so the best we
+        # can do is block until they have been sent and then give them
+        # a short bit to process/print so our prompt prints after their
+        # results.
+        if isinstance(command, str) or not CONTROL_CHANNEL_SUPPORTED:
+            time.sleep(0.1)
+        return result
+
+    def _add_command(
+        self, command: str | ServerCommand, future: Future | None
+    ) -> None:
+        # We may have stopped after this was submitted.
+        if self._stopped:
+            if future is None:
+                self._log('Dropping command; server has stopped.', Clr.RED)
+            else:
+                future.set_exception(
+                    RuntimeError(f'Server instance {self._name} has stopped.')
+                )
+            return
+        self._commands.append((command, future))
+        if self._subprocess_started:
+            self._send_commands()
+
+    def _send_commands(self) -> None:
+        """Pass along any commands to our process."""
+        assert self._subprocess is not None
+        assert self._subprocess.stdin is not None
+        for command, future in self._commands:
+            # If we're passing a raw string to exec, no need to wrap it
+            # in any proper structure.
+            if isinstance(command, str):
+                self._subprocess.stdin.write(f'{command}\n'.encode())
+            elif self._control_endpoint is not None:
+                self._send_control_message(command, future)
+                continue
+            else:
+                self._send_server_command(command)
+            if future is not None:
+                future.set_result(None)
+        self._commands = []
+
+    def _send_control_message(
+        self, command: ServerCommand, future: Future | None
+    ) -> None:
+        # Kick off the send immediately so that commands go out in the
+        # order they were submitted.
+        response = self._control_sender.send_async(self, command)
+        task = asyncio.create_task(
+            self._finish_control_message(
+                command, response, future, self._launch_count
+            )
+        )
+        self._control_tasks.add(task)
+        task.add_done_callback(self._control_tasks.discard)
+
+    async def _finish_control_message(
+        self,
+        command: ServerCommand,
+        response: Awaitable[Response | None],
+        future: Future | None,
+        launch_count: int,
+    ) -> None:
+        from bacommon.servermanager import ShutdownCommand
+
+        try:
+            result = await response
+        except Exception as exc:
+            if future is not None:
+                future.set_exception(exc)
+                return
+
+            # Nobody is waiting on fire-and-forget commands, so this is
+            # our only chance to say anything about them.
+            self._log(f'Error running {type(command).__name__}: {exc}', Clr.RED)
+
+            # If our subprocess never got put into server mode or never
+            # heard it should shut down, it won't get anywhere on its
+            # own; kill it and let our restart logic take it from there.
+            # (Skip this if that subprocess is already gone).
+            if (
+                isinstance(command, (StartServerModeCommand, ShutdownCommand))
+                and self._subprocess is not None
+                and launch_count == self._launch_count
+            ):
+                if isinstance(command, StartServerModeCommand):
+                    self._restart_desired = True
+                self._log('Killing subprocess...', Clr.RED)
+                self._subprocess_kill_event.set()
+            return
+        if future is not None:
+            future.set_result(result)
+
+    @_control_sender.send_async_method
+    def _send_raw_control_message(self, message: str) -> Awaitable[str]:
+        assert self._control_endpoint is not None
+        return self._decode_control_response(
+            self._control_endpoint.send_message(message.encode())
+        )
+
+    @staticmethod
+    async def _decode_control_response(response: Awaitable[bytes]) -> str:
+        return (await response).decode()
+
+    async def _handle_control_message(self, message: bytes) -> bytes:
+        return self._control_receiver.handle_raw_message(
+            self, message.decode()
+        ).encode()
+
+    def _handle_metrics_message(self, msg: ServerMetricsMessage) -> None:
+        self._metrics = msg.metrics
+        self._metrics_time = time.monotonic()
+
+    async def _open_control_channel(self, sock: socket.socket) -> asyncio.Task:
+        reader, writer = await asyncio.open_connection(sock=sock)
+        self._control_endpoint = RPCEndpoint(
+            self._handle_control_message,
+            reader,
+            writer,
+            f'{self._name} control',
+        )
+        return asyncio.create_task(self._control_endpoint.run())
+
+    async def _close_control_channel(self, task: asyncio.Task) -> None:
+        assert self._control_endpoint is not None
+        self._control_endpoint.close()
+        await task
+        self._control_endpoint = None
+
+    def _send_server_command(self, command: ServerCommand) -> None:
+        """Send a command to the server."""
+        import pickle
+
+        assert self._subprocess is not None
+        assert self._subprocess.stdin is not None
+        val = repr(pickle.dumps(command))
+        assert '\n' not in val
+        execcode = (
+            f'import baclassic._servermode;'
+            f' baclassic._servermode._cmd({val})\n'
+        ).encode()
+        self._subprocess.stdin.write(execcode)
+
+    def _stop_subprocess(self, immediate: bool, restart: bool) -> None:
+        from bacommon.servermanager import ShutdownCommand, ShutdownReason
+
+        # An explicit restart means we relaunch regardless of restart
+        # policy and an explicit shutdown means we don't.
+        if restart:
+            self._restart_desired = True
+        else:
+            self._shutdown_desired = True
+        self._add_command(
+            ShutdownCommand(
+                reason=(
+                    ShutdownReason.RESTARTING
+                    if restart
+                    else ShutdownReason.NONE
+                ),
+                immediate=immediate,
+            ),
+            None,
+        )
+
+        # If we're asking for an immediate shutdown but don't get one
+        # within the grace period, bring down the hammer.
+        if immediate:
+            self._subprocess_timers.append(
+                asyncio.get_running_loop().call_later(
+                    ServerManagerApp.IMMEDIATE_SHUTDOWN_TIME_LIMIT,
+                    self._force_kill_subprocess,
+                )
+            )
+
+    def _force_kill_subprocess(self) -> None:
+        self._log(
+            f'Immediate shutdown time limit'
+            f' ({ServerManagerApp.IMMEDIATE_SHUTDOWN_TIME_LIMIT:.1f} seconds)'
+            f' expired; force-killing subprocess...'
+        )
+        self._subprocess_kill_event.set()
+
+    async def _run_server_cycle(self, done: asyncio.Event) -> bool:
+        """Spin up a server subprocess and run it until exit.
+
+        Returns whether another should be launched afterwards.
+        """
+        # pylint: disable=too-many-branches
+        # Reload config and update our overall behavior based on it.
+        await self._app.reload_config()
+        settings = self._settings = self._app.get_instance_settings(self._name)
+
+        self._prep_subprocess_environment(settings.config)
 
         # Set particular things that can *only* be passed as args and
         # not config vals (because they need to be handled by the binary
         # before spinning up Python or whatnot).
         extra_args: list[str] = []
 
-        if self._config.dont_write_bytecode:
+        if settings.config.dont_write_bytecode:
             extra_args += ['--dont-write-bytecode']
 
-        # Set an environment var to change the device name. Device name
-        # is used while making connection with master server,
-        # cloud-console recognize us with this name.
-        os.environ['BA_DEVICE_NAME'] = self._config.party_name
+        # Set an environment var so the server process knows its being
+        # run under us. This causes it to ignore ctrl-c presses and
+        # other slight behavior tweaks. Hmm; should this be an argument
+        # instead? Also set the device name, which is used while making
+        # connection with master server; cloud-console recognizes us
+        # with this name.
+        env = dict(
+            os.environ,
+            BA_SERVER_WRAPPER_MANAGED='1',
+            BA_DEVICE_NAME=settings.config.party_name,
+        )
 
-        print(f'{Clr.CYN}Launching server subprocess...{Clr.RST}', flush=True)
+        self._log('Launching server subprocess...')
         binary_name = (
             'BallisticaKitHeadless.exe'
             if os.name == 'nt'
             else './ballisticakit_headless'
         )
-        assert self._ba_root_path is not None
-        self._subprocess = None
 
-        # Launch!
+        self._launch_count += 1
+
+        # Where supported, hand the binary one end of a socket pair to
+        # receive commands and send responses through.
+        control_sock: socket.socket | None = None
+        child_sock: socket.socket | None = None
+        if CONTROL_CHANNEL_SUPPORTED:
+            control_sock, child_sock = socket.socketpair()
+            env['BA_SERVER_CONTROL_FD'] = str(child_sock.fileno())
+
+        # Pin the binary to particular cpus from the start (by running
+        # it through taskset) so that all threads it spins up inherit
+        # the affinity.
+        affinity_args = self._get_cpu_affinity_args(settings.cpu_affinity)
+
+        # Launch the binary and grab its stdin; we'll use this to feed
+        # it raw exec commands (and all commands if we have no control
+        # channel).
         try:
-            self._subprocess = subprocess.Popen(
-                [binary_name, '--config-dir', self._ba_root_path] + extra_args,
-                stdin=subprocess.PIPE,
+            self._subprocess = await asyncio.create_subprocess_exec(
+                *affinity_args,
+                binary_name,
+                '--config-dir',
+                self._ba_root_path,
+                *extra_args,
+                stdin=asyncio.subprocess.PIPE,
                 cwd='dist',
+                env=env,
+                pass_fds=() if child_sock is None else (child_sock.fileno(),),
             )
         except Exception as exc:
             self._subprocess_exited_cleanly = False
-            print(
-                f'{Clr.RED}Error launching server subprocess: {exc}{Clr.RST}',
-                flush=True,
-            )
+            self._log(f'Error launching server subprocess: {exc}', Clr.RED)
+        finally:
+            if child_sock is not None:
+                child_sock.close()
 
-        # Do the thing.
-        try:
-            self._run_subprocess_until_exit()
-        except Exception as exc:
-            print(
-                f'{Clr.RED}Error running server subprocess: {exc}{Clr.RST}',
-                flush=True,
+        if self._subprocess is None:
+            if control_sock is not None:
+                control_sock.close()
+        else:
+            control_task = (
+                None
+                if control_sock is None
+                else await self._open_control_channel(control_sock)
             )
 
-        self._kill_subprocess()
-
-        assert self._subprocess_exited_cleanly is not None
-
-        # EW: it seems that if we die before the main thread has fully
-        # started up the interpreter, its possible that it will not
-        # break out of its loop via the usual SystemExit that gets sent
-        # when we die.
-        if self._interactive:
-            while (
-                self._interpreter_start_time is None
-                or time.time() - self._interpreter_start_time < 0.5
-            ):
-                time.sleep(0.1)
-
-        # Avoid super fast death loops.
-        if (
-            not self._subprocess_exited_cleanly
-            and self._auto_restart
-            and not self._done
-        ):
-            time.sleep(5.0)
-
-        # If they don't want auto-restart, we'll exit the whole wrapper.
-        # (and with an error code if things ended badly).
-        if not self._auto_restart:
-            self._wrapper_shutdown_desired = True
-            if not self._subprocess_exited_cleanly:
-                self._should_report_subprocess_error = True
-
+            # Do the thing.
+            try:
+                await self._run_subprocess_until_exit(settings, done)
+            except Exception as exc:
+                self._log(f'Error running server subprocess: {exc}', Clr.RED)
+
+            await self._kill_subprocess()
+            if control_task is not None:
+                await self._close_control_channel(control_task)
+
+        exited_cleanly = self._subprocess_exited_cleanly
+        assert exited_cleanly is not None
+        policy = settings.restart_policy
+        relaunch = self._restart_desired or (
+            not self._shutdown_desired
+            and (
+                policy is RestartPolicy.ALWAYS
+                or (policy is RestartPolicy.ON_FAILURE and not exited_cleanly)
+            )
+        )
+        if not relaunch and not exited_cleanly and not self._shutdown_desired:
+            self._failed = True
         self._reset_subprocess_vars()
 
-        # If we want to die completely after this subprocess has ended,
-        # tell the main thread to die.
-        if self._wrapper_shutdown_desired:
-            # Only do this if the main thread is not already waiting for
-            # us to die; otherwise it can lead to deadlock. (we hang in
-            # os.kill while main thread is blocked in Thread.join)
-            if not self._done:
-                self._done = True
+        if not relaunch or done.is_set():
+            return False
 
-                # This should break the main thread out of its blocking
-                # interpreter call.
-                os.kill(os.getpid(), signal.SIGTERM)
+        # Avoid super fast death loops.
+        if not exited_cleanly:
+            try:
+                await asyncio.wait_for(done.wait(), 5.0)
+            except TimeoutError:
+                pass
+        return True
 
-    def _prep_subprocess_environment(self) -> None:
+    def _prep_subprocess_environment(self, config: ServerConfig) -> None:
         """Write files that must exist at process launch."""
 
-        assert self._ba_root_path is not None
         os.makedirs(self._ba_root_path, exist_ok=True)
         cfgpath = os.path.join(self._ba_root_path, 'config.json')
         if os.path.exists(cfgpath):
@@ -827,37 +1729,37 @@ class ServerManagerApp:
         # through; otherwise stale values from previous runs can linger
         # in the bincfg.
 
-        bincfg['Port'] = self._config.port
-        bincfg['Auto Balance Teams'] = self._config.auto_balance_teams
-        bincfg['Show Tutorial'] = self._config.show_tutorial
+        bincfg['Port'] = config.port
+        bincfg['Auto Balance Teams'] = config.auto_balance_teams
+        bincfg['Show Tutorial'] = config.show_tutorial
 
         binkey = 'SceneV1 Host Protocol'
-        if self._config.protocol_version is not None:
-            bincfg[binkey] = self._config.protocol_version
+        if config.protocol_version is not None:
+            bincfg[binkey] = config.protocol_version
         elif binkey in bincfg:
             del bincfg[binkey]
 
         binkey = 'Custom Team Names'
-        if self._config.team_names is not None:
-            bincfg[binkey] = self._config.team_names
+        if config.team_names is not None:
+            bincfg[binkey] = config.team_names
         elif binkey in bincfg:
             del bincfg[binkey]
 
         binkey = 'Custom Team Colors'
-        if self._config.team_colors is not None:
-            bincfg[binkey] = self._config.team_colors
+        if config.team_colors is not None:
+            bincfg[binkey] = config.team_colors
         elif binkey in bincfg:
             del bincfg[binkey]
 
-        bincfg['Idle Exit Minutes'] = self._config.idle_exit_minutes
+        bincfg['Idle Exit Minutes'] = config.idle_exit_minutes
 
         binkey = 'Log Levels'
-        if self._config.log_levels is not None:
+        if config.log_levels is not None:
             # Users supply us log level names like NOTSET; convert those
             # to numeric vals which the engine expects.
             bincfg[binkey] = {
                 key: logging.getLevelName(val)
-                for key, val in self._config.log_levels.items()
+                for key, val in config.log_levels.items()
             }
         elif binkey in bincfg:
             del bincfg[binkey]
@@ -865,206 +1767,174 @@ class ServerManagerApp:
         with open(cfgpath, 'w', encoding='utf-8') as outfile:
             outfile.write(json.dumps(bincfg))
 
-    def _enqueue_server_command(self, command: ServerCommand) -> None:
-        """Enqueue a command to be sent to the server.
-
-        Can be called from any thread.
-        """
-        with self._subprocess_commands_lock:
-            self._subprocess_commands.append(command)
-
-    def _send_server_command(self, command: ServerCommand) -> None:
-        """Send a command to the server.
-
-        Must be called from the server process thread.
-        """
-        import pickle
-
-        assert current_thread() is self._subprocess_thread
+    async def _run_subprocess_until_exit(
+        self, settings: InstanceSettings, done: asyncio.Event
+    ) -> None:
         assert self._subprocess is not None
-        assert self._subprocess.stdin is not None
-        val = repr(pickle.dumps(command))
-        assert '\n' not in val
-        execcode = (
-            f'import baclassic._servermode;'
-            f' baclassic._servermode._cmd({val})\n'
-        ).encode()
-        self._subprocess.stdin.write(execcode)
-        self._subprocess.stdin.flush()
-
-    def _run_subprocess_until_exit(self) -> None:
-        if self._subprocess is None:
-            return
-
-        assert current_thread() is self._subprocess_thread
-        assert self._subprocess.stdin is not None
 
         # Send the initial server config which should kick things off
-        # (but make sure its values are still valid first).
-        dataclass_validate(self._config)
-        self._send_server_command(StartServerModeCommand(self._config))
-
-        while True:
-            # If the app is trying to shut down, nope out immediately.
-            if self._done:
-                break
-
-            # Pass along any commands to our process.
-            with self._subprocess_commands_lock:
-                for incmd in self._subprocess_commands:
-                    # If we're passing a raw string to exec, no need to
-                    # wrap it in any proper structure.
-                    if isinstance(incmd, str):
-                        self._subprocess.stdin.write((incmd + '\n').encode())
-                        self._subprocess.stdin.flush()
-                    else:
-                        self._send_server_command(incmd)
-                self._subprocess_commands = []
-
-            # Request restarts/shut-downs for various reasons.
-            self._request_shutdowns_or_restarts()
-
-            # If they want to force-kill our subprocess, simply exit
-            # this loop; the cleanup code will kill the process if its
-            # still alive.
-            if (
-                self._subprocess_force_kill_time is not None
-                and time.time() > self._subprocess_force_kill_time
-            ):
-                print(
-                    f'{Clr.CYN}Immediate shutdown time limit'
-                    f' ({self.IMMEDIATE_SHUTDOWN_TIME_LIMIT:.1f} seconds)'
-                    f' expired; force-killing subprocess...{Clr.RST}',
-                    flush=True,
-                )
-                break
-
-            # Watch for the server process exiting..
-            code: int | None = self._subprocess.poll()
-            if code is not None:
-                clr = Clr.CYN if code == 0 else Clr.RED
-                print(
-                    f'{clr}Server subprocess exited'
-                    f' with code {code}.{Clr.RST}',
-                    flush=True,
+        # (but make sure its values are still valid first), followed by
+        # anything that has been waiting for a server.
+        dataclass_validate(settings.config)
+        self._commands.insert(
+            0, (StartServerModeCommand(settings.config), None)
+        )
+        self._subprocess_started = True
+        self._send_commands()
+
+        # Request restarts/shut-downs for various reasons.
+        self._schedule_exit_timers(settings)
+        watch_task = asyncio.create_task(self._watch_config(settings))
+
+        # Now just wait for the process to exit (or for someone to tell
+        # us to kill it).
+        exit_task = asyncio.create_task(self._subprocess.wait())
+        kill_task = asyncio.create_task(self._subprocess_kill_event.wait())
+        done_task = asyncio.create_task(done.wait())
+        try:
+            await asyncio.wait(
+                [exit_task, kill_task, done_task],
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        finally:
+            for task in (watch_task, exit_task, kill_task, done_task):
+                task.cancel()
+        if exit_task.done() and not exit_task.cancelled():
+            code = exit_task.result()
+            self._log(
+                f'Server subprocess exited with code {code}.',
+                Clr.CYN if code == 0 else Clr.RED,
+            )
+            self._subprocess_exited_cleanly = code == 0
+
+    def _get_cpu_affinity_args(self, cpus: list[int] | None) -> list[str]:
+        """Return args to launch our binary pinned to cpus (if possible)."""
+        if cpus is None:
+            return []
+        taskset = shutil.which('taskset')
+        if taskset is None or not hasattr(os, 'sched_getaffinity'):
+            if not self._did_affinity_warning:
+                self._did_affinity_warning = True
+                self._log(
+                    'cpu_affinity is not supported on this platform'
+                    ' (requires taskset); ignoring.',
+                    Clr.YLW,
                 )
-                self._subprocess_exited_cleanly = code == 0
-                break
-
-            time.sleep(0.25)
+            return []
+
+        # Errors from taskset would just fail the launch, so check
+        # things here where we can complain usefully.
+        unavailable = set(cpus) - os.sched_getaffinity(0)
+        if unavailable:
+            self._log(
+                f'Error setting cpu affinity: cpu(s) {sorted(unavailable)}'
+                f' are not available.',
+                Clr.RED,
+            )
+            return []
+        return [taskset, '-c', ','.join(str(cpu) for cpu in cpus)]
 
-    def _request_shutdowns_or_restarts(self) -> None:
-        # pylint: disable=too-many-branches
-        assert current_thread() is self._subprocess_thread
-        assert self._subprocess_launch_time is not None
-        now = time.time()
-        minutes_since_launch = (now - self._subprocess_launch_time) / 60.0
-
-        # If we're doing auto-restart with config changes, handle that.
-        if (
-            self._auto_restart
-            and self._config_auto_restart
-            and not self._subprocess_sent_config_auto_restart
-        ):
-            if (
-                self._last_config_mtime_check_time is None
-                or (now - self._last_config_mtime_check_time) > 3.123
-            ):
-                self._last_config_mtime_check_time = now
-                mtime: float | None
-                config_path = self._get_config_path()
-                if os.path.isfile(config_path):
-                    mtime = Path(config_path).stat().st_mtime
-                else:
-                    mtime = None
-                if mtime != self._config_mtime:
-                    print(
-                        f'{Clr.CYN}Config-file change detected;'
-                        f' requesting immediate restart.{Clr.RST}',
-                        flush=True,
-                    )
-                    self.restart(immediate=True)
-                    self._subprocess_sent_config_auto_restart = True
+    def _schedule_exit_timers(self, settings: InstanceSettings) -> None:
+        loop = asyncio.get_running_loop()
 
         # Attempt clean exit if our clean-exit-time passes (and enforce
         # a 6 hour max if not provided).
         clean_exit_minutes = 360.0
-        if self._config.clean_exit_minutes is not None:
+        if settings.config.clean_exit_minutes is not None:
             clean_exit_minutes = min(
-                clean_exit_minutes, self._config.clean_exit_minutes
+                clean_exit_minutes, settings.config.clean_exit_minutes
             )
-        if clean_exit_minutes is not None:
-            if (
-                minutes_since_launch > clean_exit_minutes
-                and not self._subprocess_sent_clean_exit
-            ):
-                opname = 'restart' if self._auto_restart else 'shutdown'
-                print(
-                    f'{Clr.CYN}clean_exit_minutes'
-                    f' ({clean_exit_minutes})'
-                    f' elapsed; requesting soft'
-                    f' {opname}.{Clr.RST}',
-                    flush=True,
-                )
-                if self._auto_restart:
-                    self.restart(immediate=False)
-                else:
-                    self.shutdown(immediate=False)
-                self._subprocess_sent_clean_exit = True
+        self._subprocess_timers.append(
+            loop.call_later(
+                clean_exit_minutes * 60.0,
+                partial(
+                    self._on_exit_time, 'clean_exit_minutes', clean_exit_minutes
+                ),
+            )
+        )
 
         # Attempt unclean exit if our unclean-exit-time passes (and
         # enforce a 7 hour max if not provided).
         unclean_exit_minutes = 420.0
-        if self._config.unclean_exit_minutes is not None:
+        if settings.config.unclean_exit_minutes is not None:
             unclean_exit_minutes = min(
-                unclean_exit_minutes, self._config.unclean_exit_minutes
+                unclean_exit_minutes, settings.config.unclean_exit_minutes
             )
-        if unclean_exit_minutes is not None:
-            if (
-                minutes_since_launch > unclean_exit_minutes
-                and not self._subprocess_sent_unclean_exit
-            ):
-                opname = 'restart' if self._auto_restart else 'shutdown'
-                print(
-                    f'{Clr.CYN}unclean_exit_minutes'
-                    f' ({unclean_exit_minutes})'
-                    f' elapsed; requesting immediate'
-                    f' {opname}.{Clr.RST}',
-                    flush=True,
+        self._subprocess_timers.append(
+            loop.call_later(
+                unclean_exit_minutes * 60.0,
+                partial(
+                    self._on_exit_time,
+                    'unclean_exit_minutes',
+                    unclean_exit_minutes,
+                ),
+            )
+        )
+
+    def _on_exit_time(self, valname: str, minutes: float) -> None:
+        assert self._settings is not None
+        immediate = valname == 'unclean_exit_minutes'
+        auto_restart = self._settings.restart_policy is not RestartPolicy.NEVER
+        opname = 'restart' if auto_restart else 'shutdown'
+        optype = 'immediate' if immediate else 'soft'
+        self._log(
+            f'{valname} ({minutes}) elapsed; requesting {optype} {opname}.'
+        )
+        self._stop_subprocess(immediate=immediate, restart=auto_restart)
+
+    async def _watch_config(self, settings: InstanceSettings) -> None:
+        """Restart when config changes (if we're doing that)."""
+        if (
+            not settings.config_auto_restart
+            or settings.restart_policy is RestartPolicy.NEVER
+        ):
+            return
+        while True:
+            await asyncio.sleep(3.123)
+            if self._app.get_config_mtimes() != settings.config_mtimes:
+                self._log(
+                    'Config-file change detected;'
+                    ' requesting immediate restart.'
                 )
-                if self._auto_restart:
-                    self.restart(immediate=True)
-                else:
-                    self.shutdown(immediate=True)
-                self._subprocess_sent_unclean_exit = True
+                self._stop_subprocess(immediate=True, restart=True)
+                return
 
     def _reset_subprocess_vars(self) -> None:
+        for timer in self._subprocess_timers:
+            timer.cancel()
+        self._subprocess_timers = []
+        self._subprocess_kill_event.clear()
         self._subprocess = None
-        self._subprocess_launch_time = None
-        self._subprocess_sent_config_auto_restart = False
-        self._subprocess_sent_clean_exit = False
-        self._subprocess_sent_unclean_exit = False
-        self._subprocess_force_kill_time = None
+        self._subprocess_started = False
         self._subprocess_exited_cleanly = None
+        self._metrics = None
+        self._metrics_time = None
+        self._restart_desired = False
+        self._shutdown_desired = False
 
-    def _kill_subprocess(self) -> None:
+    async def _kill_subprocess(self) -> None:
         """End the server subprocess if it still exists."""
-        assert current_thread() is self._subprocess_thread
-        if self._subprocess is None:
-            return
+        assert self._subprocess is not None
 
-        print(f'{Clr.CYN}Stopping subprocess...{Clr.RST}', flush=True)
+        self._log('Stopping subprocess...')
 
         # First, ask it nicely to die and give it a moment. If that
         # doesn't work, bring down the hammer.
-        self._subprocess.terminate()
+        if self._subprocess.returncode is None:
+            self._subprocess.terminate()
         try:
-            self._subprocess.wait(timeout=10)
+            await asyncio.wait_for(self._subprocess.wait(), 10.0)
             self._subprocess_exited_cleanly = self._subprocess.returncode == 0
-        except subprocess.TimeoutExpired:
+        except TimeoutError:
             self._subprocess_exited_cleanly = False
             self._subprocess.kill()
-        print(f'{Clr.CYN}Subprocess stopped.{Clr.RST}', flush=True)
+            await self._subprocess.wait()
+        self._log('Subprocess stopped.')
+
+
+def _prometheus_escape(value: str) -> str:
+    """Escape a value for use in a Prometheus label."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
 
 
 def main() -> None:
@@ -342,6 +342,7 @@ void Logic::OnScreenSizeChange(float virtual_width, float virtual_height,
 // Bring all logic-thread stuff up to date for a new visual frame.
 void Logic::StepDisplayTime_() {
   assert(g_base->InLogicThread());
+  auto step_start_time = g_core->AppTimeMicrosecs();
 
   // We have two different modes of operation here. When running in headless
   // mode, display time is driven by upcoming events such as sim steps; we
@@ -375,6 +376,18 @@ void Logic::StepDisplayTime_() {
   if (g_core->HeadlessMode()) {
     PostUpdateDisplayTimeForHeadlessMode_();
   }
+
+  auto step_duration = g_core->AppTimeMicrosecs() - step_start_time;
+  step_stats_.count += 1;
+  step_stats_.duration_total += step_duration;
+  step_stats_.duration_max = std::max(step_stats_.duration_max, step_duration);
+}
+
+auto Logic::TakeStepStats() -> StepStats {
+  assert(g_base->InLogicThread());
+  auto stats = step_stats_;
+  step_stats_ = {};
+  return stats;
 }
 
 void Logic::OnAppModeChanged() {
@@ -114,6 +114,17 @@ class Logic {
     return display_time_increment_microsecs_;
   }
 
+  /// Durations of logic steps (each display-time step along with
+  /// everything it runs) since the last call to TakeStepStats().
+  struct StepStats {
+    int64_t count;
+    microsecs_t duration_total;
+    microsecs_t duration_max;
+  };
+
+  /// Return step stats accumulated since the last call and reset them.
+  auto TakeStepStats() -> StepStats;
+
   auto applied_app_config() const { return applied_app_config_; }
   auto shutting_down() const { return shutting_down_; }
   auto shutdown_completed() const { return shutdown_completed_; }
@@ -135,6 +146,8 @@ class Logic {
   microsecs_t display_time_microsecs_{};
   microsecs_t display_time_increment_microsecs_{1000000 / 60};
 
+  StepStats step_stats_{};
+
   // Headless scheduling.
   Timer* headless_display_time_step_timer_{};
 
@@ -7,6 +7,7 @@
 #include <vector>
 
 #include "ballistica/base/assets/assets.h"
+#include "ballistica/base/logic/logic.h"
 #include "ballistica/base/networking/network_reader.h"
 #include "ballistica/base/python/base_python.h"
 #include "ballistica/classic/support/classic_app_mode.h"
@@ -676,6 +677,114 @@ static PyMethodDef PyGetClientPublicDeviceUUIDDef = {
     "periodically with updates to the game or operating system.",
 };
 
+// ------------------------- get_client_net_stats ----------------------------
+
+static auto PyGetClientNetStats(PyObject* self, PyObject* args,
+                                PyObject* keywds) -> PyObject* {
+  BA_PYTHON_TRY;
+  static const char* kwlist[] = {nullptr};
+  if (!PyArg_ParseTupleAndKeywords(args, keywds, "",
+                                   const_cast<char**>(kwlist))) {
+    return nullptr;
+  }
+  BA_PRECONDITION(g_base->InLogicThread());
+  auto* appmode = classic::ClassicAppMode::GetActiveOrThrow();
+
+  PythonRef py_stats_list(PyList_New(0), PythonRef::kSteal);
+  for (auto&& connection : appmode->connections()->connections_to_clients()) {
+    // Connections should always be valid refs.
+    assert(connection.second.exists());
+    auto* client = connection.second.get();
+    PythonRef py_stats(Py_BuildValue("{sisf}", "client_id", client->id(),
+                                     "ping", client->current_ping()),
+                       PythonRef::kSteal);
+
+    // Rates are 64 bit values; add them individually so we don't need
+    // a Py_BuildValue format code matching their underlying type.
+    struct {
+      const char* name;
+      int64_t value;
+    } rates[] = {
+        {"bytes_in", client->GetBytesInPerSecondCompressed()},
+        {"bytes_out", client->GetBytesOutPerSecondCompressed()},
+        {"bytes_resent", client->GetBytesResentPerSecond()},
+        {"messages_in", client->GetMessagesInPerSecond()},
+        {"messages_out", client->GetMessagesOutPerSecond()},
+    };
+    for (auto&& rate : rates) {
+      PythonRef py_value(PyLong_FromLongLong(rate.value), PythonRef::kSteal);
+      int result =
+          PyDict_SetItemString(py_stats.get(), rate.name, py_value.get());
+      if (result == -1) {
+        PyErr_Clear();
+        throw Exception("Error building client net stats.");
+      }
+    }
+    // This increments ref.
+    PyList_Append(py_stats_list.get(), py_stats.get());
+  }
+  return py_stats_list.NewRef();
+  BA_PYTHON_CATCH;
+}
+
+static PyMethodDef PyGetClientNetStatsDef = {
+    "get_client_net_stats",            // name
+    (PyCFunction)PyGetClientNetStats,  // method
+    METH_VARARGS | METH_KEYWORDS,      // flags
+
+    "get_client_net_stats() -> list[dict[str, Any]]\n"
+    "\n"
+    "(internal)\n"
+    "\n"
+    "Return network stats for each connected client. Each entry\n"
+    "contains 'client_id', 'ping' (milliseconds), and per-second rates\n"
+    "for the most recent second: 'bytes_in', 'bytes_out', and\n"
+    "'bytes_resent' (as sent over the wire) plus 'messages_in' and\n"
+    "'messages_out'.",
+};
+
+// ------------------------- get_logic_step_stats ----------------------------
+
+static auto PyGetLogicStepStats(PyObject* self, PyObject* args,
+                                PyObject* keywds) -> PyObject* {
+  BA_PYTHON_TRY;
+  static const char* kwlist[] = {nullptr};
+  if (!PyArg_ParseTupleAndKeywords(args, keywds, "",
+                                   const_cast<char**>(kwlist))) {
+    return nullptr;
+  }
+  BA_PRECONDITION(g_base->InLogicThread());
+  auto stats = g_base->logic->TakeStepStats();
+  PythonRef py_stats(
+      Py_BuildValue(
+          "{sdsd}", "duration_total",
+          static_cast<double>(stats.duration_total) / 1000000.0,
+          "duration_max", static_cast<double>(stats.duration_max) / 1000000.0),
+      PythonRef::kSteal);
+  PythonRef py_count(PyLong_FromLongLong(stats.count), PythonRef::kSteal);
+  int result = PyDict_SetItemString(py_stats.get(), "count", py_count.get());
+  if (result == -1) {
+    PyErr_Clear();
+    throw Exception("Error building logic step stats.");
+  }
+  return py_stats.NewRef();
+  BA_PYTHON_CATCH;
+}
+
+static PyMethodDef PyGetLogicStepStatsDef = {
+    "get_logic_step_stats",            // name
+    (PyCFunction)PyGetLogicStepStats,  // method
+    METH_VARARGS | METH_KEYWORDS,      // flags
+
+    "get_logic_step_stats() -> dict[str, Any]\n"
+    "\n"
+    "(internal)\n"
+    "\n"
+    "Return stats on logic-thread steps since the last call and reset\n"
+    "them. Contains 'count' plus 'duration_total' and 'duration_max'\n"
+    "(in seconds), measured natively around each step.",
+};
+
 // ----------------------------- get_game_port ---------------------------------
 
 static auto PyGetGamePort(PyObject* self, PyObject* args) -> PyObject* {
@@ -900,6 +1009,8 @@ auto PythonMethodsNetworking::GetMethods() -> std::vector<PyMethodDef> {
       PyDisconnectFromHostDef,
       PyDisconnectClientDef,
       PyGetClientPublicDeviceUUIDDef,
+      PyGetClientNetStatsDef,
+      PyGetLogicStepStatsDef,
       PyGetConnectionToHostInfoDef,
       PyGetConnectionToHostInfo2Def,
       PyClientInfoQueryResponseDef,
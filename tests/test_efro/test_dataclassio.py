@@ -5,8 +5,14 @@
 
 from __future__ import annotations
 
+import os
 import copy
+import math
+import time
+import statistics
+import typing
 import datetime
+import dataclasses
 from enum import Enum
 from dataclasses import field, dataclass
 from typing import (
@@ -25,6 +31,9 @@ from efro.dataclassio import (
     dataclass_validate,
     dataclass_from_dict,
     dataclass_to_dict,
+    dataclass_to_json,
+    dataclass_to_bytes,
+    dataclass_from_bytes,
     ioprepped,
     ioprep,
     IOAttrs,
@@ -33,10 +42,13 @@ from efro.dataclassio import (
     IOExtendedData,
     IOMultiType,
     TypeNotPresentError,
+    parse_annotated,
 )
 
 if TYPE_CHECKING:
-    from typing import Self
+    from typing import Self, Callable
+
+FAST_MODE = os.environ.get('BA_TEST_FAST_MODE') == '1'
 
 
 class _EnumTest(Enum):
@@ -2073,3 +2085,425 @@ def test_multi_type_missing() -> None:
     # Make sure the lossy load disallows output.
     with pytest.raises(ValueError):
         _out2c = dataclass_to_dict(val2c)
+
+
+@ioprepped
+@dataclass
+class _NestedCompiledTestClass:
+    enval: Annotated[_GoodEnum, IOAttrs('e', enum_fallback=_GoodEnum.VAL1)]
+
+
+@dataclass
+class _CompiledTestClass:
+    ival: Annotated[int, IOAttrs('i')] = 0
+    fval: float = 0.0
+    sval: Annotated[str, IOAttrs('s', store_default=False)] = ''
+    oval: int | None = None
+    lval: list[_GoodEnum] = field(default_factory=list)
+    tval: tuple[int, str, Any] = (0, '', None)
+    setval: set[str] = field(default_factory=set)
+    dval: dict[int, _NestedCompiledTestClass] = field(default_factory=dict)
+    edval: dict[_GoodEnum2, list[str]] = field(default_factory=dict)
+    anyval: Any = None
+    dtval: Annotated[
+        datetime.datetime | None, IOAttrs('dt', whole_minutes=True)
+    ] = None
+    tdval: Annotated[datetime.timedelta, IOAttrs(float_times=True)] = (
+        datetime.timedelta()
+    )
+    bval: bytes = b''
+    mtval: list[MTTestBase] = field(default_factory=list)
+    softval: Annotated[
+        list[int], IOAttrs('sv', soft_default_factory=lambda: [1, 2])
+    ] = field(default_factory=list)
+    recval: _CompiledTestClass | None = None
+
+
+def test_compiled() -> None:
+    """Test compiled encoders/decoders against interpreted ones."""
+
+    # Recursive type; need to prep explicitly.
+    ioprep(_CompiledTestClass)
+
+    now = utc_now().replace(second=0, microsecond=0)
+    obj = _CompiledTestClass(
+        ival=3,
+        fval=2,
+        sval='foo',
+        oval=5,
+        lval=[_GoodEnum.VAL2, _GoodEnum.VAL1],
+        tval=(1, 'two', {'three': [3]}),
+        setval={'c', 'a', 'b'},
+        dval={7: _NestedCompiledTestClass(enval=_GoodEnum.VAL2)},
+        edval={_GoodEnum2.VAL2: ['x']},
+        anyval={'foo': [1, 2.0, None, True]},
+        dtval=now,
+        tdval=datetime.timedelta(seconds=2.5),
+        bval=b'abc',
+        mtval=[MTTestClass1(ival=4), MTTestClass2(sval='s')],
+        recval=_CompiledTestClass(ival=9),
+    )
+    for codec in Codec:
+        out = dataclass_to_dict(obj, codec=codec)
+        assert dataclass_to_dict(obj, codec=codec, compiled=True) == out
+        obj2 = dataclass_from_dict(
+            _CompiledTestClass, out, codec=codec, compiled=True
+        )
+        assert obj2 == dataclass_from_dict(_CompiledTestClass, out, codec=codec)
+        assert obj2.fval == 2.0 and isinstance(obj2.fval, float)
+
+    # Soft-defaults and extra-attrs should behave the same too.
+    indata = {'i': 1, 'unknown': {'a': 1}}
+    obj3 = dataclass_from_dict(_CompiledTestClass, indata, compiled=True)
+    assert obj3.softval == [1, 2]
+    assert dataclass_to_dict(obj3, compiled=True) == dataclass_to_dict(
+        dataclass_from_dict(_CompiledTestClass, indata)
+    )
+    assert 'unknown' in dataclass_to_dict(obj3, compiled=True)
+    assert 'unknown' not in dataclass_to_dict(
+        obj3, discard_extra_attrs=True, compiled=True
+    )
+    with pytest.raises(AttributeError):
+        dataclass_from_dict(
+            _CompiledTestClass,
+            indata,
+            allow_unknown_attrs=False,
+            compiled=True,
+        )
+
+    # Lossy loading should apply enum fallbacks and prevent output.
+    lossydata = {'dval': {'1': {'e': 'nope'}}}
+    with pytest.raises(ValueError):
+        dataclass_from_dict(_CompiledTestClass, lossydata, compiled=True)
+    obj4 = dataclass_from_dict(
+        _CompiledTestClass, lossydata, lossy=True, compiled=True
+    )
+    assert obj4.dval[1].enval is _GoodEnum.VAL1
+    with pytest.raises(ValueError):
+        dataclass_to_dict(obj4, compiled=True)
+
+    # Make sure we give the same error types for bad data.
+    badobjs: list[Any] = [
+        _CompiledTestClass(ival='nope'),  # type: ignore
+        _CompiledTestClass(fval='nope'),  # type: ignore
+        _CompiledTestClass(lval=['nope']),  # type: ignore
+        _CompiledTestClass(tval=(1, 2)),  # type: ignore
+        _CompiledTestClass(dval={'nope': 1}),  # type: ignore
+        _CompiledTestClass(dtval=now.replace(second=1)),
+        _CompiledTestClass(
+            mtval=[_NestedCompiledTestClass(_GoodEnum.VAL1)]  # type: ignore
+        ),
+        _CompiledTestClass(anyval=(1, 2)),
+    ]
+    for badobj in badobjs:
+        with pytest.raises(Exception) as excinfo:
+            dataclass_to_dict(badobj)
+        with pytest.raises(type(excinfo.value)):
+            dataclass_to_dict(badobj, compiled=True)
+
+    baddicts: list[dict] = [
+        {'i': 1.0},
+        {'lval': ['nope']},
+        {'tval': [1, 'a']},
+        {'dval': {'x': {'e': 'val1'}}},
+        {'dt': [2020, 1, 1, 0, 0, 1, 0]},
+        {'mtval': [{'_dciotype': 'nope'}]},
+        {'bval': 123},
+    ]
+    for baddict in baddicts:
+        with pytest.raises(Exception) as excinfo:
+            dataclass_from_dict(_CompiledTestClass, baddict)
+        with pytest.raises(type(excinfo.value)):
+            dataclass_from_dict(_CompiledTestClass, baddict, compiled=True)
+
+
+def _sample_value(anntype: Any, depth: int) -> Any:
+    """Build a sample value for an annotation (for codec comparisons)."""
+    # pylint: disable=too-many-return-statements
+    # pylint: disable=too-many-branches
+    # pylint: disable=unidiomatic-typecheck
+    anntype, _ioattrs = parse_annotated(anntype)
+    origin = typing.get_origin(anntype) or anntype
+    args = typing.get_args(anntype)
+    if origin is Any:
+        return {'any': [1, 'two']}
+    if origin in (typing.Union, getattr(typing, 'UnionType', None)) or (
+        type(None) in args
+    ):
+        child = [a for a in args if a is not type(None)][0]
+        return None if depth > 3 else _sample_value(child, depth + 1)
+    if origin in (int, float, str, bool):
+        return {int: 3, float: 1.5, str: 'sample', bool: True}[origin]
+    if origin in (list, set):
+        if not args or depth > 3:
+            return origin()
+        return origin([_sample_value(args[0], depth + 1)])
+    if origin is tuple:
+        return tuple(_sample_value(a, depth + 1) for a in args)
+    if origin is dict:
+        if not args or args[0] is Any or depth > 3:
+            return {}
+        return {
+            _sample_value(args[0], depth + 1): _sample_value(args[1], depth + 1)
+        }
+    if origin is datetime.datetime:
+        # Whole days satisfy all IOAttrs granularity requirements.
+        return utc_now().replace(hour=0, minute=0, second=0, microsecond=0)
+    if origin is datetime.timedelta:
+        return datetime.timedelta(seconds=5)
+    if origin is bytes:
+        return b'sample'
+    if isinstance(origin, type) and dataclasses.is_dataclass(origin):
+        return _sample_dataclass(origin, depth + 1)
+    if issubclass(origin, IOMultiType):
+        for type_id in origin.get_type_id_type():
+            try:
+                return _sample_dataclass(
+                    origin.get_type_cached(type_id), depth + 1
+                )
+            except TypeNotPresentError:
+                continue
+    if issubclass(origin, Enum):
+        return next(iter(origin))
+    raise TypeError(f'No sample value for {anntype}.')
+
+
+def _sample_dataclass(cls: type, depth: int = 0) -> Any:
+    hints = typing.get_type_hints(cls, localns=vars(cls), include_extras=True)
+    return cls(
+        **{
+            f.name: _sample_value(hints[f.name], depth)
+            for f in dataclasses.fields(cls)
+            if f.init
+        }
+    )
+
+
+def _get_bacommon_message_samples() -> list[Any]:
+    import bacommon.bs
+    import bacommon.cloud
+    from efro.message import Message, Response
+
+    out: list[Any] = []
+    for module in (bacommon.cloud, bacommon.bs):
+        for name in sorted(dir(module)):
+            obj = getattr(module, name)
+            is_dataclass = dataclasses.is_dataclass(obj)
+            if (
+                is_dataclass
+                and isinstance(obj, type)
+                and issubclass(obj, (Message, Response))
+            ):
+                out.append(_sample_dataclass(obj))
+    assert out
+    return out
+
+
+def test_compiled_bacommon() -> None:
+    """Compare compiled and interpreted codecs on real message types."""
+    for sample in _get_bacommon_message_samples():
+        for codec in Codec:
+            out = dataclass_to_dict(sample, codec=codec)
+            assert dataclass_to_dict(sample, codec=codec, compiled=True) == out
+            assert (
+                dataclass_from_dict(type(sample), out, codec=codec)
+                == dataclass_from_dict(
+                    type(sample), out, codec=codec, compiled=True
+                )
+                == sample
+            )
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+def test_compiled_speed() -> None:
+    """Benchmark compiled vs interpreted codecs on message types.
+
+    Run with '-s' to see results.
+    """
+    samples = _get_bacommon_message_samples()
+    dicts = [dataclass_to_dict(s) for s in samples]
+    iterations = 200
+    results: dict[str, float] = {}
+    for compiled in (False, True):
+        starttime = time.perf_counter()
+        for _i in range(iterations):
+            for sample in samples:
+                dataclass_to_dict(sample, compiled=compiled)
+        enctime = time.perf_counter() - starttime
+
+        starttime = time.perf_counter()
+        for _i in range(iterations):
+            for sample, sdict in zip(samples, dicts):
+                dataclass_from_dict(type(sample), sdict, compiled=compiled)
+        dectime = time.perf_counter() - starttime
+
+        name = 'compiled' if compiled else 'interpreted'
+        results[f'{name} encode'] = enctime
+        results[f'{name} decode'] = dectime
+
+    count = iterations * len(samples)
+    print(f'\ndataclassio codec speeds ({len(samples)} message types):')
+    for name, duration in results.items():
+        print(f'  {name}: {count / duration:.0f} objects/sec')
+
+
+def test_binary() -> None:
+    """Test binary codec functionality."""
+    from efro.dataclassio._binary import binary_dumps, binary_loads
+
+    now = utc_now()
+    vals: list[Any] = [
+        None,
+        True,
+        False,
+        0,
+        127,
+        128,
+        -1,
+        -32,
+        -33,
+        2**70,
+        -(2**70),
+        1.5,
+        -0.0,
+        '',
+        'ab',
+        'unicode \u2603',
+        'x' * 1000,
+        b'',
+        b'\x00\xff' * 100,
+        now,
+        datetime.datetime(1900, 1, 1, tzinfo=datetime.timezone.utc),
+        list(range(100)),
+        {f'key{i}': [f'key{i}', {'nested': None}] for i in range(20)},
+    ]
+    for val in vals:
+        assert binary_loads(binary_dumps(val)) == val
+    assert binary_loads(binary_dumps(vals)) == vals
+
+    # Repeated strings should be stored as back-references.
+    assert (
+        len(binary_dumps(['abcdefgh'] * 10))
+        < len(binary_dumps(['abcdefgh'])) + 2 * 10
+    )
+
+    # Unsupported types and malformed data should fail cleanly.
+    with pytest.raises(TypeError):
+        binary_dumps((1, 2))
+    with pytest.raises(ValueError):
+        binary_dumps(utc_now_naive())
+    with pytest.raises(TypeError):
+        binary_dumps({1: 2})
+    for baddata in (
+        b'',
+        b'\x63\x00',
+        binary_dumps('abcdefg')[:-1],
+        b'\x01\xcb\x00',  # Truncated float.
+        b'\x01\xd4' + b'\xff' * 20 + b'\x01',  # Out of range datetime.
+        b'\x01\x81\x90\x00',  # Non-str map key.
+        b'\x01\xa1\xff',  # Invalid utf-8.
+        b'\x01\xd5\x09',  # Invalid string-table index.
+        b'\x01\xc1',  # Invalid tag.
+    ):
+        with pytest.raises(ValueError):
+            binary_loads(baddata)
+    with pytest.raises(ValueError):
+        binary_loads(binary_dumps(1) + b'\x00')
+
+    # Reasonably deep nesting is fine but anything absurd should be
+    # rejected as malformed (not blow out our stack).
+    deep: Any = None
+    for _i in range(100):
+        deep = [{'a': deep}]
+    assert binary_loads(binary_dumps(deep)) == deep
+    for baddata in (
+        b'\x01' + b'\x91' * 100000,
+        b'\x01' + b'\x81\x61' * 100000,
+        b'\x01' + b'\xdc\x01' * 300 + b'\xc0',
+    ):
+        with pytest.raises(ValueError):
+            binary_loads(baddata)
+
+    # Full dataclass round trips; bytes and datetimes stay native.
+    ioprep(_CompiledTestClass)
+    obj = _CompiledTestClass(
+        ival=-5,
+        sval='foo',
+        lval=[_GoodEnum.VAL2],
+        tval=(1, 'two', [3]),
+        setval={'b', 'a'},
+        dval={7: _NestedCompiledTestClass(enval=_GoodEnum.VAL2)},
+        dtval=now.replace(second=0, microsecond=0),
+        bval=b'abc' * 100,
+        mtval=[MTTestClass1(ival=4), MTTestClass2(sval='s')],
+        recval=_CompiledTestClass(ival=9),
+    )
+    data = dataclass_to_bytes(obj)
+    assert dataclass_from_bytes(_CompiledTestClass, data) == obj
+    assert dataclass_to_dict(obj, codec=Codec.BINARY) == dataclass_to_dict(
+        obj, codec=Codec.FIRESTORE
+    )
+    assert len(data) < len(dataclass_to_json(obj).encode())
+
+    samples = _get_bacommon_message_samples()
+    for sample in samples:
+        assert (
+            dataclass_from_bytes(type(sample), dataclass_to_bytes(sample))
+            == sample
+        )
+
+    # We promise binary output at least 2x smaller than json for our
+    # message types.
+    assert 2 * sum(len(dataclass_to_bytes(s)) for s in samples) <= sum(
+        len(dataclass_to_json(s).encode()) for s in samples
+    )
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+def test_binary_speed() -> None:
+    """Benchmark binary vs json output on message types.
+
+    Run with '-s' to see results. Note that binary output always goes
+    through compiled codecs, so compiled json is the apples-to-apples
+    comparison here.
+    """
+    # pylint: disable=too-many-locals
+    samples = _get_bacommon_message_samples()
+    iterations = 50
+    count = iterations * len(samples)
+    print(f'\ndataclassio output ({len(samples)} message types):')
+    calls: list[tuple[str, Callable[[Any], bytes]]] = [
+        ('json', lambda s: dataclass_to_json(s).encode()),
+        (
+            'json (compiled)',
+            lambda s: dataclass_to_json(s, compiled=True).encode(),
+        ),
+        ('binary', dataclass_to_bytes),
+    ]
+    # Time all back to back in a number of short rounds and compare
+    # per-round; that holds up much better against machine noise than
+    # comparing overall times.
+    durations = {name: math.inf for name, _call in calls}
+    ratios: dict[str, list[float]] = {name: [] for name, _call in calls}
+    for _run in range(15):
+        rounddurations: dict[str, float] = {}
+        for name, call in calls:
+            starttime = time.perf_counter()
+            for _i in range(iterations):
+                for sample in samples:
+                    call(sample)
+            rounddurations[name] = time.perf_counter() - starttime
+            durations[name] = min(durations[name], rounddurations[name])
+        for name, _call in calls:
+            ratios[name].append(rounddurations[name] / rounddurations['binary'])
+    for name, call in calls:
+        size = sum(len(call(s)) for s in samples)
+        note = (
+            ''
+            if name == 'binary'
+            else f' (binary {statistics.median(ratios[name]):.2f}x as fast)'
+        )
+        print(
+            f'  {name}: {size} total bytes,'
+            f' {count / durations[name]:.0f} objects/sec{note}'
+        )
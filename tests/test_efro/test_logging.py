@@ -0,0 +1,392 @@
+# Released under the MIT License. See LICENSE for details.
+#
+"""Testing logging functionality."""
+
+from __future__ import annotations
+
+import io
+import os
+import time
+import random
+import logging
+import datetime
+import tempfile
+
+import pytest
+
+from efro.logging import (
+    LogHandler,
+    LogEntry,
+    LogLevel,
+    LogRotation,
+    get_log_segments,
+    read_log_entries,
+)
+from efro.dataclassio import dataclass_from_json
+
+FAST_MODE = os.environ.get('BA_TEST_FAST_MODE') == '1'
+
+
+def _make_logger(name: str, handler: LogHandler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+def _fill_cache(
+    handler: LogHandler, count: int, basetime: float, seed: int = 0
+) -> None:
+    """Send records with assorted names/levels/times to a handler."""
+    rng = random.Random(seed)
+    names = ['app', 'app.net', 'app.net.http', 'app.ui', 'other', 'apple']
+    levels = [logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR]
+    for i in range(count):
+        name = rng.choice(names)
+        record = logging.getLogger(name).makeRecord(
+            name, rng.choice(levels), __file__, 0, 'entry %d', (i,), None
+        )
+        # Mostly in time order but with some stragglers.
+        record.created = basetime + i * 0.1 - rng.choice([0.0] * 9 + [30.0])
+        handler.handle(record)
+
+
+def _read_entries(path: str) -> list[LogEntry]:
+    with open(path, encoding='utf-8') as infile:
+        return [dataclass_from_json(LogEntry, line) for line in infile]
+
+
+def test_log_file() -> None:
+    """Test structured log file output."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'log.json')
+        handler = LogHandler(
+            path=path,
+            echofile=None,
+            cache_size_limit=0,
+            cache_time_limit=None,
+            strict_threads=True,
+        )
+        logger = _make_logger('test_log_file', handler)
+
+        logger.info('hello %s', 'there', extra={'labels': {'foo': 'bar'}})
+        logger.warning('uh oh')
+
+        # Regular entries are buffered but should go out on their own
+        # after a short bit.
+        starttime = time.monotonic()
+        while len(_read_entries(path)) < 2:
+            assert time.monotonic() - starttime < 5.0
+            time.sleep(0.01)
+
+        # Errors should go out immediately.
+        logger.error('yikes')
+        starttime = time.monotonic()
+        while len(_read_entries(path)) < 3:
+            assert time.monotonic() - starttime < 5.0
+            time.sleep(0.01)
+
+        handler.shutdown()
+
+        entries = _read_entries(path)
+        assert [e.message for e in entries] == ['hello there', 'uh oh', 'yikes']
+        assert [e.level for e in entries] == [
+            LogLevel.INFO,
+            LogLevel.WARNING,
+            LogLevel.ERROR,
+        ]
+        assert entries[0].name == 'test_log_file'
+        assert entries[0].labels == {'foo': 'bar'}
+
+        # And anything left over should go out at shutdown.
+        path = os.path.join(tmpdir, 'log2.json')
+        handler = LogHandler(
+            path=path,
+            echofile=None,
+            cache_size_limit=0,
+            cache_time_limit=None,
+            strict_threads=True,
+            file_flush_interval=100.0,
+        )
+        logger = _make_logger('test_log_file', handler)
+        logger.info('bye')
+        handler.shutdown()
+        assert [e.message for e in _read_entries(path)] == ['bye']
+
+
+def test_log_rotation() -> None:
+    """Test size-based log rotation, compression, and retention."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'log.json')
+
+        def _make_handler() -> LogHandler:
+            return LogHandler(
+                path=path,
+                echofile=None,
+                cache_size_limit=0,
+                cache_time_limit=None,
+                strict_threads=True,
+                rotation=LogRotation(max_bytes=1000, max_archives=3),
+                # Write out every entry as it comes in.
+                file_flush_size=1,
+            )
+
+        handler = _make_handler()
+        logger = _make_logger('test_log_rotation', handler)
+        for i in range(200):
+            logger.info('entry %d', i)
+        handler.shutdown()
+
+        # We should be left with our live file plus 3 compressed
+        # segments, and should be able to read back a contiguous run of
+        # entries ending with our last one.
+        segments = get_log_segments(path)
+        assert len(segments) == 4
+        assert all(p.name.endswith('.gz') for p in segments[:-1])
+        assert segments[-1] == segments[0].parent / 'log.json'
+        messages = [e.message for e in read_log_entries(path)]
+        first = int(messages[0].split()[1])
+        assert first > 0
+        assert messages == [f'entry {i}' for i in range(first, 200)]
+
+        # Starting up again should rotate out the previous live file
+        # instead of clobbering it.
+        handler = _make_handler()
+        logger = _make_logger('test_log_rotation', handler)
+        logger.info('second run')
+        handler.shutdown()
+        messages2 = [e.message for e in read_log_entries(path)]
+        assert len(get_log_segments(path)) == 4
+        assert messages2[-2:] == ['entry 199', 'second run']
+
+
+def test_log_rotation_interval() -> None:
+    """Test time-based log rotation without compression."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'log.json')
+        handler = LogHandler(
+            path=path,
+            echofile=None,
+            cache_size_limit=0,
+            cache_time_limit=None,
+            strict_threads=True,
+            rotation=LogRotation(
+                interval=datetime.timedelta(seconds=0.1), compress=False
+            ),
+        )
+        logger = _make_logger('test_log_rotation_interval', handler)
+        for i in range(3):
+            logger.error('entry %d', i)
+            time.sleep(0.15)
+        handler.shutdown()
+
+        # Each entry should have landed in its own file.
+        segments = get_log_segments(path)
+        assert len(segments) == 3
+        assert not any(p.name.endswith('.gz') for p in segments)
+        assert [e.message for e in read_log_entries(path)] == [
+            'entry 0',
+            'entry 1',
+            'entry 2',
+        ]
+        assert _read_entries(path)[0].message == 'entry 2'
+
+
+@pytest.mark.parametrize('in_thread', [False, True])
+def test_log_echo(in_thread: bool) -> None:
+    """Test echoing log output at the call site or in our thread."""
+    echofile = io.StringIO()
+    handler = LogHandler(
+        path=None,
+        echofile=echofile,
+        cache_size_limit=0,
+        cache_time_limit=None,
+        strict_threads=True,
+        echofile_in_thread=in_thread,
+    )
+    logger = _make_logger('test_log_echo', handler)
+    mutable = ['a']
+    logger.info('hello %s', 'there')
+    logger.warning('list is %s', mutable)
+    mutable.append('b')
+    handler.shutdown()
+
+    lines = echofile.getvalue().splitlines()
+    assert len(lines) == 2
+    assert 'test_log_echo:' in lines[0] and 'hello there' in lines[0]
+    # Mutable args should be captured as of the log call.
+    assert "list is ['a']" in lines[1]
+
+    latencies = handler.get_emit_latencies()
+    assert set(latencies) == {50.0, 90.0, 99.0, 99.9}
+    assert all(0.0 <= val < 5.0 for val in latencies.values())
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+def test_log_echo_latency() -> None:
+    """Compare emit latencies for call-site vs in-thread echoing.
+
+    Run with '-s' to see results.
+    """
+    count = 20_000
+    with open(os.devnull, 'w', encoding='utf-8') as echofile:
+        for in_thread in (False, True):
+            handler = LogHandler(
+                path=None,
+                echofile=echofile,
+                cache_size_limit=0,
+                cache_time_limit=None,
+                strict_threads=True,
+                echofile_in_thread=in_thread,
+            )
+            logger = _make_logger('test_log_echo_latency', handler)
+            for i in range(count):
+                logger.info('log entry number %d', i)
+            handler.shutdown()
+            latencies = handler.get_emit_latencies()
+            desc = ', '.join(
+                f'p{pct:g} {val * 1e6:.1f}us' for pct, val in latencies.items()
+            )
+            print(
+                f'\nemit latency (echo in thread: {in_thread}): {desc}.',
+                end='',
+            )
+    print()
+
+
+@pytest.mark.parametrize('cache_size_limit', [1_000_000_000, 300_000])
+def test_log_query(cache_size_limit: int) -> None:
+    """Test querying cached entries against a brute-force search."""
+    handler = LogHandler(
+        path=None,
+        echofile=None,
+        cache_size_limit=cache_size_limit,
+        cache_time_limit=None,
+        strict_threads=True,
+    )
+    basetime = time.time() - 1000.0
+    _fill_cache(handler, 3000, basetime)
+    handler.shutdown()
+
+    archive = handler.get_cached()
+    everything = list(enumerate(archive.entries, archive.start_index))
+    assert archive.log_size == 3000
+    if cache_size_limit < 1_000_000_000:
+        # Make sure we exercised pruning.
+        assert archive.start_index > 0
+
+    def _dt(offset: float) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(basetime + offset, datetime.UTC)
+
+    cases: list[dict] = [
+        {},
+        {'names': ['app.net']},
+        {'names': ['app', 'other'], 'min_level': LogLevel.WARNING},
+        {'min_level': LogLevel.ERROR},
+        {'since': _dt(240.0), 'until': _dt(260.0)},
+        {'since': _dt(250.0), 'names': ['app.ui']},
+        {'until': _dt(200.0), 'min_level': LogLevel.INFO},
+        {'names': ['nonexistent']},
+        {'names': ['app'], 'start_index': 2000, 'max_entries': 10},
+    ]
+    for case in cases:
+        names = case.get('names')
+        min_level = case.get('min_level')
+        since = case.get('since')
+        until = case.get('until')
+        start_index = case.get('start_index', 0)
+        expected = [
+            (index, entry)
+            for index, entry in everything
+            if index >= start_index
+            and (
+                names is None
+                or any(
+                    entry.name == n or entry.name.startswith(f'{n}.')
+                    for n in names
+                )
+            )
+            and (min_level is None or entry.level.value >= min_level.value)
+            and (since is None or entry.time >= since)
+            and (until is None or entry.time <= until)
+        ]
+        max_entries = case.get('max_entries')
+        assert handler.query(**case) == expected[:max_entries], case
+        assert (
+            handler.query(**case, newest_first=True)
+            == expected[::-1][:max_entries]
+        ), case
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+def test_log_query_speed() -> None:
+    """Compare indexed queries against scanning the whole cache.
+
+    Run with '-s' to see results.
+    """
+    handler = LogHandler(
+        path=None,
+        echofile=None,
+        cache_size_limit=1_000_000_000,
+        cache_time_limit=None,
+        strict_threads=True,
+    )
+    basetime = time.time() - 100_000.0
+    _fill_cache(handler, 100_000, basetime)
+    handler.shutdown()
+    since = datetime.datetime.fromtimestamp(basetime + 9000.0, datetime.UTC)
+
+    starttime = time.perf_counter()
+    scanned = [
+        e
+        for e in handler.get_cached().entries
+        if e.name == 'other' and e.level is LogLevel.ERROR and e.time >= since
+    ]
+    scan_duration = time.perf_counter() - starttime
+
+    starttime = time.perf_counter()
+    queried = handler.query(
+        names=['other'], min_level=LogLevel.ERROR, since=since
+    )
+    query_duration = time.perf_counter() - starttime
+    assert [e for _i, e in queried] == scanned
+    print(
+        f'\nlog query: {query_duration * 1000.0:.2f}ms'
+        f' vs {scan_duration * 1000.0:.2f}ms scanning'
+        f' ({len(queried)} matches of 100000).'
+    )
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+def test_log_file_throughput() -> None:
+    """Benchmark writing lots of entries to a structured log file.
+
+    Run with '-s' to see results.
+    """
+    count = 100_000
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'log.json')
+        handler = LogHandler(
+            path=path,
+            echofile=None,
+            cache_size_limit=0,
+            cache_time_limit=None,
+            strict_threads=True,
+        )
+        logger = _make_logger('test_log_file_throughput', handler)
+
+        starttime = time.perf_counter()
+        for i in range(count):
+            logger.info('log entry number %d', i)
+        handler.shutdown()
+        duration = time.perf_counter() - starttime
+
+        entries = _read_entries(path)
+        assert len(entries) == count
+        assert entries[-1].message == f'log entry number {count - 1}'
+
+        print(
+            f'\nlog file throughput: {count / duration:.0f} entries/sec'
+            f' ({count} entries in {duration:.2f}s).'
+        )
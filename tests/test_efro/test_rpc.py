@@ -1,12 +1,15 @@
 # Released under the MIT License. See LICENSE for details.
 #
+# pylint: disable=too-many-lines
 """Testing rpc functionality."""
 
 from __future__ import annotations
 
 import os
 import time
+import socket
 import random
+import tracemalloc
 import asyncio
 import weakref
 from enum import unique, Enum
@@ -15,12 +18,21 @@ from dataclasses import dataclass
 
 import pytest
 
-from efro.rpc import RPCEndpoint
+from efro.rpc import RPCEndpoint, RPCPool, OUR_PROTOCOL
 from efro.error import CommunicationError
+from efro.message import MessageSender, MessageReceiver
 from efro.dataclassio import ioprepped, dataclass_from_json, dataclass_to_json
+from bacommon.servermanager import (
+    get_server_control_protocol,
+    ChatMessageCommand,
+    StatusCommand,
+    StatusResponse,
+)
 
 if TYPE_CHECKING:
-    from typing import Awaitable
+    from typing import Any, Awaitable, Callable
+
+    from efro.message import Response
 
 FAST_MODE = os.environ.get('BA_TEST_FAST_MODE') == '1'
 
@@ -58,11 +70,14 @@ class _ServerClientCommon:
         keepalive_interval: float,
         keepalive_timeout: float,
         debug_print: bool,
+        protocol: int,
     ) -> None:
         self._endpoint: RPCEndpoint | None = None
         self._keepalive_interval = keepalive_interval
         self._keepalive_timeout = keepalive_timeout
         self._debug_print = debug_print
+        self._protocol = protocol
+        self.handled_big = False
 
     def has_endpoint(self) -> bool:
         """Is our endpoint up yet?"""
@@ -104,6 +119,7 @@ class _ServerClientCommon:
             return _Message(_MessageType.RESPONSE_SLOW)
 
         if msg.messagetype is _MessageType.TEST_BIG:
+            self.handled_big = True
             # 5 Mb Response
             return _Message(
                 _MessageType.RESPONSE_BIG,
@@ -124,11 +140,13 @@ class _Server(_ServerClientCommon):
         keepalive_interval: float,
         keepalive_timeout: float,
         debug_print: bool,
+        protocol: int,
     ) -> None:
         super().__init__(
             keepalive_interval=keepalive_interval,
             keepalive_timeout=keepalive_timeout,
             debug_print=debug_print,
+            protocol=protocol,
         )
         self.listener: asyncio.base_events.Server | None = None
 
@@ -166,6 +184,7 @@ class _Server(_ServerClientCommon):
             debug_print=self._debug_print,
             label='test_rpc_server',
         )
+        self._endpoint.test_protocol = self._protocol
 
         await self._endpoint.run()
 
@@ -176,11 +195,13 @@ class _Client(_ServerClientCommon):
         keepalive_interval: float,
         keepalive_timeout: float,
         debug_print: bool,
+        protocol: int,
     ) -> None:
         super().__init__(
             keepalive_interval=keepalive_interval,
             keepalive_timeout=keepalive_timeout,
             debug_print=debug_print,
+            protocol=protocol,
         )
 
     async def run(self) -> None:
@@ -198,26 +219,32 @@ class _Client(_ServerClientCommon):
             debug_print=self._debug_print,
             label='test_rpc_client',
         )
+        self._endpoint.test_protocol = self._protocol
         await self._endpoint.run()
 
 
 class _Tester:
     def __init__(
         self,
+        *,
         keepalive_interval: float = RPCEndpoint.DEFAULT_KEEPALIVE_INTERVAL,
         keepalive_timeout: float = RPCEndpoint.DEFAULT_KEEPALIVE_TIMEOUT,
         server_debug_print: bool = True,
         client_debug_print: bool = True,
+        server_protocol: int = OUR_PROTOCOL,
+        client_protocol: int = OUR_PROTOCOL,
     ) -> None:
         self.client = _Client(
             keepalive_interval=keepalive_interval,
             keepalive_timeout=keepalive_timeout,
             debug_print=client_debug_print,
+            protocol=client_protocol,
         )
         self.server = _Server(
             keepalive_interval=keepalive_interval,
             keepalive_timeout=keepalive_timeout,
             debug_print=server_debug_print,
+            protocol=server_protocol,
         )
 
     def run(self, testcall: Awaitable[None]) -> None:
@@ -391,6 +418,725 @@ def test_simultaneous_messages() -> None:
     tester.run(_do_it())
 
 
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+def test_interleaved_messages() -> None:
+    """Test small messages getting through during big transfers."""
+    tester = _Tester()
+
+    async def _do_it() -> None:
+        for sender, receiver in (
+            (tester.client, tester.server),
+            (tester.server, tester.client),
+        ):
+            # Kick off a 20 Mb message and keep sending small messages
+            # while it is in flight. Small messages should not have to
+            # wait for the big one to get through. (Random data so that
+            # compression doesn't shrink it away).
+            bigtask = asyncio.create_task(
+                sender.send_message(
+                    _Message(
+                        _MessageType.TEST_BIG,
+                        extradata=os.urandom(1024 * 1024 * 20),
+                    )
+                )
+            )
+            await asyncio.sleep(0)
+            starttime = time.monotonic()
+            early_count = 0
+            latencies: list[float] = []
+            while not bigtask.done():
+                msgstarttime = time.monotonic()
+                await sender.send_message(_Message(_MessageType.TEST1))
+                latencies.append(time.monotonic() - msgstarttime)
+                if not receiver.handled_big:
+                    early_count += 1
+            resp = await bigtask
+            assert resp.messagetype is _MessageType.RESPONSE_BIG
+            print(
+                f'{len(latencies)} small messages ({early_count} before'
+                f' big message arrived; max latency'
+                f' {max(latencies):.4f}s) during'
+                f' {time.monotonic() - starttime:.4f}s big message.'
+            )
+            assert early_count > 1
+            receiver.handled_big = False
+
+    tester.run(_do_it())
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+@pytest.mark.parametrize(
+    'server_protocol, client_protocol',
+    [(2, 3), (3, 2), (2, 2), (3, OUR_PROTOCOL), (OUR_PROTOCOL, 3)],
+)
+def test_older_protocols(server_protocol: int, client_protocol: int) -> None:
+    """Test big messages with peers using older protocols."""
+    tester = _Tester(
+        server_protocol=server_protocol, client_protocol=client_protocol
+    )
+
+    async def _do_it() -> None:
+        for sender in (tester.client, tester.server):
+            results = await asyncio.gather(
+                sender.send_message(
+                    _Message(
+                        _MessageType.TEST_BIG,
+                        extradata=bytes(bytearray(1024 * 1024)),
+                    )
+                ),
+                sender.send_message(_Message(_MessageType.TEST1)),
+                sender.send_message(
+                    _Message(_MessageType.TEST2, extradata=b'x' * 50000)
+                ),
+            )
+            assert [r.messagetype for r in results] == [
+                _MessageType.RESPONSE_BIG,
+                _MessageType.RESPONSE1,
+                _MessageType.RESPONSE2,
+            ]
+
+    tester.run(_do_it())
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+def test_backpressure_stats() -> None:
+    """Test backpressured sends and stats with a healthy peer."""
+    tester = _Tester()
+
+    async def _do_it() -> None:
+        endpoint = tester.client.endpoint
+        msg = dataclass_to_json(_Message(_MessageType.TEST1)).encode()
+        results = await asyncio.gather(
+            *[endpoint.send_message_with_backpressure(msg) for _ in range(500)]
+        )
+        assert len(results) == 500
+        stats = endpoint.get_stats()
+        assert stats.queued_packets == 0
+        assert stats.queued_bytes == 0
+        assert stats.peak_queued_packets > 0
+        assert stats.total_bytes_written > 500 * len(msg)
+
+        # Packets enqueued together should get written together.
+        assert 0 < stats.drain_count < 500
+        assert stats.backpressure_wait_count == 0
+
+    tester.run(_do_it())
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+def test_backpressure() -> None:
+    """Test backpressure against a peer that never reads anything."""
+
+    async def _do_it() -> None:
+        # pylint: disable=too-many-locals
+        async def _handle_client(
+            reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+        ) -> None:
+            # Send a handshake and then just sit there not reading.
+            writer.get_extra_info('socket').setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, 64 * 1024
+            )
+            handshake = b'{"p": 3, "k": 10.0}'
+            writer.write(len(handshake).to_bytes(4, 'big') + handshake)
+            await writer.drain()
+            await closed.wait()
+            del reader  # Unused.
+            writer.close()
+
+        async def _handle_raw_message(message: bytes) -> bytes:
+            return message
+
+        closed = asyncio.Event()
+        listener = await asyncio.start_server(_handle_client, ADDR, 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection(ADDR, port)
+        writer.get_extra_info('socket').setsockopt(
+            socket.SOL_SOCKET, socket.SO_SNDBUF, 64 * 1024
+        )
+        highwater = 256 * 1024
+        endpoint = RPCEndpoint(
+            _handle_raw_message,
+            reader,
+            writer,
+            label='test_rpc_backpressure',
+            send_queue_high_water_bytes=highwater,
+            send_queue_low_water_bytes=highwater // 4,
+        )
+        with pytest.raises(ValueError):
+            RPCEndpoint(
+                _handle_raw_message,
+                reader,
+                writer,
+                label='test_rpc_bad_watermarks',
+                send_queue_high_water_packets=10,
+                send_queue_low_water_packets=20,
+            )
+        runtask = asyncio.create_task(endpoint.run())
+
+        # Try to push a whole lot more data than the socket can buffer.
+        msgsize = 10000
+        msgcount = 2000
+        message = b'x' * msgsize
+        sends = [
+            asyncio.create_task(
+                endpoint.send_message_with_backpressure(message, timeout=30.0)
+            )
+            for _ in range(msgcount)
+        ]
+
+        # Wait until writing stalls.
+        starttime = time.monotonic()
+        stats = endpoint.get_stats()
+        while time.monotonic() - starttime < 10.0:
+            await asyncio.sleep(0.25)
+            lastwritten = stats.total_bytes_written
+            stats = endpoint.get_stats()
+            if stats.total_bytes_written == lastwritten:
+                break
+
+        # Our queue should have filled to its limit but no further, with
+        # the remaining senders waiting.
+        print(stats)
+        assert endpoint.is_send_queue_full()
+        assert stats.peak_queued_bytes <= highwater + msgsize + 5
+        assert stats.queued_bytes > highwater // 4
+        assert stats.backpressure_wait_count > 0
+        assert stats.total_bytes_written < msgcount * msgsize
+
+        # Closing should error out everyone waiting.
+        endpoint.close()
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        assert all(isinstance(r, CommunicationError) for r in results)
+        closed.set()
+        await runtask
+        listener.close()
+        await listener.wait_closed()
+
+    asyncio.run(_do_it(), debug=True)
+
+
+async def _echo_raw_message(message: bytes) -> bytes:
+    return message
+
+
+class _EndpointPair:
+    """A pair of endpoints talking to each other over a socketpair."""
+
+    def __init__(
+        self,
+        handle_raw_message: Callable[[bytes], Awaitable[bytes]] = (
+            _echo_raw_message
+        ),
+        **endpoint_kwargs: Any,
+    ) -> None:
+        self.endpoints: list[RPCEndpoint] = []
+        self._run_tasks: list[asyncio.Task] = []
+        self._handle_raw_message = handle_raw_message
+        self._endpoint_kwargs = endpoint_kwargs
+
+    async def start(self) -> tuple[RPCEndpoint, RPCEndpoint]:
+        """Create and run our endpoints."""
+        for i, sock in enumerate(socket.socketpair()):
+            reader, writer = await asyncio.open_connection(sock=sock)
+            endpoint = RPCEndpoint(
+                self._handle_raw_message,
+                reader,
+                writer,
+                label=f'test_rpc_pair{i}',
+                **self._endpoint_kwargs,
+            )
+            self.endpoints.append(endpoint)
+            self._run_tasks.append(asyncio.create_task(endpoint.run()))
+        return self.endpoints[0], self.endpoints[1]
+
+    async def stop(self) -> None:
+        """Shut down our endpoints."""
+        for endpoint in self.endpoints:
+            endpoint.close()
+        await asyncio.gather(*self._run_tasks)
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+def test_throughput() -> None:
+    """Benchmark small message round trips over a local socketpair.
+
+    Run with '-s' to see results.
+    """
+
+    async def _do_it() -> None:
+        pair = _EndpointPair()
+        endpoint1, _endpoint2 = await pair.start()
+
+        message = b'x' * 100
+        batchsize = 100
+        batches = 200
+        starttime = time.perf_counter()
+        for _i in range(batches):
+            results = await asyncio.gather(
+                *[endpoint1.send_message(message) for _ in range(batchsize)]
+            )
+            assert all(r == message for r in results)
+        duration = time.perf_counter() - starttime
+        print(
+            f'\nrpc throughput: {batches * batchsize / duration:.0f}'
+            f' messages/sec ({batchsize} in flight at a time).'
+        )
+
+        await pair.stop()
+
+    asyncio.run(_do_it())
+
+
+class _ControlChannel:
+    """Both ends of a server control channel, as the server scripts do it."""
+
+    _sender = MessageSender(get_server_control_protocol())
+
+    def __init__(self) -> None:
+        self.pair = _EndpointPair(self._handle_raw_message)
+        self.chat_messages: list[str] = []
+        self._receiver = MessageReceiver(get_server_control_protocol())
+        handlers: list[Callable[..., Any]] = [
+            _ControlChannel._handle_status,
+            _ControlChannel._handle_chat_message,
+        ]
+        for handler in handlers:
+            self._receiver.register_handler(handler)
+
+    @_sender.send_async_method
+    def _send_raw_message(self, message: str) -> Awaitable[str]:
+        return self._decode_response(
+            self.pair.endpoints[0].send_message(message.encode())
+        )
+
+    @staticmethod
+    async def _decode_response(response: Awaitable[bytes]) -> str:
+        return (await response).decode()
+
+    async def _handle_raw_message(self, message: bytes) -> bytes:
+        return self._receiver.handle_raw_message(
+            self, message.decode()
+        ).encode()
+
+    def _handle_status(self, msg: StatusCommand) -> StatusResponse:
+        del msg  # Unused.
+        return StatusResponse(
+            server_mode=True,
+            session_type='FreeForAllSession',
+            activity_type=None,
+            client_count=len(self.chat_messages),
+            player_count=0,
+            shutdown_pending=False,
+        )
+
+    def _handle_chat_message(self, msg: ChatMessageCommand) -> None:
+        self.chat_messages.append(msg.message)
+
+    async def send(
+        self, command: StatusCommand | ChatMessageCommand
+    ) -> Response | None:
+        """Send a command to the far end."""
+        return await self._sender.send_async(self, command)
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+def test_server_control_channel() -> None:
+    """Test server control commands round-tripping over a socketpair.
+
+    Run with '-s' to see results.
+    """
+
+    async def _do_it() -> None:
+        channel = _ControlChannel()
+        await channel.pair.start()
+
+        # Fire-and-forget commands should arrive in order.
+        for i in range(10):
+            assert (
+                await channel.send(ChatMessageCommand(f'hi{i}', None)) is None
+            )
+        assert channel.chat_messages == [f'hi{i}' for i in range(10)]
+
+        durations: list[float] = []
+        for _i in range(200):
+            starttime = time.perf_counter()
+            response = await channel.send(StatusCommand())
+            durations.append(time.perf_counter() - starttime)
+            assert isinstance(response, StatusResponse)
+            assert response.client_count == 10
+        durations.sort()
+        print(
+            f'\nserver control round trip:'
+            f' median {durations[len(durations) // 2] * 1000.0:.3f} ms,'
+            f' max {durations[-1] * 1000.0:.3f} ms.'
+        )
+
+        # Once the channel is gone, commands should fail with a
+        # communication error (which the server manager now reports).
+        await channel.pair.stop()
+        with pytest.raises(CommunicationError):
+            await channel.send(ChatMessageCommand('bye', None))
+        assert channel.chat_messages[-1] == 'hi9'
+
+    asyncio.run(_do_it())
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+def test_concurrent_calls() -> None:
+    """Benchmark lots of simultaneous calls on a single endpoint.
+
+    Run with '-s' to see results.
+    """
+
+    async def _do_it() -> None:
+        pair = _EndpointPair()
+        endpoint1, _endpoint2 = await pair.start()
+
+        # Note that these go out before the handshake has even arrived,
+        # so this covers waiting on that too.
+        message = b'x' * 100
+        count = 10000
+        starttime = time.perf_counter()
+        results = await asyncio.gather(
+            *[endpoint1.send_message(message) for _ in range(count)]
+        )
+        duration = time.perf_counter() - starttime
+        assert all(r == message for r in results)
+
+        # Now measure memory use for the same while calls are in flight.
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            calls = [
+                asyncio.ensure_future(endpoint1.send_message(message))
+                for _ in range(count)
+            ]
+            # Let everything get going and stall waiting for responses.
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            inflight = tracemalloc.get_traced_memory()[0] - base
+        finally:
+            tracemalloc.stop()
+        assert all(r == message for r in await asyncio.gather(*calls))
+
+        print(
+            f'\nrpc {count} concurrent calls: {duration:.3f}s'
+            f' ({duration / count * 1e6:.1f}us per call),'
+            f' ~{inflight / count:.0f} bytes per in-flight call.'
+        )
+
+        await pair.stop()
+
+    asyncio.run(_do_it())
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+def test_compression() -> None:
+    """Test compressed messages and responses."""
+
+    async def _do_it() -> None:
+        pair = _EndpointPair(compression_threshold=1000)
+        endpoint1, endpoint2 = await pair.start()
+
+        # Both single packets and multi-frame streams should compress
+        # (in both directions since our peer echoes), while stuff under
+        # our threshold should go through untouched.
+        for size in (500, 5000, 50000, 5_000_000):
+            message = b'abcd' * (size // 4)
+            read1 = endpoint1.total_bytes_read
+            read2 = endpoint2.total_bytes_read
+            assert await endpoint1.send_message(message) == message
+            for nread in (
+                endpoint1.total_bytes_read - read1,
+                endpoint2.total_bytes_read - read2,
+            ):
+                if size > 1000:
+                    assert nread < size // 10
+                else:
+                    assert nread > size
+
+        # Incompressible data should be sent as-is.
+        message = os.urandom(50000)
+        read2 = endpoint2.total_bytes_read
+        assert await endpoint1.send_message(message) == message
+        assert endpoint2.total_bytes_read - read2 > len(message)
+
+        await pair.stop()
+
+        # With compression disabled, everything goes through raw.
+        pair = _EndpointPair(compression_threshold=None)
+        endpoint1, endpoint2 = await pair.start()
+        message = b'abcd' * 10000
+        assert await endpoint1.send_message(message) == message
+        assert endpoint2.total_bytes_read > len(message)
+        await pair.stop()
+
+    asyncio.run(_do_it())
+
+
+def test_incoming_size_limit() -> None:
+    """Test that oversized incoming messages close the connection."""
+
+    async def _do_it() -> None:
+        pair = _EndpointPair(
+            compression_threshold=None, max_incoming_size=100000
+        )
+        endpoint1, endpoint2 = await pair.start()
+
+        # Stuff within our limit (including multi-frame) goes through.
+        message = b'abcd' * 20000
+        assert await endpoint1.send_message(message) == message
+
+        # Stuff past it should get our peer to hang up on us.
+        with pytest.raises(CommunicationError):
+            await endpoint1.send_message(b'abcd' * 50000)
+        await endpoint2.wait_closed()
+
+        await pair.stop()
+
+        # Compressed stuff should be limited by its uncompressed size.
+        pair = _EndpointPair(
+            compression_threshold=1000, max_incoming_size=100000
+        )
+        endpoint1, endpoint2 = await pair.start()
+        message = b'abcd' * 20000
+        assert await endpoint1.send_message(message) == message
+        with pytest.raises(CommunicationError):
+            await endpoint1.send_message(b'abcd' * 50000)
+        await endpoint2.wait_closed()
+        await pair.stop()
+
+    asyncio.run(_do_it())
+
+
+class _PoolServer:
+    """A local echo server for testing RPCPools."""
+
+    def __init__(self, suppress_keepalives: bool = False) -> None:
+        self.suppress_keepalives = suppress_keepalives
+        self.endpoints: list[RPCEndpoint] = []
+
+        # Messages handled per connection.
+        self.handled: list[int] = []
+        self._server: asyncio.Server | None = None
+        self._run_tasks: list[asyncio.Task] = []
+
+    async def start(self) -> int:
+        """Start serving and return our port."""
+        self._server = await asyncio.start_server(
+            self._handle_connection, '127.0.0.1', 0
+        )
+        port = self._server.sockets[0].getsockname()[1]
+        assert isinstance(port, int)
+        return port
+
+    async def stop(self) -> None:
+        """Shut down our server and endpoints."""
+        assert self._server is not None
+        self._server.close()
+        for endpoint in self.endpoints:
+            endpoint.close()
+        await asyncio.gather(*self._run_tasks)
+        await self._server.wait_closed()
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        index = len(self.handled)
+        self.handled.append(0)
+
+        async def _handle_message(message: bytes) -> bytes:
+            self.handled[index] += 1
+            return message
+
+        endpoint = RPCEndpoint(
+            _handle_message, reader, writer, label=f'test_rpc_pool{index}'
+        )
+        endpoint.test_suppress_keepalives = self.suppress_keepalives
+        self.endpoints.append(endpoint)
+        task = asyncio.create_task(endpoint.run())
+        self._run_tasks.append(task)
+        await task
+
+
+async def _wait_for(
+    condition: Callable[[], bool], timeout: float = 10.0
+) -> None:
+    starttime = time.monotonic()
+    while not condition():
+        if time.monotonic() - starttime > timeout:
+            raise RuntimeError('Timed out waiting for condition.')
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+def test_pool() -> None:
+    """Test calls spreading across pooled endpoints."""
+
+    async def _do_it() -> None:
+        server = _PoolServer()
+        port = await server.start()
+        pool = RPCPool('127.0.0.1', port, 'test_rpc_pool', size=3)
+        pool.start()
+
+        count = 300
+        messages = [str(i).encode() for i in range(count)]
+        results = await asyncio.gather(
+            *[pool.send_message(m) for m in messages]
+        )
+        assert results == messages
+
+        # Everything should have been spread across all connections.
+        assert len(server.handled) == 3
+        assert all(h > 0 for h in server.handled)
+        assert sum(server.handled) == count
+
+        stats = pool.get_stats()
+        assert stats.connected_endpoints == 3
+        assert stats.in_flight == 0
+        assert stats.call_count == count
+        assert stats.error_count == 0
+        assert stats.reconnect_count == 0
+        assert sum(stats.latency_counts) == count
+        assert len(stats.latency_counts) == len(stats.latency_bounds) + 1
+        assert stats.latency_sum > 0.0
+
+        pool.close()
+        await pool.wait_closed()
+
+        # Calls should fail cleanly once we're closed.
+        with pytest.raises(CommunicationError):
+            await pool.send_message(b'foo')
+
+        await server.stop()
+
+    asyncio.run(_do_it())
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+@pytest.mark.parametrize('cause', ['close', 'keepalive'])
+def test_pool_reconnect(cause: str) -> None:
+    """Test pools reconnecting endpoints that go down."""
+
+    async def _do_it() -> None:
+        server = _PoolServer(suppress_keepalives=cause == 'keepalive')
+        port = await server.start()
+        pool = RPCPool(
+            '127.0.0.1',
+            port,
+            'test_rpc_pool',
+            size=2,
+            reconnect_min_delay=0.01,
+            reconnect_max_delay=0.1,
+            endpoint_kwargs={
+                'keepalive_interval': 0.1,
+                'keepalive_timeout': 0.5,
+            },
+        )
+        pool.start()
+        assert await pool.send_message(b'foo') == b'foo'
+
+        if cause == 'close':
+            for endpoint in server.endpoints:
+                endpoint.close()
+
+        # Our endpoints should come back up (repeatedly in the
+        # keepalive case since the server never sends any).
+        await _wait_for(lambda: pool.get_stats().reconnect_count >= 2)
+        assert await pool.send_message(b'bar') == b'bar'
+        assert len(server.handled) > 2
+
+        pool.close()
+        await pool.wait_closed()
+        await server.stop()
+
+    asyncio.run(_do_it())
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+def test_pool_no_peer() -> None:
+    """Test pools with nothing to connect to."""
+
+    async def _do_it() -> None:
+        # Grab a port that nobody is listening on.
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+
+        pool = RPCPool(
+            '127.0.0.1', port, 'test_rpc_pool', reconnect_min_delay=0.01
+        )
+        pool.start()
+        with pytest.raises(CommunicationError):
+            await pool.send_message(b'foo', timeout=0.2)
+        stats = pool.get_stats()
+        assert stats.connected_endpoints == 0
+        assert stats.error_count == 1
+        pool.close()
+        await pool.wait_closed()
+
+    asyncio.run(_do_it())
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+def test_pool_no_time_left() -> None:
+    """Test that running out of time never takes down endpoints."""
+
+    async def _do_it() -> None:
+        server = _PoolServer()
+        port = await server.start()
+        pool = RPCPool('127.0.0.1', port, 'test_rpc_pool', size=1)
+        pool.start()
+        assert await pool.send_message(b'foo') == b'foo'
+
+        # With no time budget left we should fail without touching our
+        # (healthy) endpoint.
+        with pytest.raises(CommunicationError):
+            await pool.send_message(b'foo', timeout=0.0)
+        stats = pool.get_stats()
+        assert stats.connected_endpoints == 1
+        assert stats.error_count == 1
+        assert await pool.send_message(b'bar') == b'bar'
+        assert pool.get_stats().reconnect_count == 0
+
+        pool.close()
+        await pool.wait_closed()
+        await server.stop()
+
+    asyncio.run(_do_it())
+
+
+@pytest.mark.skipif(FAST_MODE, reason='fast mode')
+def test_pool_peer_gone() -> None:
+    """Test that failed reconnect attempts don't count as reconnects."""
+
+    async def _do_it() -> None:
+        server = _PoolServer()
+        port = await server.start()
+        pool = RPCPool(
+            '127.0.0.1',
+            port,
+            'test_rpc_pool',
+            size=1,
+            reconnect_min_delay=0.01,
+            reconnect_max_delay=0.05,
+        )
+        pool.start()
+        assert await pool.send_message(b'foo') == b'foo'
+
+        # Take our server down and let the pool fail to reconnect a
+        # bunch of times.
+        await server.stop()
+        await _wait_for(lambda: pool.get_stats().connected_endpoints == 0)
+        await asyncio.sleep(0.5)
+        assert pool.get_stats().reconnect_count == 0
+
+        pool.close()
+        await pool.wait_closed()
+
+    asyncio.run(_do_it())
+
+
 @pytest.mark.skipif(FAST_MODE, reason='fast mode')
 def test_message_timeout() -> None:
     """Test sends timing out."""
@@ -4,9 +4,11 @@
 from __future__ import annotations
 
 from enum import Enum
+from functools import cache
 from dataclasses import field, dataclass
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, override
 
+from efro.message import Message, Response, MessageProtocol, BoolResponse
 from efro.dataclassio import ioprepped
 
 if TYPE_CHECKING:
@@ -201,13 +203,59 @@ class ServerConfig:
     dont_write_bytecode: bool = False
 
 
+class RestartPolicy(Enum):
+    """When a server manager should relaunch an exited server."""
+
+    ALWAYS = 'always'
+    ON_FAILURE = 'on_failure'
+    NEVER = 'never'
+
+
+@ioprepped
+@dataclass
+class FleetInstanceConfig:
+    """Configuration for a single server in a server manager fleet."""
+
+    # Unique name for this instance. This is used to tag its output and
+    # as the name of its root directory under the manager's root path.
+    name: str
+
+    # Values overriding those in the base server config for this
+    # instance. Generally at least 'port' should be set here so that
+    # instances don't collide, and things like 'party_name' and
+    # 'playlist_code' are commonly set as well.
+    config: dict[str, Any] = field(default_factory=dict)
+
+    # When to relaunch this instance after it exits. If not provided,
+    # the manager's default is used ('always' unless auto-restart has
+    # been disabled).
+    restart_policy: RestartPolicy | None = None
+
+    # CPU indices to pin this instance's process to (Linux only).
+    cpu_affinity: list[int] | None = None
+
+
+@ioprepped
+@dataclass
+class FleetConfig:
+    """Configuration for running many servers from one server manager."""
+
+    instances: list[FleetInstanceConfig] = field(default_factory=list)
+
+
 # NOTE: as much as possible, communication from the server-manager to
 # the child-process should go through these and not ad-hoc Python string
 # commands since this way is type safe.
-class ServerCommand:
+#
+# Where supported, these are sent as messages over a control channel
+# (see get_server_control_protocol()) which lets the server respond with
+# data. Otherwise they are pickled and exec'ed through stdin and no
+# responses are available.
+class ServerCommand(Message):
     """Base class for commands that can be sent to the server."""
 
 
+@ioprepped
 @dataclass
 class StartServerModeCommand(ServerCommand):
     """Tells the app to switch into 'server' mode."""
@@ -222,6 +270,7 @@ class ShutdownReason(Enum):
     RESTARTING = 'restarting'
 
 
+@ioprepped
 @dataclass
 class ShutdownCommand(ServerCommand):
     """Tells the server to shut down."""
@@ -230,6 +279,7 @@ class ShutdownCommand(ServerCommand):
     immediate: bool
 
 
+@ioprepped
 @dataclass
 class ChatMessageCommand(ServerCommand):
     """Chat message from the server."""
@@ -238,6 +288,7 @@ class ChatMessageCommand(ServerCommand):
     clients: list[int] | None
 
 
+@ioprepped
 @dataclass
 class ScreenMessageCommand(ServerCommand):
     """Screen-message from the server."""
@@ -247,14 +298,143 @@ class ScreenMessageCommand(ServerCommand):
     clients: list[int] | None
 
 
+@ioprepped
 @dataclass
 class ClientListCommand(ServerCommand):
-    """Print a list of clients."""
+    """Fetch a list of clients (or print one when sent through stdin)."""
+
+    @override
+    @classmethod
+    def get_response_types(cls) -> list[type[Response] | None]:
+        return [ClientListResponse]
+
 
+@ioprepped
+@dataclass
+class ClientInfo:
+    """Info about a client connected to a server."""
+
+    client_id: int
+    account_name: str
+    players: list[str]
 
+
+@ioprepped
+@dataclass
+class ClientListResponse(Response):
+    """Clients currently connected to a server."""
+
+    clients: list[ClientInfo]
+
+
+@ioprepped
 @dataclass
 class KickCommand(ServerCommand):
-    """Kick a client."""
+    """Kick a client.
+
+    Responds with whether the client was found and disconnected.
+    """
 
     client_id: int
     ban_time: int | None
+
+    @override
+    @classmethod
+    def get_response_types(cls) -> list[type[Response] | None]:
+        return [BoolResponse]
+
+
+@ioprepped
+@dataclass
+class StatusCommand(ServerCommand):
+    """Fetch the current state of a server."""
+
+    @override
+    @classmethod
+    def get_response_types(cls) -> list[type[Response] | None]:
+        return [StatusResponse]
+
+
+@ioprepped
+@dataclass
+class StatusResponse(Response):
+    """The current state of a server."""
+
+    # Whether we've been put into server mode yet.
+    server_mode: bool
+
+    # Types of the current host session and activity (if any).
+    session_type: str | None
+    activity_type: str | None
+
+    client_count: int
+    player_count: int
+
+    # Whether we'll be exiting at the next clean opportunity.
+    shutdown_pending: bool
+
+
+@ioprepped
+@dataclass
+class ServerMetrics:
+    """A snapshot of stats for a running server."""
+
+    session_type: str | None
+    activity_type: str | None
+    client_count: int
+    player_count: int
+
+    # Logic-thread steps since the last snapshot and how long they
+    # took to run (in seconds), as measured by the engine.
+    logic_step_count: int
+    logic_step_duration_mean: float
+    logic_step_duration_max: float
+
+    # Explicit garbage-collection passes (durations in seconds).
+    gc_pass_count: int
+    gc_pass_duration_total: float
+    gc_pass_duration_last: float | None
+
+    # Network traffic for the most recent second summed over all
+    # clients (in bytes as sent over the wire).
+    net_bytes_in: int
+    net_bytes_out: int
+    net_bytes_resent: int
+
+    # Highest ping among clients (in milliseconds).
+    net_ping_max: float | None
+
+
+@ioprepped
+@dataclass
+class ServerMetricsMessage(Message):
+    """Sent periodically from a server to its server manager."""
+
+    metrics: ServerMetrics
+
+
+@cache
+def get_server_control_protocol() -> MessageProtocol:
+    """Return the protocol used on server manager control channels.
+
+    ServerCommands go from the manager to the server and
+    ServerMetricsMessages go the other way.
+    """
+    return MessageProtocol(
+        message_types={
+            0: StartServerModeCommand,
+            1: ShutdownCommand,
+            2: ChatMessageCommand,
+            3: ScreenMessageCommand,
+            4: ClientListCommand,
+            5: KickCommand,
+            6: StatusCommand,
+            7: ServerMetricsMessage,
+        },
+        response_types={
+            0: ClientListResponse,
+            1: BoolResponse,
+            2: StatusResponse,
+        },
+        remote_errors_include_stack_traces=True,
+    )
@@ -17,8 +17,96 @@ ASSETS_SRC = 'src/assets'
 BUILD_DIR = 'build/assets'
 
 
+class _TreeIndex:
+    """An in-memory index of files under project dirs.
+
+    Each tree is scanned only once (with os.scandir) no matter how many
+    target generators query it; dirs within an already-scanned tree are
+    served from that tree's scan. Results mirror what os.walk() would
+    give for the same path, including its ordering and root strings.
+    """
+
+    def __init__(self, projroot: str) -> None:
+        self.projroot = projroot
+        self._walks: dict[str, list[tuple[str, list[str]]]] = {}
+        self._by_ext: dict[str, dict[str, list[tuple[str, str]]]] = {}
+
+    def walk(self, subpath: str) -> list[tuple[str, list[str]]]:
+        """Return (root, filenames) for all dirs under a project subpath."""
+        top = os.path.join(self.projroot, subpath)
+        walk = self._walks.get(top)
+        if walk is not None:
+            return walk
+
+        # If we've scanned a parent tree already, pull from that (as
+        # long as our dir was actually descended into as part of it).
+        walk = []
+        for scanned, scannedwalk in self._walks.items():
+            if top.startswith(scanned + '/'):
+                walk = [
+                    (root, fnames)
+                    for root, fnames in scannedwalk
+                    if root == top or root.startswith(top + '/')
+                ]
+                break
+        if not walk:
+            self._scan(top, walk)
+        self._walks[top] = walk
+        return walk
+
+    def files_with_ext(self, subpath: str, ext: str) -> list[tuple[str, str]]:
+        """Return (root, filename) for all files under subpath ending in ext.
+
+        Ext can span multiple dots ('.tex2d.png', etc.).
+        """
+        top = os.path.join(self.projroot, subpath)
+        by_ext = self._by_ext.get(top)
+        if by_ext is None:
+            by_ext = self._by_ext[top] = {}
+            for root, fnames in self.walk(subpath):
+                for fname in fnames:
+                    by_ext.setdefault(_last_ext(fname), []).append(
+                        (root, fname)
+                    )
+        return [
+            (root, fname)
+            for root, fname in by_ext.get(_last_ext(ext), [])
+            if fname.endswith(ext)
+        ]
+
+    def _scan(self, root: str, walk: list[tuple[str, list[str]]]) -> None:
+        try:
+            entries = list(os.scandir(root))
+        except OSError:
+            # Like os.walk, silently skip anything we can't list.
+            return
+        fnames: list[str] = []
+        subdirs: list[str] = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                fnames.append(entry.name)
+
+            # Like os.walk, list symlinked dirs but don't descend into them.
+            elif not entry.is_symlink():
+                subdirs.append(entry.name)
+        walk.append((root, fnames))
+        for subdir in subdirs:
+            self._scan(os.path.join(root, subdir), walk)
+
+
+def _last_ext(name: str) -> str:
+    # Note: unlike os.path.splitext() this treats '.json' as an extension
+    # instead of a hidden file name (we need to look up exts themselves).
+    index = name.rfind('.')
+    return '' if index == -1 else name[index:]
+
+
 def _get_targets(
-    projroot: str,
+    tree: _TreeIndex,
     varname: str,
     inext: str,
     outext: str,
@@ -26,7 +114,6 @@ def _get_targets(
     limit_to_prefix: str | None = None,
 ) -> str:
     """Generic function to map source extension to dst files."""
-    # pylint: disable=too-many-locals
     # pylint: disable=too-many-positional-arguments
 
     src = ASSETS_SRC
@@ -34,8 +121,8 @@ def _get_targets(
     targets = []
 
     # Create outext targets for all inext files we find.
-    for root, _dname, fnames in os.walk(os.path.join(projroot, src)):
-        src_abs = os.path.join(projroot, src)
+    src_abs = os.path.join(tree.projroot, src)
+    for root, fname in tree.files_with_ext(src, inext):
         if limit_to_prefix is not None and not root.startswith(
             os.path.join(src_abs, limit_to_prefix)
         ):
@@ -45,17 +132,15 @@ def _get_targets(
         assert root.startswith(src_abs)
         dstrootvar = '$(BUILD_DIR)' + root.removeprefix(src_abs)
         dstfin = dst + root.removeprefix(src_abs)
-        for fname in fnames:
-            outname = fname[: -len(inext)] + outext
-            if fname.endswith(inext):
-                all_targets.add(os.path.join(dstfin, outname))
-                targets.append(os.path.join(dstrootvar, outname))
+        outname = fname[: -len(inext)] + outext
+        all_targets.add(os.path.join(dstfin, outname))
+        targets.append(os.path.join(dstrootvar, outname))
 
     return '\n' + varname + ' = \\\n  ' + ' \\\n  '.join(sorted(targets))
 
 
 def _get_py_targets(
-    projroot: str,
+    tree: _TreeIndex,
     meta_manifests: dict[str, str],
     explicit_sources: set[str],
     src: str,
@@ -71,6 +156,7 @@ def _get_py_targets(
     # pylint: disable=too-many-locals
     # pylint: disable=too-many-statements
 
+    projroot = tree.projroot
     py_generated_root = f'{ASSETS_SRC}/ba_data/python/babase/_mgen'
 
     def _do_get_targets(
@@ -174,9 +260,7 @@ def _get_py_targets(
 
     # Create py and pyc targets for all physical scripts in src, with
     # the exception of our dynamically generated stuff.
-    for physical_root, _dname, physical_fnames in os.walk(
-        os.path.join(projroot, src)
-    ):
+    for physical_root, physical_fnames in tree.walk(src):
         # Skip any generated files; we'll add those from the meta manifest.
         # (dont want our results to require a meta build beforehand)
         if physical_root == os.path.join(
@@ -224,7 +308,7 @@ def _get_py_targets(
 
 
 def _get_py_targets_subset(
-    projroot: str,
+    tree: _TreeIndex,
     meta_manifests: dict[str, str],
     explicit_sources: set[str],
     all_targets: set[str],
@@ -273,7 +357,7 @@ def _get_py_targets_subset(
     # on various cloud-builds we do. Perhaps we could somehow only check
     # when we know everything is present?..
     if bool(False):
-        if not os.path.exists(os.path.join(projroot, src)):
+        if not os.path.exists(os.path.join(tree.projroot, src)):
             raise RuntimeError(
                 f'Expected src path not found in project: "{src}"'
             )
@@ -283,7 +367,7 @@ def _get_py_targets_subset(
     so_targets: list[str] = []
 
     _get_py_targets(
-        projroot,
+        tree,
         meta_manifests,
         explicit_sources,
         src,
@@ -394,12 +478,13 @@ def _get_py_targets_subset(
 
 
 def _get_extras_targets_win(
-    projroot: str, all_targets: set[str], platform: str
+    tree: _TreeIndex, all_targets: set[str], platform: str
 ) -> str:
+    projroot = tree.projroot
     targets: list[str] = []
     base = f'{ASSETS_SRC}/windows'
     dstbase = 'windows'
-    for root, _dnames, fnames in os.walk(os.path.join(projroot, base)):
+    for root, fnames in tree.walk(base):
         for fname in fnames:
             # Only include the platform we were passed.
             if not root.startswith(
@@ -507,10 +592,14 @@ def generate_assets_makefile(
     all_targets_public: set[str] = set()
     all_targets_private: set[str] = set()
 
+    # All our target generators pull from this so we only have to walk
+    # each part of the filesystem once.
+    tree = _TreeIndex(projroot)
+
     # We always auto-generate the public section.
     our_lines_public = [
         _get_py_targets_subset(
-            projroot,
+            tree,
             meta_manifests,
             explicit_sources,
             all_targets_public,
@@ -518,7 +607,7 @@ def generate_assets_makefile(
             suffix='_PUBLIC',
         ),
         _get_py_targets_subset(
-            projroot,
+            tree,
             meta_manifests,
             explicit_sources,
             all_targets_public,
@@ -533,7 +622,7 @@ def generate_assets_makefile(
     else:
         our_lines_private = [
             _get_py_targets_subset(
-                projroot,
+                tree,
                 meta_manifests,
                 explicit_sources,
                 all_targets_private,
@@ -541,7 +630,7 @@ def generate_assets_makefile(
                 suffix='_PRIVATE_APPLE_MAC',
             ),
             _get_py_targets_subset(
-                projroot,
+                tree,
                 meta_manifests,
                 explicit_sources,
                 all_targets_private,
@@ -549,7 +638,7 @@ def generate_assets_makefile(
                 suffix='_PRIVATE_ANDROID',
             ),
             _get_py_targets_subset(
-                projroot,
+                tree,
                 meta_manifests,
                 explicit_sources,
                 all_targets_private,
@@ -557,7 +646,7 @@ def generate_assets_makefile(
                 suffix='_PRIVATE_COMMON',
             ),
             _get_py_targets_subset(
-                projroot,
+                tree,
                 meta_manifests,
                 explicit_sources,
                 all_targets_private,
@@ -565,7 +654,7 @@ def generate_assets_makefile(
                 suffix='_PRIVATE_WIN_WIN32',
             ),
             _get_py_targets_subset(
-                projroot,
+                tree,
                 meta_manifests,
                 explicit_sources,
                 all_targets_private,
@@ -573,35 +662,35 @@ def generate_assets_makefile(
                 suffix='_PRIVATE_WIN_X64',
             ),
             _get_targets(
-                projroot,
+                tree,
                 'COB_TARGETS',
                 '.collisionmesh.obj',
                 '.cob',
                 all_targets_private,
             ),
             _get_targets(
-                projroot,
+                tree,
                 'BOB_TARGETS',
                 '.mesh.obj',
                 '.bob',
                 all_targets_private,
             ),
             _get_targets(
-                projroot,
+                tree,
                 'FONT_TARGETS',
                 '.fdata',
                 '.fdata',
                 all_targets_private,
             ),
             _get_targets(
-                projroot,
+                tree,
                 'PEM_TARGETS',
                 '.pem',
                 '.pem',
                 all_targets_private,
             ),
             _get_targets(
-                projroot,
+                tree,
                 'DATA_TARGETS',
                 '.json',
                 '.json',
@@ -609,42 +698,42 @@ def generate_assets_makefile(
                 limit_to_prefix='ba_data/data',
             ),
             _get_targets(
-                projroot,
+                tree,
                 'AUDIO_TARGETS',
                 '.wav',
                 '.ogg',
                 all_targets_private,
             ),
             _get_targets(
-                projroot,
+                tree,
                 'TEX2D_DDS_TARGETS',
                 '.tex2d.png',
                 '.dds',
                 all_targets_private,
             ),
             _get_targets(
-                projroot,
+                tree,
                 'TEX2D_PVR_TARGETS',
                 '.tex2d.png',
                 '.pvr',
                 all_targets_private,
             ),
             _get_targets(
-                projroot,
+                tree,
                 'TEX2D_KTX_TARGETS',
                 '.tex2d.png',
                 '.ktx',
                 all_targets_private,
             ),
             _get_targets(
-                projroot,
+                tree,
                 'TEX2D_PREVIEW_PNG_TARGETS',
                 '.tex2d.png',
                 '_preview.png',
                 all_targets_private,
             ),
-            _get_extras_targets_win(projroot, all_targets_private, 'Win32'),
-            _get_extras_targets_win(projroot, all_targets_private, 'x64'),
+            _get_extras_targets_win(tree, all_targets_private, 'Win32'),
+            _get_extras_targets_win(tree, all_targets_private, 'x64'),
         ]
     filtered = (
         lines[: auto_start_public + 1]
@@ -480,14 +480,21 @@ def efrocache_update() -> None:
 
 
 def efrocache_get() -> None:
-    """Get a file from efrocache."""
-    from efrotools.efrocache import get_target
+    """Get one or more files from efrocache."""
+    from efrotools.efrocache import get_target, get_targets
 
     args = pcommand.get_args()
-    if len(args) != 1:
-        raise RuntimeError('Expected exactly 1 arg')
+    if not args:
+        raise RuntimeError('Expected at least 1 arg')
 
-    output = get_target(args[0], batch=pcommand.is_batch(), clr=pcommand.clr())
+    if len(args) == 1:
+        output = get_target(
+            args[0], batch=pcommand.is_batch(), clr=pcommand.clr()
+        )
+    else:
+        output = get_targets(
+            args, batch=pcommand.is_batch(), clr=pcommand.clr()
+        )
     if pcommand.is_batch():
         pcommand.clientprint(output)
 
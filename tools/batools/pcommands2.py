@@ -203,7 +203,7 @@ def win_ci_install_prereqs() -> None:
     """Install bits needed for basic win ci."""
     import json
 
-    from efrotools.efrocache import get_target
+    from efrotools.efrocache import get_targets
 
     pcommand.disallow_in_batch()
 
@@ -235,8 +235,9 @@ def win_ci_install_prereqs() -> None:
         ):
             needed_targets.add(target)
 
-    for target in needed_targets:
-        get_target(target, batch=pcommand.is_batch(), clr=pcommand.clr())
+    get_targets(
+        sorted(needed_targets), batch=pcommand.is_batch(), clr=pcommand.clr()
+    )
 
 
 def win_ci_binary_build() -> None:
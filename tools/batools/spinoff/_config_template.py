@@ -45,7 +45,8 @@ ctx.src_write_paths.update(src_write_paths)
 
 
 # Define and register a filter-file-call.
-# This will get called for each filtered file.
+# This will get called for each filtered file (one call at a time,
+# though not necessarily from the same thread).
 # The default_filter_file() call replaces variations of 'BallisticaKit'
 # with the dst_name declared above.
 def filter_file(context: SpinoffContext, src_path: str, text: str) -> str:
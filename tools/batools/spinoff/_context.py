@@ -6,11 +6,14 @@
 from __future__ import annotations
 
 import os
+import re
 import sys
 import fnmatch
+import threading
 import tempfile
 import subprocess
 from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import TYPE_CHECKING, assert_never
 
@@ -31,6 +34,7 @@ from batools.spinoff._state import (
 
 if TYPE_CHECKING:
     from typing import Callable, Iterable, Any
+    from concurrent.futures import Future
 
     from batools.project import ProjectUpdater
 
@@ -105,6 +109,7 @@ class SpinoffContext:
         self._data_file_path = os.path.join(self._dst_root, '.spinoffdata')
 
         self._built_parent_repo_tool_configs = False
+        self._built_parent_repo_tool_configs_lock = threading.Lock()
 
         self._auto_backport_success_count = 0
         self._auto_backport_fail_count = 0
@@ -151,6 +156,11 @@ class SpinoffContext:
             self
         ).default_filter_path
 
+        # Files are copied in parallel but project filter calls were
+        # written expecting to be called serially, so we keep them that
+        # way.
+        self._filter_file_call_lock = threading.Lock()
+
         self._execution_error = False
 
         self.project_file_paths = set[str]()
@@ -308,6 +318,18 @@ class SpinoffContext:
 
         # Create a version of src_unchecked_paths for dst.
         self._dst_unchecked_paths = self._filter_paths(self.src_unchecked_paths)
+
+        # We check lots of paths against these lists so compile them
+        # up front.
+        self._git_mirrored_matcher = _PathMatcher(self.git_mirrored_paths)
+        self._src_omit_matcher = _PathMatcher(self._src_omit_paths_expanded)
+        self._src_unchecked_matcher = _PathMatcher(self.src_unchecked_paths)
+        self._dst_unchecked_matcher = _PathMatcher(self._dst_unchecked_paths)
+        self._filter_dirs_matcher = _PathMatcher(self.filter_dirs, globs=False)
+        self._no_filter_dirs_matcher = _PathMatcher(
+            self.no_filter_dirs, globs=False
+        )
+
         self._sanity_test_setup()
         self._generate_env_hash()
 
@@ -413,7 +435,7 @@ class SpinoffContext:
         # could lead to ambiguous/dangerous situations where spinoff as
         # well as some command on dst write to the same file.
         for path in self._src_git_files:
-            if _any_path_contains(self.src_unchecked_paths, path):
+            if self._src_unchecked_matcher.contains(path):
                 self._src_error_entities[path] = (
                     'Synced file falls under src_unchecked_paths, which'
                     " is not allowed. Either don't sync the file or carve"
@@ -586,9 +608,9 @@ class SpinoffContext:
                     dst_path = dst_path_full.removeprefix(dstrootsl)
                     if dst_path == path:
                         managed = True
-                    if _any_path_contains(self._dst_unchecked_paths, dst_path):
+                    if self._dst_unchecked_matcher.contains(dst_path):
                         unchecked = True
-                    if _any_path_contains(self.git_mirrored_paths, dst_path):
+                    if self._git_mirrored_matcher.contains(dst_path):
                         git_mirrored = True
         _printval(
             'spinoff-managed',
@@ -1035,7 +1057,8 @@ class SpinoffContext:
         """Run filtering on a given file."""
 
         # Run our registered filter call.
-        out = self.filter_file_call(self, src_path, text)
+        with self._filter_file_call_lock:
+            out = self.filter_file_call(self, src_path, text)
 
         # Run formatting on some files if they change. Otherwise, running
         # a preflight in the dst project could change things, leading to
@@ -1068,24 +1091,28 @@ class SpinoffContext:
         return out
 
     def _ensure_parent_repo_tool_configs_exist(self) -> None:
-        if not self._built_parent_repo_tool_configs:
-            # Interestingly, seems we need to use shell command cd here
-            # instead of just passing cwd arg.
-            subprocess.run(
-                f'cd {self._src_root} && make env',
-                shell=True,
-                check=True,
-                capture_output=True,
-            )
-            self._built_parent_repo_tool_configs = True
+        # Note: this can get called from multiple copy threads at once.
+        with self._built_parent_repo_tool_configs_lock:
+            if not self._built_parent_repo_tool_configs:
+                # Interestingly, seems we need to use shell command cd
+                # here instead of just passing cwd arg.
+                subprocess.run(
+                    f'cd {self._src_root} && make env',
+                    shell=True,
+                    check=True,
+                    capture_output=True,
+                )
+                self._built_parent_repo_tool_configs = True
 
     def _should_filter_src_file(self, path: str) -> bool:
         """Return whether a given file should be filtered."""
-        basename = os.path.basename(path)
+        dirname, basename = os.path.split(path)
         ext = os.path.splitext(basename)[1]
-        if any(path.startswith(f'{p}/') for p in self.filter_dirs):
+
+        # (Anything under a dir means anything within dirname or below).
+        if dirname and self._filter_dirs_matcher.contains(dirname):
             return True
-        if any(path.startswith(f'{p}/') for p in self.no_filter_dirs):
+        if dirname and self._no_filter_dirs_matcher.contains(dirname):
             return False
         if basename in self.filter_file_names:
             return True
@@ -1103,7 +1130,7 @@ class SpinoffContext:
 
         # Special case: specific dirs/files we *always* want in git
         # should never get added to gitignore.
-        if _any_path_contains(self.git_mirrored_paths, path):
+        if self._git_mirrored_matcher.contains(path):
             return False
 
         # If there's a spinoff-managed dir above us, we're already covered.
@@ -1151,7 +1178,7 @@ class SpinoffContext:
         #         raise CleanError('FOUND BAD PATH', ent)
 
         for ent in self._dst_purge_entities.copy():
-            if _any_path_contains(self.git_mirrored_paths, ent):
+            if self._git_mirrored_matcher.contains(ent):
                 print(
                     'WARNING; git-mirrored entity'
                     f" '{ent}' unexpectedly found on purge list. Ignoring.",
@@ -1166,7 +1193,7 @@ class SpinoffContext:
         """
         for key, val in list(self._dst_entities.items()):
             # We never want to purge git-managed stuff.
-            if _any_path_contains(self.git_mirrored_paths, key):
+            if self._git_mirrored_matcher.contains(key):
                 continue
 
             dst_path = key
@@ -1467,7 +1494,7 @@ class SpinoffContext:
 
             # Disallow git-mirrored-paths.
             # We would have to add special handling for this.
-            if _any_path_contains(self.git_mirrored_paths, override_path):
+            if self._git_mirrored_matcher.contains(override_path):
                 raise RuntimeError(
                     'Not allowed to override special git-managed path:'
                     f" '{override_path}'."
@@ -1587,6 +1614,7 @@ class SpinoffContext:
         print_individual_updates = len(self._src_copy_entities) < 50
 
         project_src_paths: list[str] = []
+        copy_src_paths: list[str] = []
 
         # Run all file updates except for project ones (Makefiles, etc.)
         # Which we wait for until the end.
@@ -1594,7 +1622,23 @@ class SpinoffContext:
             if self._is_project_file(src_path):
                 project_src_paths.append(src_path)
             else:
-                self._handle_src_copy(src_path, print_individual_updates)
+                copy_src_paths.append(src_path)
+
+        # Copying/filtering is mostly file io and formatter subprocesses,
+        # so we do it in a thread pool (sized to our cores so we don't
+        # oversubscribe with formatter processes). We still handle
+        # results here in sorted order so our state updates and output
+        # are the same as if we had done everything serially.
+        if copy_src_paths:
+            with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+                futures = [
+                    executor.submit(self._copy_src_entity, src_path)
+                    for src_path in copy_src_paths
+                ]
+                for src_path, future in zip(copy_src_paths, futures):
+                    self._handle_src_copy(
+                        src_path, print_individual_updates, copy_result=future
+                    )
 
         # Now attempt to remove anything in our purge list.
         removed_f_count = self._remove_purge_entities()
@@ -1674,55 +1718,22 @@ class SpinoffContext:
         src_path: str,
         print_individual_updates: bool,
         is_project_file: bool = False,
+        copy_result: Future[DstEntity] | None = None,
     ) -> None:
-        # pylint: disable=too-many-locals
+        """Copy a src entity to dst and record the results.
+
+        If copy_result is passed, it should be the result of an
+        already-submitted _copy_src_entity() call for the entity.
+        """
         src_entity = self._src_entities[src_path]
         dst_path = src_entity.dst
         src_path_full = os.path.join(self._src_root, src_path)
         dst_path_full = os.path.join(self._dst_root, dst_path)
         try:
-            # Create its containing dir if need be.
-            dirname = os.path.dirname(dst_path_full)
-            if not os.path.exists(dirname):
-                os.makedirs(dirname)
-
-            mode = os.lstat(src_path_full).st_mode
-
-            if src_entity.entity_type is EntityType.SYMLINK:
-                assert not is_project_file  # Undefined.
-                linkto = os.readlink(src_path_full)
-                if os.path.islink(dst_path_full):
-                    os.remove(dst_path_full)
-                os.symlink(linkto, dst_path_full)
-                dst_entity = DstEntity(
-                    entity_type=src_entity.entity_type,
-                    env_hash=None,
-                    src_path=None,
-                    src_mtime=None,
-                    src_size=None,
-                    dst_mtime=None,
-                    dst_size=None,
-                )
-
-            elif src_entity.entity_type is EntityType.FILE:
-                dst_entity = self._handle_src_copy_file(
-                    src_path,
-                    src_path_full,
-                    dst_path,
-                    dst_path_full,
-                    src_entity,
-                    is_project_file,
-                )
-                os.chmod(dst_path_full, mode)
+            if copy_result is None:
+                dst_entity = self._copy_src_entity(src_path, is_project_file)
             else:
-                raise RuntimeError(
-                    f"Invalid entity type: '{src_entity.entity_type}'."
-                )
-
-            # NOTE TO SELF - was using lchmod here but it doesn't exist
-            # on linux (apparently symlinks can't have perms modified).
-            # Now doing a chmod above only for the 'file' path.
-            # os.lchmod(dst_path_full, mode)
+                dst_entity = copy_result.result()
             self._dst_entities[dst_path] = dst_entity
             if print_individual_updates:
                 print(
@@ -1753,6 +1764,58 @@ class SpinoffContext:
 
                 traceback.print_exc(file=sys.stderr)
 
+    def _copy_src_entity(
+        self, src_path: str, is_project_file: bool = False
+    ) -> DstEntity:
+        """Copy/filter a src entity to dst; can be run in any thread.
+
+        Don't touch any shared state here; _handle_src_copy() takes care
+        of that.
+        """
+        src_entity = self._src_entities[src_path]
+        dst_path = src_entity.dst
+        src_path_full = os.path.join(self._src_root, src_path)
+        dst_path_full = os.path.join(self._dst_root, dst_path)
+
+        # Create its containing dir if need be (other threads may be
+        # doing the same).
+        os.makedirs(os.path.dirname(dst_path_full), exist_ok=True)
+
+        mode = os.lstat(src_path_full).st_mode
+
+        if src_entity.entity_type is EntityType.SYMLINK:
+            assert not is_project_file  # Undefined.
+            linkto = os.readlink(src_path_full)
+            if os.path.islink(dst_path_full):
+                os.remove(dst_path_full)
+            os.symlink(linkto, dst_path_full)
+            return DstEntity(
+                entity_type=src_entity.entity_type,
+                env_hash=None,
+                src_path=None,
+                src_mtime=None,
+                src_size=None,
+                dst_mtime=None,
+                dst_size=None,
+            )
+
+        if src_entity.entity_type is EntityType.FILE:
+            dst_entity = self._handle_src_copy_file(
+                src_path,
+                src_path_full,
+                dst_path,
+                dst_path_full,
+                src_entity,
+                is_project_file,
+            )
+            # NOTE TO SELF - was using lchmod here but it doesn't exist
+            # on linux (apparently symlinks can't have perms modified).
+            # Now doing a chmod only for the 'file' path.
+            os.chmod(dst_path_full, mode)
+            return dst_entity
+
+        raise RuntimeError(f"Invalid entity type: '{src_entity.entity_type}'.")
+
     def _handle_src_copy_file(
         self,
         src_path: str,
@@ -1800,14 +1863,16 @@ class SpinoffContext:
                     with open(dst_path_full, 'wb') as outfileb:
                         outfileb.write(contents_out.encode(encoding))
 
+        src_stat = os.stat(src_path_full)
+        dst_stat = os.stat(dst_path_full)
         return DstEntity(
             entity_type=src_entity.entity_type,
             env_hash=self._envhash,
             src_path=src_path,
-            src_mtime=os.path.getmtime(src_path_full),
-            src_size=os.path.getsize(src_path_full),
-            dst_mtime=os.path.getmtime(dst_path_full),
-            dst_size=os.path.getsize(dst_path_full),
+            src_mtime=src_stat.st_mtime,
+            src_size=src_stat.st_size,
+            dst_mtime=dst_stat.st_mtime,
+            dst_size=dst_stat.st_size,
         )
 
     def _remove_purge_entities(self) -> int:
@@ -1899,12 +1964,8 @@ class SpinoffContext:
                     # complain.
                     if (
                         dst_path not in self._dst_entities
-                        and not _any_path_contains(
-                            self._dst_unchecked_paths, dst_path
-                        )
-                        and not _any_path_contains(
-                            self.git_mirrored_paths, dst_path
-                        )
+                        and not self._dst_unchecked_matcher.contains(dst_path)
+                        and not self._git_mirrored_matcher.contains(dst_path)
                         and not self._force
                     ):
                         self._dst_error_entities[dst_path] = (
@@ -1920,9 +1981,9 @@ class SpinoffContext:
         for gitpath in self._src_git_files:
             # If omit-path contains this one or any component is found
             # in omit-names, pretend it doesn't exist.
-            if _any_path_contains(self._src_omit_paths_expanded, gitpath):
+            if self._src_omit_matcher.contains(gitpath):
                 continue  # Omitting
-            if any(name in gitpath.split('/') for name in self.ignore_names):
+            if not self.ignore_names.isdisjoint(gitpath.split('/')):
                 continue
             out.add(gitpath)
         self._src_git_files = out
@@ -1992,7 +2053,7 @@ class SpinoffContext:
             # case we *expect* something to be there).
             if (
                 os.path.exists(dst_path_full)
-                and not _any_path_contains(self.git_mirrored_paths, src_path)
+                and not self._git_mirrored_matcher.contains(src_path)
                 and not self._force
             ):
                 self._src_error_entities[src_path] = (
@@ -2074,7 +2135,7 @@ class SpinoffContext:
             self.strict
             and not self._force
             and os.path.getmtime(dst_path_full) != dst_entity.dst_mtime
-            and not _any_path_contains(self.git_mirrored_paths, src_path)
+            and not self._git_mirrored_matcher.contains(src_path)
         ):
             # Try to include when the dst file got modified in
             # case its helpful.
@@ -2150,7 +2211,7 @@ class SpinoffContext:
                 # If it looks like dst did not change, we can go
                 # through with a standard update.
                 self._src_copy_entities.add(src_path)
-            elif _any_path_contains(self.git_mirrored_paths, src_path):
+            elif self._git_mirrored_matcher.contains(src_path):
                 # Ok, dst changed but it is managed by git so this
                 # happens (switching git branches or whatever else...)
                 # in this case we just blindly replace it; no erroring.
@@ -2311,33 +2372,64 @@ class SpinoffContext:
         return set(self._filter_path(p) for p in paths)
 
 
-def _any_path_contains(paths: Iterable[str], path: str) -> bool:
-    assert not path.endswith('/')
-
-    for tpath in paths:
-        # Use simple logic if there's no special chars used by fnmatch.
-        if not any(char in tpath for char in ('*', '?', '[')):
-            if tpath == path or path.startswith(f'{tpath}/'):
-                return True
-        else:
-            # Bust out the fancy logic.
-            # Split both paths into segments ('a/b/c' -> ['a','b','c'])
-            # and compare each using fnmatch. If all segments
-            # from tpath match corresponding ones in path then tpath
-            # is a parent.
-            pathsegs = path.split('/')
-            tpathsegs = tpath.split('/')
-            if len(tpathsegs) > len(pathsegs):
-                continue  # tpath is deeper than path; can't contain it.
-            all_matches = True
-            for i in range(len(tpathsegs)):  # pylint: disable=C0200
-                seg_matches = fnmatch.fnmatchcase(pathsegs[i], tpathsegs[i])
-                if not seg_matches:
-                    all_matches = False
+class _PathMatcher:
+    """Checks whether any of a set of paths contains a given path.
+
+    A path contains itself and anything under it. Paths may include
+    fnmatch-style wildcards ('*', '?', '[') which are matched one path
+    segment at a time (so 'a/*' contains 'a/b' and 'a/b/c').
+
+    Paths are compiled into a trie of literal segments with any
+    wildcard remainders hung off the node where they start, so a check
+    only costs a few dict lookups per segment of the checked path
+    instead of a scan through all paths.
+    """
+
+    class _Node:
+        def __init__(self) -> None:
+            self.children: dict[str, _PathMatcher._Node] = {}
+            self.terminal = False
+            self.globs: list[list[Callable[[str], Any]]] = []
+
+    def __init__(self, paths: Iterable[str], globs: bool = True) -> None:
+        self._root = self._Node()
+        for tpath in paths:
+            segs = tpath.split('/')
+            node = self._root
+            for i, seg in enumerate(segs):
+                if globs and any(char in seg for char in ('*', '?', '[')):
+                    node.globs.append(
+                        [
+                            re.compile(fnmatch.translate(gseg)).match
+                            for gseg in segs[i:]
+                        ]
+                    )
                     break
-            if all_matches:
+                node = node.children.setdefault(seg, self._Node())
+            else:
+                node.terminal = True
+
+    def contains(self, path: str) -> bool:
+        """Return whether any of our paths contains the provided one."""
+        assert not path.endswith('/')
+        segs = path.split('/')
+        segcount = len(segs)
+        node: _PathMatcher._Node | None = self._root
+        for i in range(segcount + 1):
+            assert node is not None
+            if node.terminal:
                 return True
-    return False
+            for glob in node.globs:
+                if len(glob) <= segcount - i and all(
+                    match(segs[i + j]) for j, match in enumerate(glob)
+                ):
+                    return True
+            if i == segcount:
+                break
+            node = node.children.get(segs[i])
+            if node is None:
+                break
+        return False
 
 
 def _get_dir_levels(dirpath: str) -> list[str]:
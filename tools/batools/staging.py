@@ -8,8 +8,9 @@ from __future__ import annotations
 import hashlib
 import os
 import sys
+import time
 import subprocess
-from functools import partial
+from threading import Lock
 from typing import TYPE_CHECKING
 
 from efro.terminal import Clr
@@ -65,6 +66,7 @@ class BuildStager:
         self.builddir: str | None = None
         self.dist_mode: bool = False
         self.wsl_chmod_workaround = False
+        self._staging_manifest: _StagingManifest | None = None
 
     def run(self, args: list[str]) -> None:
         """Do the thing."""
@@ -134,7 +136,19 @@ class BuildStager:
         # pull out of the apk.
         if self.include_payload_file:
             assert self.dst is not None
-            _write_payload_file(self.dst, self.is_payload_full)
+            _write_payload_file(
+                self.dst, self.is_payload_full, self._get_staging_manifest()
+            )
+
+        # Hang on to what we learned about staged files for next time.
+        if self._staging_manifest is not None:
+            self._staging_manifest.save()
+
+    def _get_staging_manifest(self) -> _StagingManifest:
+        if self._staging_manifest is None:
+            assert self.dst is not None
+            self._staging_manifest = _StagingManifest(self.projroot, self.dst)
+        return self._staging_manifest
 
     def _parse_args(self, args: list[str]) -> None:
         """Parse args and apply to ourself."""
@@ -567,10 +581,10 @@ class BuildStager:
 
     def _sync_ba_data_new(self) -> None:
         # pylint: disable=too-many-locals
+        # pylint: disable=too-many-statements
         import json
         import stat
         import shutil
-        from threading import Lock
         from concurrent.futures import ThreadPoolExecutor
 
         from bacommon.bacloud import asset_file_cache_path
@@ -589,6 +603,8 @@ class BuildStager:
 
         filehashes: dict[str, str] = manifest['h']
 
+        staging = self._get_staging_manifest()
+
         mkdirlock = Lock()
 
         def _prep_syncdir(syncdir: str) -> None:
@@ -603,7 +619,27 @@ class BuildStager:
                     if path not in filehashes:
                         os.unlink(os.path.join(self.dst, path))
 
-        def _sync_path(src: str, dst: str) -> None:
+        def _sync_path(path: str, hashval: str) -> None:
+            assert self.dst is not None
+            src = (
+                f'{self.projroot}/.cache/assetdata/'
+                f'{asset_file_cache_path(hashval)}'
+            )
+            dst = os.path.join(self.dst, path)
+            try:
+                dststat = os.stat(dst)
+            except FileNotFoundError:
+                dststat = None
+
+            # Quickest-out: if our staging manifest says we put this
+            # exact content at dst and dst hasn't changed since, we're
+            # done (no need to even look at src).
+            if (
+                dststat is not None
+                and staging.get_hash(path, dststat, 'a') == hashval
+            ):
+                return
+
             # Quick-out: if there's a file already at dst and its
             # modtime and size *exactly* match src, we're done. Note
             # that this is a bit different than Makefile logic where
@@ -615,15 +651,12 @@ class BuildStager:
             # well as size match we can be reasonably sure that the file
             # is still the same. We'll see how this goes...
             srcstat = os.stat(src)
-            try:
-                dststat = os.stat(dst)
-            except FileNotFoundError:
-                dststat = None
             if (
                 dststat is not None
                 and srcstat.st_size == dststat.st_size
                 and srcstat.st_mtime == dststat.st_mtime
             ):
+                staging.add_hash(path, dststat, 'a', hashval)
                 return
 
             # If dst is a directory, blow it away (use the stat we
@@ -640,8 +673,9 @@ class BuildStager:
 
             # Ok, dst doesn't exist or modtimes don't line up. Copy it
             # and try to copy its modtime.
-            shutil.copyfile(src, dst)
+            _copy_file(src, dst)
             shutil.copystat(src, dst)
+            staging.add_hash(path, os.stat(dst), 'a', hashval)
 
         def _cleanup_syncdir(syncdir: str) -> None:
             """Handle pruning empty directories."""
@@ -683,12 +717,7 @@ class BuildStager:
                     if path.startswith(syncdir):
                         futures.append(
                             executor.submit(
-                                _sync_path,
-                                src=(
-                                    f'{self.projroot}/.cache/assetdata/'
-                                    f'{asset_file_cache_path(hashval)}'
-                                ),
-                                dst=os.path.join(self.dst, path),
+                                _sync_path, path=path, hashval=hashval
                             )
                         )
             # Await all results to get any exceptions.
@@ -877,22 +906,157 @@ class BuildStager:
             )
 
 
+class _StagingManifest:
+    """A persistent record of files we've staged to a dst dir.
+
+    For each staged path (relative to dst) we store the size and modtime
+    we last saw for the file along with any content hashes we know for
+    it ('a' for its asset-cache sha256 and 'h' for its md5). As long as
+    the file's size and modtime are unchanged we can trust those hashes
+    instead of re-copying or re-reading the file.
+
+    Entries not accessed during a run are dropped on save.
+    """
+
+    # Don't record hashes for files modified this recently; a further
+    # change within the filesystem's modtime granularity could go
+    # unnoticed.
+    RACY_WINDOW_NS = 2_000_000_000
+
+    def __init__(self, projroot: str, dst: str) -> None:
+        import json
+
+        dsthash = hashlib.md5(os.path.abspath(dst).encode()).hexdigest()
+        self.path = f'{projroot}/.cache/stagingmanifests/{dsthash}'
+        self._lock = Lock()
+        self._entries: dict[str, dict] = {}
+        self._accessed: set[str] = set()
+        self._dirty = False
+
+        # Just going with raw json here instead of dataclassio to
+        # maximize speed; we'll be going over lots of files here.
+        try:
+            with open(self.path, encoding='utf-8') as infile:
+                self._entries = json.loads(infile.read())
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            # Corrupt; start over.
+            self._dirty = True
+
+    def get_hash(
+        self, path: str, stat: os.stat_result, kind: str
+    ) -> str | None:
+        """Return a known hash for a path if it is unchanged."""
+        with self._lock:
+            self._accessed.add(path)
+            entry = self._entries.get(path)
+            if (
+                entry is None
+                or entry['s'] != stat.st_size
+                or entry['m'] != stat.st_mtime_ns
+            ):
+                return None
+            return entry.get(kind)
+
+    def add_hash(
+        self, path: str, stat: os.stat_result, kind: str, value: str
+    ) -> None:
+        """Record a hash for a path in its current state."""
+        if time.time_ns() - stat.st_mtime_ns < self.RACY_WINDOW_NS:
+            return
+        with self._lock:
+            self._accessed.add(path)
+            entry = self._entries.get(path)
+            if (
+                entry is None
+                or entry['s'] != stat.st_size
+                or entry['m'] != stat.st_mtime_ns
+            ):
+                entry = self._entries[path] = {
+                    's': stat.st_size,
+                    'm': stat.st_mtime_ns,
+                }
+            if entry.get(kind) != value:
+                entry[kind] = value
+                self._dirty = True
+
+    def save(self) -> None:
+        """Write out any changes."""
+        import json
+
+        with self._lock:
+            if len(self._accessed) != len(self._entries):
+                self._entries = {
+                    path: entry
+                    for path, entry in self._entries.items()
+                    if path in self._accessed
+                }
+                self._dirty = True
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmppath = f'{self.path}.tmp'
+            with open(tmppath, 'w', encoding='utf-8') as outfile:
+                outfile.write(json.dumps(self._entries, separators=(',', ':')))
+            os.replace(tmppath, self.path)
+            self._dirty = False
+
+
+# Linux ioctl for cloning one file's extents into another (reflink).
+_FICLONE = 0x40049409
+
+
+def _copy_file(src: str, dst: str) -> None:
+    """Copy file contents as cheaply as the platform allows.
+
+    On Linux this tries a copy-on-write clone (reflink) and then an
+    in-kernel copy_file_range() before falling back to a regular copy.
+    """
+    import shutil
+
+    if sys.platform != 'linux':
+        shutil.copyfile(src, dst)
+        return
+
+    import fcntl
+
+    with open(src, 'rb') as infile, open(dst, 'wb') as outfile:
+        infd = infile.fileno()
+        outfd = outfile.fileno()
+        try:
+            fcntl.ioctl(outfd, _FICLONE, infd)
+            return
+        except OSError:
+            pass
+        try:
+            while os.copy_file_range(infd, outfd, 1 << 30):
+                pass
+        except OSError:
+            infile.seek(0)
+            outfile.seek(0)
+            outfile.truncate()
+            shutil.copyfileobj(infile, outfile)
+
+
 def _filehash(filename: str) -> str:
     """Generate a hash for a file."""
-    md5 = hashlib.md5()
     with open(filename, mode='rb') as infile:
-        for buf in iter(partial(infile.read, 1024), b''):
-            md5.update(buf)
-    return md5.hexdigest()
+        return hashlib.file_digest(infile, 'md5').hexdigest()
 
 
-def _write_payload_file(assets_root: str, full: bool) -> None:
+def _write_payload_file(
+    assets_root: str, full: bool, staging: _StagingManifest
+) -> None:
+    # pylint: disable=too-many-locals
     if not assets_root.endswith('/'):
         assets_root = f'{assets_root}/'
 
-    # Now construct a payload file if we have any files.
+    # Now construct a payload file if we have any files. We pull hashes
+    # from our staging manifest where possible so we only need to read
+    # files that have changed.
     file_list = []
-    payload_str = ''
+    payload_lines: list[str] = []
     for root, _subdirs, fnames in os.walk(assets_root):
         for fname in fnames:
             if fname.startswith('.'):
@@ -905,7 +1069,12 @@ def _write_payload_file(assets_root: str, full: bool) -> None:
                 raise RuntimeError(
                     f"Invalid filename (contains spaces): '{fpathshort}'"
                 )
-            payload_str += f'{fpathshort} {_filehash(fpath)}\n'
+            fstat = os.stat(fpath)
+            filehash = staging.get_hash(fpathshort, fstat, 'h')
+            if filehash is None:
+                filehash = _filehash(fpath)
+                staging.add_hash(fpathshort, fstat, 'h', filehash)
+            payload_lines.append(f'{fpathshort} {filehash}\n')
             file_list.append(fpathshort)
 
     payload_path = f'{assets_root}/payload_info'
@@ -913,7 +1082,7 @@ def _write_payload_file(assets_root: str, full: bool) -> None:
         # Write the file count, whether this is a 'full' payload, and
         # finally the file list.
         fullstr = '1' if full else '0'
-        payload_str = f'{len(file_list)}\n{fullstr}\n{payload_str}'
+        payload_str = f'{len(file_list)}\n{fullstr}\n' + ''.join(payload_lines)
         with open(payload_path, 'w', encoding='utf-8') as outfile:
             outfile.write(payload_str)
     else:
@@ -31,8 +31,10 @@ from efro.dataclassio._api import (
     JsonStyle,
     dataclass_to_dict,
     dataclass_to_json,
+    dataclass_to_bytes,
     dataclass_from_dict,
     dataclass_from_json,
+    dataclass_from_bytes,
     dataclass_validate,
     dataclass_hash,
 )
@@ -45,8 +47,10 @@ __all__ = [
     'IOExtendedData',
     'IOMultiType',
     'JsonStyle',
+    'dataclass_from_bytes',
     'dataclass_from_dict',
     'dataclass_from_json',
+    'dataclass_to_bytes',
     'dataclass_to_dict',
     'dataclass_to_json',
     'dataclass_validate',
@@ -40,6 +40,11 @@ class Codec(Enum):
     #: as-is instead of converting them to json-friendly types.
     FIRESTORE = 'firestore'
 
+    #: Like FIRESTORE (bytes and datetime objects are passed through
+    #: as-is); intended for use with dataclassio's compact binary
+    #: format (see :func:`~efro.dataclassio.dataclass_to_bytes()`).
+    BINARY = 'binary'
+
 
 class IOExtendedData:
     """A class types can inherit from for extra functionality."""
@@ -408,9 +413,9 @@ def _is_valid_for_codec(obj: Any, codec: Codec) -> bool:
     if objtype is list:
         return all(_is_valid_for_codec(elem, codec) for elem in obj)
 
-    # A few things are valid in firestore but not json.
+    # A few things are valid in firestore/binary but not json.
     if issubclass(objtype, datetime.datetime) or objtype is bytes:
-        return codec is Codec.FIRESTORE
+        return codec is not Codec.JSON
 
     return False
 
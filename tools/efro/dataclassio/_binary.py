@@ -0,0 +1,339 @@
+# Released under the MIT License. See LICENSE for details.
+#
+"""A compact binary format for dataclassio data.
+
+This is loosely modeled after msgpack, but is implemented in-tree and
+tailored to the data dataclassio produces with :attr:`Codec.BINARY`:
+plain dicts/lists/strs/ints/floats/bools/None plus native bytes and utc
+datetime values.
+
+Differences from msgpack worth noting:
+
+* Lengths and larger ints are stored as varints instead of fixed-width
+  values, and ints are unbounded (like Python's).
+
+* Strings of 3 or more (encoded) bytes are added to a table on first
+  appearance and are written as back-references from then on. This
+  makes repeated dict keys (lists of dataclasses, etc.) and repeated
+  values very cheap.
+
+* The string table starts out holding dataclassio's default
+  :class:`IOMultiType` type-id key, which shows up all over the place.
+
+* Floats are stored in 4 bytes when that can be done losslessly.
+
+* Map keys must be strs. Single ascii character keys (which most
+  storagenames are) are written as a single byte.
+
+* Datetimes are stored as microseconds since the unix epoch (utc).
+
+Data begins with a single format version byte so the format can evolve
+over time.
+"""
+
+# Note: We do lots of comparing of exact types here which is normally
+# frowned upon (stuff like isinstance() is usually encouraged).
+# pylint: disable=unidiomatic-typecheck
+
+from __future__ import annotations
+
+import struct
+import datetime
+from typing import TYPE_CHECKING
+
+from efro.util import check_utc
+
+if TYPE_CHECKING:
+    from typing import Any
+
+FORMAT_VERSION = 1
+
+# Tag bytes. Values below 0x80 are positive fixints and values at or
+# above 0xe0 are negative fixints (-32 to -1).
+_FIXMAP = 0x80  # 0x80-0x8f: map with 0-15 entries.
+_FIXARRAY = 0x90  # 0x90-0x9f: array with 0-15 entries.
+_FIXSTR = 0xA0  # 0xa0-0xbf: str with 0-31 bytes.
+_NIL = 0xC0
+_FALSE = 0xC2
+_TRUE = 0xC3
+_BIN = 0xC4  # + varint len + data
+_FLOAT32 = 0xCA  # + 4 byte big-endian float
+_FLOAT = 0xCB  # + 8 byte big-endian double
+_INT = 0xD0  # + zigzag varint
+_DATETIME = 0xD4  # + zigzag varint (microseconds since epoch)
+_STRREF = 0xD5  # + varint string-table index
+_STR = 0xD9  # + varint len + data
+_ARRAY = 0xDC  # + varint len
+_MAP = 0xDE  # + varint len
+
+# Max nesting depth of maps/arrays we'll decode (deeper data is
+# rejected as malformed rather than running us out of stack).
+_MAX_DEPTH = 256
+
+# Strings at least this many bytes long are added to the string table.
+_STRTABLE_MIN_LEN = 3
+
+# Strings the string table starts out with.
+_STRTABLE_INITIAL = ('_dciotype',)
+_STRTABLE_INITIAL_INDICES = {val: i for i, val in enumerate(_STRTABLE_INITIAL)}
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+_float_struct = struct.Struct('>d')
+_float32_struct = struct.Struct('>f')
+
+
+def binary_dumps(obj: Any) -> bytes:
+    """Encode a value to compact binary form.
+
+    Supported types are those valid for :attr:`Codec.BINARY`: dicts,
+    lists, strs, ints, floats, bools, None, bytes, and utc datetimes.
+    """
+    # Note: we use module-level functions passing state around instead
+    # of nested closures here; setting those up on each call was a
+    # significant chunk of the total cost for typical small messages.
+    out = bytearray((FORMAT_VERSION,))
+    _pack(obj, out, _STRTABLE_INITIAL_INDICES.copy())
+    return bytes(out)
+
+
+def _pack_varint(val: int, out: bytearray) -> None:
+    while val >= 0x80:
+        out.append((val & 0x7F) | 0x80)
+        val >>= 7
+    out.append(val)
+
+
+def _pack_str(val: str, out: bytearray, strings: dict[str, int]) -> None:
+    index = strings.get(val)
+    if index is not None:
+        out.append(_STRREF)
+        _pack_varint(index, out)
+        return
+    encoded = val.encode()
+    length = len(encoded)
+    if length >= _STRTABLE_MIN_LEN:
+        strings[val] = len(strings)
+    if length < 32:
+        out.append(_FIXSTR | length)
+    else:
+        out.append(_STR)
+        _pack_varint(length, out)
+    out += encoded
+
+
+def _pack(val: Any, out: bytearray, strings: dict[str, int]) -> None:
+    # pylint: disable=too-many-branches
+    # pylint: disable=too-many-statements
+    valtype = type(val)
+    if valtype is str:
+        _pack_str(val, out, strings)
+    elif valtype is int:
+        if 0 <= val < 0x80:
+            out.append(val)
+        elif -32 <= val < 0:
+            out.append(val & 0xFF)
+        else:
+            out.append(_INT)
+            _pack_varint(val << 1 if val >= 0 else ((-val) << 1) - 1, out)
+    elif valtype is dict:
+        length = len(val)
+        if length < 16:
+            out.append(_FIXMAP | length)
+        else:
+            out.append(_MAP)
+            _pack_varint(length, out)
+        for key, item in val.items():
+            if type(key) is not str:
+                raise TypeError(
+                    f'Unsupported map key type for binary encoding:'
+                    f' {type(key)}.'
+                )
+            if len(key) == 1 and key < '\x80':
+                out.append(ord(key))
+            else:
+                _pack_str(key, out, strings)
+            # Handle the most common leaf values inline; saves a fair
+            # bit of time vs recursing for them.
+            itemtype = type(item)
+            if itemtype is str:
+                _pack_str(item, out, strings)
+            elif itemtype is int and 0 <= item < 0x80:
+                out.append(item)
+            elif itemtype is bool:
+                out.append(_TRUE if item else _FALSE)
+            else:
+                _pack(item, out, strings)
+    elif valtype is list:
+        length = len(val)
+        if length < 16:
+            out.append(_FIXARRAY | length)
+        else:
+            out.append(_ARRAY)
+            _pack_varint(length, out)
+        for item in val:
+            _pack(item, out, strings)
+    elif val is None:
+        out.append(_NIL)
+    elif valtype is bool:
+        out.append(_TRUE if val else _FALSE)
+    elif valtype is float:
+        packed = _float32_struct.pack(val)
+        if _float32_struct.unpack(packed)[0] == val:
+            out.append(_FLOAT32)
+            out += packed
+        else:
+            out.append(_FLOAT)
+            out += _float_struct.pack(val)
+    elif valtype is bytes:
+        out.append(_BIN)
+        _pack_varint(len(val), out)
+        out += val
+    elif isinstance(val, datetime.datetime):
+        check_utc(val)
+        micros = (val - _EPOCH) // _MICROSECOND
+        out.append(_DATETIME)
+        _pack_varint(micros << 1 if micros >= 0 else ((-micros) << 1) - 1, out)
+    else:
+        raise TypeError(f'Unsupported type for binary encoding: {valtype}.')
+
+
+def binary_loads(data: bytes) -> Any:
+    """Decode a value from compact binary form."""
+    # pylint: disable=too-many-statements
+
+    if not data:
+        raise ValueError('Empty binary data.')
+    if data[0] != FORMAT_VERSION:
+        raise ValueError(f'Unsupported binary format version {data[0]}.')
+
+    strings = list(_STRTABLE_INITIAL)
+    pos = 1
+    depth = 0
+    unpack_float = _float_struct.unpack_from
+    unpack_float32 = _float32_struct.unpack_from
+    datalen = len(data)
+
+    def _varint() -> int:
+        nonlocal pos
+        shift = 0
+        result = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def _str(length: int) -> str:
+        nonlocal pos
+        end = pos + length
+        if end > datalen:
+            raise ValueError('Truncated binary data.')
+        val = data[pos:end].decode()
+        pos = end
+        if length >= _STRTABLE_MIN_LEN:
+            strings.append(val)
+        return val
+
+    def _key() -> str:
+        nonlocal pos
+        tag = data[pos]
+        if tag < 0x80:
+            pos += 1
+            return chr(tag)
+        key = _unpack()
+        if type(key) is not str:
+            raise ValueError(f'Invalid binary map key type {type(key)}.')
+        return key
+
+    def _map(count: int) -> dict:
+        nonlocal depth
+        depth += 1
+        if depth > _MAX_DEPTH:
+            raise ValueError('Binary data nested too deeply.')
+        out = {_key(): _unpack() for _ in range(count)}
+        depth -= 1
+        return out
+
+    def _array(count: int) -> list:
+        nonlocal depth
+        depth += 1
+        if depth > _MAX_DEPTH:
+            raise ValueError('Binary data nested too deeply.')
+        out = [_unpack() for _ in range(count)]
+        depth -= 1
+        return out
+
+    def _unpack() -> Any:
+        # pylint: disable=too-many-return-statements
+        # pylint: disable=too-many-branches
+        nonlocal pos
+        tag = data[pos]
+        pos += 1
+        if tag < 0x80:
+            return tag
+        if tag >= 0xE0:
+            return tag - 0x100
+        if tag < _FIXARRAY:
+            return _map(tag - _FIXMAP)
+        if tag < _FIXSTR:
+            return _array(tag - _FIXARRAY)
+        if tag < _NIL:
+            return _str(tag - _FIXSTR)
+        if tag == _STRREF:
+            return strings[_varint()]
+        if tag == _NIL:
+            return None
+        if tag == _TRUE:
+            return True
+        if tag == _FALSE:
+            return False
+        if tag == _INT:
+            val = _varint()
+            return val >> 1 if not val & 1 else -((val + 1) >> 1)
+        if tag == _FLOAT:
+            fval = unpack_float(data, pos)[0]
+            pos += 8
+            return fval
+        if tag == _FLOAT32:
+            fval = unpack_float32(data, pos)[0]
+            pos += 4
+            return fval
+        if tag == _STR:
+            return _str(_varint())
+        if tag == _MAP:
+            return _map(_varint())
+        if tag == _ARRAY:
+            return _array(_varint())
+        if tag == _BIN:
+            length = _varint()
+            end = pos + length
+            if end > datalen:
+                raise ValueError('Truncated binary data.')
+            bval = bytes(data[pos:end])
+            pos = end
+            return bval
+        if tag == _DATETIME:
+            val = _varint()
+            micros = val >> 1 if not val & 1 else -((val + 1) >> 1)
+            return _EPOCH + datetime.timedelta(microseconds=micros)
+        raise ValueError(f'Invalid binary data tag {tag:#x}.')
+
+    try:
+        out = _unpack()
+    except IndexError as exc:
+        raise ValueError('Truncated binary data.') from exc
+    except (
+        struct.error,
+        OverflowError,
+        TypeError,
+        UnicodeDecodeError,
+        RecursionError,
+    ) as exc:
+        raise ValueError(f'Invalid binary data: {exc}') from exc
+    if pos != datalen:
+        raise ValueError('Trailing bytes found in binary data.')
+    return out
@@ -0,0 +1,1440 @@
+# Released under the MIT License. See LICENSE for details.
+#
+"""Compiled (per-class specialized) encoders/decoders for dataclassio.
+
+The standard :class:`_Outputter` and :class:`_Inputter` classes interpret
+type annotations on every call; for each object they look up prep data,
+walk :func:`dataclasses.fields()` and run :func:`parse_annotated()` on
+each field before dispatching on its type. The functionality here does
+all of that work once per class (and per set of options) and caches a
+tree of specialized closures which can then be run directly on values.
+
+Semantics (validation, :class:`IOAttrs` handling, multitype ids, extra
+attrs, lossy loading, etc.) are intended to exactly match the
+interpreted paths; see the ``compiled`` arg on the various
+:mod:`efro.dataclassio` api calls.
+"""
+
+# Note: We do lots of comparing of exact types here which is normally
+# frowned upon (stuff like isinstance() is usually encouraged).
+# pylint: disable=unidiomatic-typecheck
+# pylint: disable=too-many-lines
+
+from __future__ import annotations
+
+import json
+import types
+import base64
+import typing
+import datetime
+import dataclasses
+from enum import Enum
+from typing import TYPE_CHECKING, override
+
+from efro.util import check_utc
+from efro.dataclassio._base import (
+    Codec,
+    IOAttrs,
+    parse_annotated,
+    EXTRA_ATTRS_ATTR,
+    _is_valid_for_codec,
+    _get_origin,
+    SIMPLE_TYPES,
+    _raise_type_error,
+    IOExtendedData,
+    _get_multitype_type,
+    IOMultiType,
+    TypeNotPresentError,
+)
+from efro.dataclassio._prep import PrepSession
+from efro.dataclassio._outputter import _Outputter
+from efro.dataclassio._inputter import _Inputter
+
+if TYPE_CHECKING:
+    from typing import Any, Callable
+
+    # Compiled value converters take a value and its fieldpath (for
+    # error messages) and return a converted value.
+    _Converter = Callable[[Any, str], Any]
+
+# Attr names for dicts of compiled encoders/decoders we store on
+# dataclass types (keyed by option sets).
+ENCODERS_ATTR = '_DCIOENCODERS'
+DECODERS_ATTR = '_DCIODECODERS'
+
+# Compilers are shared for each distinct set of options. Note that
+# races here are harmless; we may just build some redundant stuff.
+_encoder_compilers: dict[tuple, _EncoderCompiler] = {}
+_decoder_compilers: dict[tuple, _DecoderCompiler] = {}
+
+
+def get_encoder_compiler(
+    codec: Codec, coerce_to_float: bool, discard_extra_attrs: bool
+) -> _EncoderCompiler:
+    """Return a shared encoder-compiler for a set of options."""
+    # (Codec values instead of codecs; see _EncoderCompiler).
+    key = (codec.value, coerce_to_float, discard_extra_attrs)
+    compiler = _encoder_compilers.get(key)
+    if compiler is None:
+        compiler = _encoder_compilers.setdefault(
+            key,
+            _EncoderCompiler(codec, coerce_to_float, discard_extra_attrs),
+        )
+    return compiler
+
+
+def get_decoder_compiler(
+    codec: Codec,
+    coerce_to_float: bool,
+    allow_unknown_attrs: bool,
+    discard_unknown_attrs: bool,
+    lossy: bool,
+) -> _DecoderCompiler:
+    """Return a shared decoder-compiler for a set of options."""
+    key = (
+        codec.value,
+        coerce_to_float,
+        allow_unknown_attrs,
+        discard_unknown_attrs,
+        lossy,
+    )
+    compiler = _decoder_compilers.get(key)
+    if compiler is None:
+        compiler = _decoder_compilers.setdefault(
+            key,
+            _DecoderCompiler(
+                codec,
+                coerce_to_float,
+                allow_unknown_attrs,
+                discard_unknown_attrs,
+                lossy,
+            ),
+        )
+    return compiler
+
+
+class _CompiledOutputter(_Outputter):
+    """An outputter which uses compiled per-class encoders."""
+
+    def __init__(
+        self,
+        obj: Any,
+        *,
+        codec: Codec,
+        coerce_to_float: bool,
+        discard_extra_attrs: bool,
+    ) -> None:
+        super().__init__(
+            obj,
+            create=True,
+            codec=codec,
+            coerce_to_float=coerce_to_float,
+            discard_extra_attrs=discard_extra_attrs,
+        )
+        self._compiler = get_encoder_compiler(
+            codec, coerce_to_float, discard_extra_attrs
+        )
+
+    @override
+    def _process_dataclass(self, cls: type, obj: Any, fieldpath: str) -> Any:
+        return self._compiler.encode_dataclass(obj, fieldpath)
+
+
+class _CompiledInputter(_Inputter):
+    """An inputter which uses compiled per-class decoders."""
+
+    def __init__(
+        self,
+        cls: type[Any],
+        *,
+        codec: Codec,
+        coerce_to_float: bool,
+        allow_unknown_attrs: bool = True,
+        discard_unknown_attrs: bool = False,
+        lossy: bool = False,
+    ):
+        super().__init__(
+            cls,
+            codec=codec,
+            coerce_to_float=coerce_to_float,
+            allow_unknown_attrs=allow_unknown_attrs,
+            discard_unknown_attrs=discard_unknown_attrs,
+            lossy=lossy,
+        )
+        self._compiler = get_decoder_compiler(
+            codec,
+            coerce_to_float,
+            allow_unknown_attrs,
+            discard_unknown_attrs,
+            lossy,
+        )
+
+    @override
+    def _dataclass_from_input(
+        self, cls: type, fieldpath: str, values: dict
+    ) -> Any:
+        return self._compiler.decode_dataclass(cls, fieldpath, values)
+
+
+class _EncoderCompiler:
+    """Builds and caches encoders for a single set of options."""
+
+    def __init__(
+        self, codec: Codec, coerce_to_float: bool, discard_extra_attrs: bool
+    ) -> None:
+        self.codec = codec
+        self.coerce_to_float = coerce_to_float
+        self.discard_extra_attrs = discard_extra_attrs
+        # Note: using codec values instead of the codecs themselves
+        # here; Enum hashing is done in Python and is comparatively slow
+        # for something we do on every encode.
+        self._key = (codec.value, coerce_to_float, discard_extra_attrs)
+
+    def encode_dataclass(self, obj: Any, fieldpath: str) -> Any:
+        """Encode a dataclass instance using its compiled encoder."""
+        cls = type(obj)
+        encoders: dict | None = cls.__dict__.get(ENCODERS_ATTR)
+        if encoders is not None:
+            encoder = encoders.get(self._key)
+            if encoder is not None:
+                return encoder(obj, fieldpath)
+        return self._compile_dataclass(cls)(obj, fieldpath)
+
+    def _compile_dataclass(self, cls: type) -> _Converter:
+        encoder = self._build_dataclass_encoder(cls)
+
+        # Note: we don't use getattr() here since that would find our
+        # parent class' encoders.
+        encoders: dict | None = cls.__dict__.get(ENCODERS_ATTR)
+        if encoders is None:
+            encoders = {}
+            setattr(cls, ENCODERS_ATTR, encoders)
+        encoders[self._key] = encoder
+        return encoder
+
+    def build_value_encoder(
+        self, cls: type, anntype: Any, ioattrs: IOAttrs | None
+    ) -> _Converter:
+        """Build an encoder for values of a particular annotated type."""
+        # pylint: disable=too-many-return-statements
+        # pylint: disable=too-many-branches
+        # pylint: disable=too-many-statements
+        # pylint: disable=too-many-locals
+        origin = _get_origin(anntype)
+        codec = self.codec
+
+        if origin is typing.Any:
+
+            def _enc_any(value: Any, fieldpath: str) -> Any:
+                if not _is_valid_for_codec(value, codec):
+                    raise TypeError(
+                        f'Invalid value type for \'{fieldpath}\';'
+                        f" 'Any' typed values must contain types directly"
+                        f' supported by the specified codec ({codec.name});'
+                        f' found \'{type(value).__name__}\' which is not.'
+                    )
+                return value
+
+            return _enc_any
+
+        if origin is typing.Union or origin is types.UnionType:
+            # Currently, the only unions we support are None/Value
+            # (translated from Optional), which we verified on prep.
+            childanntypes_l = [
+                c for c in typing.get_args(anntype) if c is not type(None)
+            ]  # noqa (pycodestyle complains about *is* with type)
+            assert len(childanntypes_l) == 1
+            childenc = self.build_value_encoder(
+                cls, childanntypes_l[0], ioattrs
+            )
+
+            def _enc_optional(value: Any, fieldpath: str) -> Any:
+                if value is None:
+                    return None
+                return childenc(value, fieldpath)
+
+            return _enc_optional
+
+        # Everything below this point assumes the annotation type
+        # resolves to a concrete type. (This should have been verified
+        # at prep time).
+        assert isinstance(origin, type)
+
+        if origin in SIMPLE_TYPES:
+            if origin is float and self.coerce_to_float:
+
+                def _enc_float(value: Any, fieldpath: str) -> Any:
+                    valtype = type(value)
+                    if valtype is float:
+                        return value
+                    if valtype is int:
+                        return float(value)
+                    _raise_type_error(fieldpath, valtype, (float,))
+                    return None
+
+                return _enc_float
+
+            def _enc_simple(value: Any, fieldpath: str) -> Any:
+                if type(value) is not origin:
+                    _raise_type_error(fieldpath, type(value), (origin,))
+                return value
+
+            return _enc_simple
+
+        if origin is tuple:
+            childencs = [
+                self.build_value_encoder(cls, c, ioattrs)
+                for c in typing.get_args(anntype)
+            ]
+
+            # We should have verified this was non-zero at prep-time
+            assert childencs
+
+            def _enc_tuple(value: Any, fieldpath: str) -> Any:
+                if not isinstance(value, tuple):
+                    raise TypeError(
+                        f'Expected a tuple for {fieldpath};'
+                        f' found a {type(value)}'
+                    )
+                if len(value) != len(childencs):
+                    raise TypeError(
+                        f'Tuple at {fieldpath} contains'
+                        f' {len(value)} values; type specifies'
+                        f' {len(childencs)}.'
+                    )
+                return [
+                    enc(x, fieldpath)
+                    for enc, x in zip(childencs, value, strict=True)
+                ]
+
+            return _enc_tuple
+
+        if origin is list:
+            return self._build_list_encoder(cls, anntype, ioattrs)
+
+        if origin is set:
+            return self._build_set_encoder(cls, anntype, ioattrs)
+
+        if origin is dict:
+            return self._build_dict_encoder(cls, anntype, ioattrs)
+
+        if dataclasses.is_dataclass(origin):
+            encode_dataclass = self.encode_dataclass
+
+            def _enc_dataclass(value: Any, fieldpath: str) -> Any:
+                if not isinstance(value, origin):
+                    raise TypeError(
+                        f'Expected a {origin} for {fieldpath};'
+                        f' found a {type(value)}.'
+                    )
+                return encode_dataclass(value, fieldpath)
+
+            return _enc_dataclass
+
+        # ONLY consider something as a multi-type when it's not a
+        # dataclass (all dataclasses inheriting from the multi-type
+        # should just be processed as dataclasses).
+        if issubclass(origin, IOMultiType):
+            encode_dataclass = self.encode_dataclass
+
+            def _enc_multitype(value: Any, fieldpath: str) -> Any:
+                if not isinstance(value, origin):
+                    raise ValueError(
+                        f"Found a {type(value)} value at '{fieldpath}'."
+                        f' It is expected to inherit from {origin}.'
+                    )
+                return encode_dataclass(value, fieldpath)
+
+            return _enc_multitype
+
+        if issubclass(origin, Enum):
+
+            def _enc_enum(value: Any, fieldpath: str) -> Any:
+                if not isinstance(value, origin):
+                    raise TypeError(
+                        f'Expected a {origin} for {fieldpath};'
+                        f' found a {type(value)}.'
+                    )
+                return value.value
+
+            return _enc_enum
+
+        if issubclass(origin, datetime.datetime):
+            float_times = ioattrs is not None and ioattrs.float_times
+
+            def _enc_datetime(value: Any, fieldpath: str) -> Any:
+                if not isinstance(value, origin):
+                    raise TypeError(
+                        f'Expected a {origin} for {fieldpath};'
+                        f' found a {type(value)}.'
+                    )
+                check_utc(value)
+                if ioattrs is not None:
+                    ioattrs.validate_datetime(value, fieldpath)
+                if codec is not Codec.JSON:
+                    return value
+                if float_times:
+                    return value.timestamp()
+                return [
+                    value.year,
+                    value.month,
+                    value.day,
+                    value.hour,
+                    value.minute,
+                    value.second,
+                    value.microsecond,
+                ]
+
+            return _enc_datetime
+
+        if issubclass(origin, datetime.timedelta):
+            float_times = ioattrs is not None and ioattrs.float_times
+
+            def _enc_timedelta(value: Any, fieldpath: str) -> Any:
+                if not isinstance(value, origin):
+                    raise TypeError(
+                        f'Expected a {origin} for {fieldpath};'
+                        f' found a {type(value)}.'
+                    )
+                if float_times:
+                    return value.total_seconds()
+                return [value.days, value.seconds, value.microseconds]
+
+            return _enc_timedelta
+
+        if origin is bytes:
+
+            def _enc_bytes(value: Any, fieldpath: str) -> Any:
+                if not isinstance(value, bytes):
+                    raise TypeError(
+                        f'Expected bytes for {fieldpath} on {cls.__name__};'
+                        f' found a {type(value)}.'
+                    )
+                # In JSON we convert to base64, but firestore and binary
+                # directly support bytes.
+                if codec is Codec.JSON:
+                    return base64.b64encode(value).decode()
+                return value
+
+            return _enc_bytes
+
+        raise TypeError(
+            f"Field of type '{anntype}' on {cls} is unsupported here."
+        )
+
+    def _build_list_encoder(
+        self, cls: type, anntype: Any, ioattrs: IOAttrs | None
+    ) -> _Converter:
+        codec = self.codec
+        childanntypes = typing.get_args(anntype)
+
+        def _check_list(value: Any, fieldpath: str) -> None:
+            if not isinstance(value, list):
+                raise TypeError(
+                    f'Expected a list for {fieldpath};'
+                    f' found a {type(value)}'
+                )
+
+        # 'Any' type children; make sure they are valid values for the
+        # specified codec.
+        if len(childanntypes) == 0 or childanntypes[0] is typing.Any:
+
+            def _enc_list_any(value: Any, fieldpath: str) -> Any:
+                _check_list(value, fieldpath)
+                for i, child in enumerate(value):
+                    if not _is_valid_for_codec(child, codec):
+                        raise TypeError(
+                            f'Item {i} of {fieldpath} contains'
+                            f' data type(s) not supported by the specified'
+                            f' codec ({codec.name}).'
+                        )
+                return value
+
+            return _enc_list_any
+
+        # We contain elements of some single specified type.
+        assert len(childanntypes) == 1
+        childanntype = childanntypes[0]
+
+        # If that type is a multi-type, we determine our type
+        # per-object.
+        if isinstance(childanntype, type) and issubclass(
+            childanntype, IOMultiType
+        ):
+            encode_dataclass = self.encode_dataclass
+
+            def _enc_list_multitype(value: Any, fieldpath: str) -> Any:
+                _check_list(value, fieldpath)
+                for x in value:
+                    if not isinstance(x, childanntype):
+                        raise ValueError(
+                            f"Found a {type(x)} value under '{fieldpath}'."
+                            f' Everything must inherit from'
+                            f' {childanntype}.'
+                        )
+                return [encode_dataclass(x, fieldpath) for x in value]
+
+            return _enc_list_multitype
+
+        childenc = self.build_value_encoder(cls, childanntype, ioattrs)
+
+        def _enc_list(value: Any, fieldpath: str) -> Any:
+            _check_list(value, fieldpath)
+            return [childenc(x, fieldpath) for x in value]
+
+        return _enc_list
+
+    def _build_set_encoder(
+        self, cls: type, anntype: Any, ioattrs: IOAttrs | None
+    ) -> _Converter:
+        codec = self.codec
+        childanntypes = typing.get_args(anntype)
+
+        def _check_set(value: Any, fieldpath: str) -> None:
+            if not isinstance(value, set):
+                raise TypeError(
+                    f'Expected a set for {fieldpath}; found a {type(value)}'
+                )
+
+        def _json_sort_key(val: Any) -> str:
+            return json.dumps(val, sort_keys=True)
+
+        # See _Outputter for notes on how we keep set output
+        # deterministic.
+        if len(childanntypes) == 0 or childanntypes[0] is typing.Any:
+
+            def _enc_set_any(value: Any, fieldpath: str) -> Any:
+                _check_set(value, fieldpath)
+                for child in value:
+                    if not _is_valid_for_codec(child, codec):
+                        raise TypeError(
+                            f'Set at {fieldpath} contains'
+                            f' data type(s) not supported by the'
+                            f' specified codec ({codec.name}).'
+                        )
+                return sorted(value, key=_json_sort_key)
+
+            return _enc_set_any
+
+        assert len(childanntypes) == 1
+        childenc = self.build_value_encoder(cls, childanntypes[0], ioattrs)
+        sortkey = (
+            None
+            if childanntypes[0] in [str, int, float, bool, datetime.datetime]
+            else _json_sort_key
+        )
+
+        def _enc_set(value: Any, fieldpath: str) -> Any:
+            _check_set(value, fieldpath)
+            return sorted((childenc(x, fieldpath) for x in value), key=sortkey)
+
+        return _enc_set
+
+    def _build_dict_encoder(
+        self, cls: type, anntype: Any, ioattrs: IOAttrs | None
+    ) -> _Converter:
+        # pylint: disable=too-many-locals
+        codec = self.codec
+        childtypes = typing.get_args(anntype)
+        assert len(childtypes) in (0, 2)
+
+        def _check_dict(value: Any, fieldpath: str) -> None:
+            if not isinstance(value, dict):
+                raise TypeError(
+                    f'Expected a dict for {fieldpath}; found a {type(value)}.'
+                )
+
+        # We treat 'Any' dicts simply as json; we don't do any
+        # translating.
+        if not childtypes or childtypes[0] is typing.Any:
+
+            def _enc_dict_any(value: Any, fieldpath: str) -> Any:
+                _check_dict(value, fieldpath)
+                if not _is_valid_for_codec(value, codec):
+                    raise TypeError(
+                        f'Invalid value for dict[Any, Any]'
+                        f' at \'{fieldpath}\' on {cls.__name__};'
+                        f' all keys and values must be directly compatible'
+                        f' with the specified codec ({codec.name})'
+                        f' when dict type is Any.'
+                    )
+                return value
+
+            return _enc_dict_any
+
+        keyanntype, valanntype = childtypes
+        valenc = self.build_value_encoder(cls, valanntype, ioattrs)
+
+        keyconv: Callable[[Any], str]
+        if keyanntype is str:
+            keyconv = str
+            keycheck: type = str
+            keydesc = str(keyanntype)
+        elif keyanntype is int:
+            # int keys are stored as str versions of themselves.
+            keyconv = str
+            keycheck = int
+            keydesc = 'an int'
+        elif issubclass(keyanntype, Enum):
+
+            def _enumkeyconv(key: Any) -> str:
+                return str(key.value)
+
+            keyconv = _enumkeyconv
+            keycheck = keyanntype
+            keydesc = f'a {keyanntype}'
+        else:
+            raise RuntimeError(f'Unhandled dict out-key-type {keyanntype}')
+
+        strkeys = keyanntype is str
+
+        def _enc_dict(value: Any, fieldpath: str) -> Any:
+            _check_dict(value, fieldpath)
+            out: dict = {}
+            for key, val in value.items():
+                if not isinstance(key, keycheck):
+                    raise TypeError(
+                        f'Got invalid key type {type(key)} for'
+                        f' dict key at \'{fieldpath}\' on {cls.__name__};'
+                        f' expected {keydesc}.'
+                    )
+                out[key if strkeys else keyconv(key)] = valenc(val, fieldpath)
+            return out
+
+        return _enc_dict
+
+    def _build_dataclass_encoder(self, cls: type) -> _Converter:
+        prep = PrepSession(explicit=False).prep_dataclass(
+            cls, recursion_level=0
+        )
+        assert prep is not None
+        codec = self.codec
+
+        fieldplans: list[
+            tuple[str, str, _Converter, Callable[[Any], bool] | None]
+        ] = []
+        fields = dataclasses.fields(cls)
+        for field in fields:
+            anntype, ioattrs = parse_annotated(prep.annotations[field.name])
+            storagename = (
+                field.name
+                if (ioattrs is None or ioattrs.storagename is None)
+                else ioattrs.storagename
+            )
+            fieldplans.append(
+                (
+                    field.name,
+                    storagename,
+                    self.build_value_encoder(cls, anntype, ioattrs),
+                    _build_is_default_check(cls, field, ioattrs),
+                )
+            )
+
+        # If this type inherits from multi-type, we store its type id.
+        # Do our sanity checks now so we don't have to on each call.
+        type_id_storage_name: str | None = None
+        type_id_value: str | None = None
+        if issubclass(cls, IOMultiType):
+            type_id = cls.get_type_id()
+            assert isinstance(type_id.value, str)
+            if cls.get_type_cached(type_id) is not cls:
+                raise RuntimeError(
+                    f'dataclassio: object of type {cls}'
+                    f' gives type-id {type_id} but that id gives type'
+                    f' {cls.get_type_cached(type_id)}.'
+                    f' Something is out of sync.'
+                )
+            type_id_storage_name = cls.get_type_id_storage_name()
+            if any(f.name == type_id_storage_name for f in fields):
+                raise RuntimeError(
+                    f'dataclassio: {cls} contains a'
+                    f" '{type_id_storage_name}' field which clashes with"
+                    f' the type-id-storage-name of the IOMulticlass'
+                    f' it inherits from.'
+                )
+            type_id_value = type_id.value
+
+        include_extra_attrs = not self.discard_extra_attrs
+
+        def _enc_dataclass(obj: Any, fieldpath: str) -> Any:
+            out: dict[str, Any] = {}
+            for fieldname, storagename, enc, is_default in fieldplans:
+                value = getattr(obj, fieldname)
+                if is_default is not None and is_default(value):
+                    continue
+                out[storagename] = enc(
+                    value,
+                    f'{fieldpath}.{fieldname}' if fieldpath else fieldname,
+                )
+
+            # If there's extra-attrs stored on us, check/include them.
+            if include_extra_attrs:
+                extra_attrs = getattr(obj, EXTRA_ATTRS_ATTR, None)
+                if isinstance(extra_attrs, dict):
+                    if not _is_valid_for_codec(extra_attrs, codec):
+                        raise TypeError(
+                            f'Extra attrs on \'{fieldpath}\' contains data'
+                            f' type(s) not supported by \'{codec.value}\''
+                            f' codec: {extra_attrs}.'
+                        )
+                    out.update(extra_attrs)
+
+            if type_id_storage_name is not None:
+                out[type_id_storage_name] = type_id_value
+            return out
+
+        return _enc_dataclass
+
+
+def _build_is_default_check(
+    cls: type, field: dataclasses.Field, ioattrs: IOAttrs | None
+) -> Callable[[Any], bool] | None:
+    """Return a call checking if a value can be skipped, if applicable."""
+
+    if ioattrs is None or ioattrs.store_default:
+        return None
+
+    # If both soft_defaults and regular field defaults are present we
+    # want to go with soft_defaults since those same values would be
+    # re-injected when reading the same data back in if we've omitted
+    # the field.
+    default_factory: Any = field.default_factory
+    if ioattrs.soft_default is not ioattrs.MISSING:
+        soft_default = ioattrs.soft_default
+        return lambda value: bool(soft_default == value)
+    if ioattrs.soft_default_factory is not ioattrs.MISSING:
+        soft_default_factory = ioattrs.soft_default_factory
+        assert callable(soft_default_factory)
+        return lambda value: bool(soft_default_factory() == value)
+    if field.default is not dataclasses.MISSING:
+        default = field.default
+        return lambda value: bool(default == value)
+    if default_factory is not dataclasses.MISSING:
+        return lambda value: bool(default_factory() == value)
+    raise RuntimeError(
+        f'Field {field.name} of {cls.__name__} has'
+        f' no source of default values; store_default=False'
+        f' cannot be set for it. (AND THIS SHOULD HAVE BEEN'
+        f' CAUGHT IN PREP!)'
+    )
+
+
+class _DecoderCompiler:
+    """Builds and caches decoders for a single set of options."""
+
+    def __init__(
+        self,
+        codec: Codec,
+        coerce_to_float: bool,
+        allow_unknown_attrs: bool,
+        discard_unknown_attrs: bool,
+        lossy: bool,
+    ) -> None:
+        # pylint: disable=too-many-positional-arguments
+        self.codec = codec
+        self.coerce_to_float = coerce_to_float
+        self.allow_unknown_attrs = allow_unknown_attrs
+        self.discard_unknown_attrs = discard_unknown_attrs
+        self.lossy = lossy
+        self._key = (
+            codec.value,
+            coerce_to_float,
+            allow_unknown_attrs,
+            discard_unknown_attrs,
+            lossy,
+        )
+
+        # Soft-default values are already internal types; we validate
+        # them by running them through an encoder.
+        self._soft_default_validators = get_encoder_compiler(
+            codec, coerce_to_float, discard_extra_attrs=False
+        )
+
+    def decode_dataclass(self, cls: type, fieldpath: str, values: Any) -> Any:
+        """Decode a dataclass instance using its compiled decoder."""
+        decoders: dict | None = cls.__dict__.get(DECODERS_ATTR)
+        if decoders is not None:
+            decoder = decoders.get(self._key)
+            if decoder is not None:
+                return decoder(values, fieldpath)
+        return self._compile_dataclass(cls)(values, fieldpath)
+
+    def _compile_dataclass(self, cls: type) -> _Converter:
+        decoder = self._build_dataclass_decoder(cls)
+
+        # Extended data types can choose to substitute default data in
+        # case of failures (generally not a good idea but occasionally
+        # useful).
+        if issubclass(cls, IOExtendedData):
+            decoder = _wrap_input_error_handler(cls, decoder)
+
+        decoders: dict | None = cls.__dict__.get(DECODERS_ATTR)
+        if decoders is None:
+            decoders = {}
+            setattr(cls, DECODERS_ATTR, decoders)
+        decoders[self._key] = decoder
+        return decoder
+
+    def build_value_decoder(
+        self, cls: type, anntype: Any, ioattrs: IOAttrs | None
+    ) -> _Converter:
+        """Build a decoder for values of a particular annotated type."""
+        # pylint: disable=too-many-locals
+        # pylint: disable=too-many-return-statements
+        # pylint: disable=too-many-branches
+        origin = _get_origin(anntype)
+        codec = self.codec
+
+        if origin is typing.Any:
+
+            def _dec_any(value: Any, fieldpath: str) -> Any:
+                if not _is_valid_for_codec(value, codec):
+                    raise TypeError(
+                        f'Invalid value type for \'{fieldpath}\';'
+                        f' \'Any\' typed values must contain only'
+                        f' types directly supported by the specified'
+                        f' codec ({codec.name}); found'
+                        f' \'{type(value).__name__}\' which is not.'
+                    )
+                return value
+
+            return _dec_any
+
+        if origin is typing.Union or origin is types.UnionType:
+            childanntypes_l = [
+                c for c in typing.get_args(anntype) if c is not type(None)
+            ]  # noqa (pycodestyle complains about *is* with type)
+            assert len(childanntypes_l) == 1
+            childdec = self.build_value_decoder(
+                cls, childanntypes_l[0], ioattrs
+            )
+
+            def _dec_optional(value: Any, fieldpath: str) -> Any:
+                if value is None:
+                    return None
+                return childdec(value, fieldpath)
+
+            return _dec_optional
+
+        assert isinstance(origin, type)
+
+        if origin in SIMPLE_TYPES:
+            if origin is float and self.coerce_to_float:
+
+                def _dec_float(value: Any, fieldpath: str) -> Any:
+                    valtype = type(value)
+                    if valtype is float:
+                        return value
+                    if valtype is int:
+                        return float(value)
+                    _raise_type_error(fieldpath, valtype, (float,))
+                    return None
+
+                return _dec_float
+
+            def _dec_simple(value: Any, fieldpath: str) -> Any:
+                if type(value) is not origin:
+                    _raise_type_error(fieldpath, type(value), (origin,))
+                return value
+
+            return _dec_simple
+
+        if origin in {list, set}:
+            return self._build_sequence_decoder(cls, anntype, origin, ioattrs)
+
+        if origin is tuple:
+            return self._build_tuple_decoder(cls, anntype, ioattrs)
+
+        if origin is dict:
+            return self._build_dict_decoder(cls, anntype, ioattrs)
+
+        if dataclasses.is_dataclass(origin):
+            decode_dataclass = self.decode_dataclass
+
+            def _dec_dataclass(value: Any, fieldpath: str) -> Any:
+                return decode_dataclass(origin, fieldpath, value)
+
+            return _dec_dataclass
+
+        # ONLY consider something as a multi-type when it's not a
+        # dataclass (all dataclasses inheriting from the multi-type
+        # should just be processed as dataclasses).
+        if issubclass(origin, IOMultiType):
+            multitype_obj = self._multitype_obj
+
+            def _dec_multitype(value: Any, fieldpath: str) -> Any:
+                return multitype_obj(origin, fieldpath, value)
+
+            return _dec_multitype
+
+        if issubclass(origin, Enum):
+            return self._build_enum_decoder(origin, ioattrs)
+
+        if issubclass(origin, datetime.datetime):
+            return self._build_datetime_decoder(cls, ioattrs)
+
+        if issubclass(origin, datetime.timedelta):
+            return _build_timedelta_decoder(cls)
+
+        if origin is bytes:
+            return self._build_bytes_decoder()
+
+        raise TypeError(
+            f"Field of type '{anntype}' on {cls} is unsupported here."
+        )
+
+    def _build_enum_decoder(
+        self, origin: type[Enum], ioattrs: IOAttrs | None
+    ) -> _Converter:
+        lossy = self.lossy
+        enum_fallback = None if ioattrs is None else ioattrs.enum_fallback
+
+        # Sanity check; make sure fallback is valid.
+        assert enum_fallback is None or type(enum_fallback) is origin
+
+        def _dec_enum(value: Any, fieldpath: str) -> Any:
+            del fieldpath  # Unused.
+            try:
+                return origin(value)
+            except ValueError as exc:
+                # If a fallback enum was provided in ioattrs AND we're
+                # in lossy mode, return that for unrecognized values.
+                if enum_fallback is not None:
+                    if lossy:
+                        return enum_fallback
+                    raise ValueError(
+                        'Failed to load Enum.  Note that it has a fallback'
+                        ' value and thus would succeed in lossy mode.'
+                    ) from exc
+
+                # Otherwise the error stands as-is.
+                raise
+
+        return _dec_enum
+
+    def _build_bytes_decoder(self) -> _Converter:
+
+        # For firestore and binary, bytes are passed as-is. For json,
+        # they're encoded as base64.
+        if self.codec is not Codec.JSON:
+
+            def _dec_bytes_raw(value: Any, fieldpath: str) -> Any:
+                if not isinstance(value, bytes):
+                    raise TypeError(
+                        f'Expected a bytes object for {fieldpath}'
+                        f' on bytes; got a {type(value)}.'
+                    )
+                return value
+
+            return _dec_bytes_raw
+
+        assert self.codec is Codec.JSON
+
+        def _dec_bytes_b64(value: Any, fieldpath: str) -> Any:
+            if not isinstance(value, str):
+                raise TypeError(
+                    f'Expected a string object for {fieldpath}'
+                    f' on bytes; got a {type(value)}.'
+                )
+            return base64.b64decode(value)
+
+        return _dec_bytes_b64
+
+    def _build_datetime_decoder(
+        self, cls: type, ioattrs: IOAttrs | None
+    ) -> _Converter:
+
+        # For firestore and binary we expect a datetime object.
+        if self.codec is not Codec.JSON:
+
+            def _dec_datetime_raw(value: Any, fieldpath: str) -> Any:
+                # Don't compare exact type here, as firestore can give
+                # us a subclass with extended precision.
+                if not isinstance(value, datetime.datetime):
+                    raise TypeError(
+                        f'Invalid input value for "{fieldpath}" on'
+                        f' "{cls.__name__}";'
+                        f' expected a datetime, got a {type(value).__name__}'
+                    )
+                check_utc(value)
+                return value
+
+            return _dec_datetime_raw
+
+        assert self.codec is Codec.JSON
+
+        def _dec_datetime(value: Any, fieldpath: str) -> Any:
+            # We expect a list of 7 ints (exact datetime value dump) OR
+            # a float/int (timestamp).
+            valt = type(value)
+            if valt is float or valt is int:
+                out = datetime.datetime.fromtimestamp(
+                    value, tz=datetime.timezone.utc
+                )
+            else:
+                if valt is not list:
+                    raise TypeError(
+                        f'Invalid input value for "{fieldpath}"'
+                        f' on "{cls.__name__}";'
+                        f' expected a timestamp or list,'
+                        f' got a {type(value).__name__}'
+                    )
+                if len(value) != 7 or not all(
+                    isinstance(x, int) for x in value
+                ):
+                    raise ValueError(
+                        f'Invalid input value for "{fieldpath}"'
+                        f' on "{cls.__name__}";'
+                        f' expected a list of 7 ints,'
+                        f' got {[type(v) for v in value]}.'
+                    )
+                out = datetime.datetime(  # type: ignore
+                    *value, tzinfo=datetime.timezone.utc
+                )
+            if ioattrs is not None:
+                ioattrs.validate_datetime(out, fieldpath)
+            return out
+
+        return _dec_datetime
+
+    def _build_sequence_decoder(
+        self,
+        cls: type,
+        anntype: Any,
+        seqtype: type,
+        ioattrs: IOAttrs | None,
+    ) -> _Converter:
+        codec = self.codec
+        childanntypes = typing.get_args(anntype)
+
+        def _check_list(value: Any, fieldpath: str) -> None:
+            # Because we are json-centric, we expect a list for all
+            # sequences.
+            if type(value) is not list:
+                raise TypeError(
+                    f'Invalid input value for "{fieldpath}";'
+                    f' expected a list, got a {type(value).__name__}'
+                )
+
+        # 'Any' type children; make sure they are valid json values and
+        # then just grab them.
+        if len(childanntypes) == 0 or childanntypes[0] is typing.Any:
+
+            def _dec_seq_any(value: Any, fieldpath: str) -> Any:
+                _check_list(value, fieldpath)
+                for i, child in enumerate(value):
+                    if not _is_valid_for_codec(child, codec):
+                        raise TypeError(
+                            f'Item {i} of {fieldpath} contains'
+                            f' data type(s) not supported by json.'
+                        )
+                return value if type(value) is seqtype else seqtype(value)
+
+            return _dec_seq_any
+
+        assert len(childanntypes) == 1
+        childanntype = childanntypes[0]
+
+        # If our annotation type inherits from IOMultiType, use type-id
+        # values to determine which type to load for each element.
+        if isinstance(childanntype, type) and issubclass(
+            childanntype, IOMultiType
+        ):
+            multitype_obj = self._multitype_obj
+
+            def _dec_seq_multitype(value: Any, fieldpath: str) -> Any:
+                _check_list(value, fieldpath)
+                return seqtype(
+                    multitype_obj(childanntype, fieldpath, i) for i in value
+                )
+
+            return _dec_seq_multitype
+
+        childdec = self.build_value_decoder(cls, childanntype, ioattrs)
+
+        if seqtype is list:
+
+            def _dec_list(value: Any, fieldpath: str) -> Any:
+                _check_list(value, fieldpath)
+                return [childdec(i, fieldpath) for i in value]
+
+            return _dec_list
+
+        def _dec_seq(value: Any, fieldpath: str) -> Any:
+            _check_list(value, fieldpath)
+            return seqtype(childdec(i, fieldpath) for i in value)
+
+        return _dec_seq
+
+    def _build_tuple_decoder(
+        self, cls: type, anntype: Any, ioattrs: IOAttrs | None
+    ) -> _Converter:
+        codec = self.codec
+        childanntypes = typing.get_args(anntype)
+
+        # We should have verified this to be non-zero at prep-time.
+        assert childanntypes
+
+        childdecs: list[_Converter | None] = [
+            (
+                None
+                if c is typing.Any
+                else self.build_value_decoder(cls, c, ioattrs)
+            )
+            for c in childanntypes
+        ]
+
+        def _dec_tuple(value: Any, fieldpath: str) -> Any:
+            # Because we are json-centric, we expect a list for all
+            # sequences.
+            if type(value) is not list:
+                raise TypeError(
+                    f'Invalid input value for "{fieldpath}";'
+                    f' expected a list, got a {type(value).__name__}'
+                )
+            if len(value) != len(childdecs):
+                raise ValueError(
+                    f'Invalid tuple input for "{fieldpath}";'
+                    f' expected {len(childdecs)} values,'
+                    f' found {len(value)}.'
+                )
+            out: list = []
+            for i, childdec in enumerate(childdecs):
+                childval = value[i]
+                if childdec is None:
+                    # 'Any' type children; make sure they are valid
+                    # json values and then just grab them.
+                    if not _is_valid_for_codec(childval, codec):
+                        raise TypeError(
+                            f'Item {i} of {fieldpath} contains'
+                            f' data type(s) not supported by json.'
+                        )
+                    out.append(childval)
+                else:
+                    out.append(childdec(childval, fieldpath))
+            return tuple(out)
+
+        return _dec_tuple
+
+    def _build_dict_decoder(
+        self, cls: type, anntype: Any, ioattrs: IOAttrs | None
+    ) -> _Converter:
+        codec = self.codec
+        childtypes = typing.get_args(anntype)
+        assert len(childtypes) in (0, 2)
+
+        def _check_dict(value: Any, fieldpath: str) -> None:
+            if not isinstance(value, dict):
+                raise TypeError(
+                    f'Expected a dict for \'{fieldpath}\' on {cls.__name__};'
+                    f' got a {type(value)}.'
+                )
+
+        # We treat 'Any' dicts simply as json; we don't do any
+        # translating.
+        if not childtypes or childtypes[0] is typing.Any:
+
+            def _dec_dict_any(value: Any, fieldpath: str) -> Any:
+                _check_dict(value, fieldpath)
+                if not _is_valid_for_codec(value, codec):
+                    raise TypeError(
+                        f'Got invalid value for Dict[Any, Any]'
+                        f' at \'{fieldpath}\' on {cls.__name__};'
+                        f' all keys and values must be'
+                        f' compatible with the specified codec'
+                        f' ({codec.name}).'
+                    )
+                return value
+
+            return _dec_dict_any
+
+        keyanntype, valanntype = childtypes
+        valdec = self.build_value_decoder(cls, valanntype, ioattrs)
+        keydec = _build_dict_key_decoder(cls, keyanntype)
+
+        def _dec_dict(value: Any, fieldpath: str) -> Any:
+            _check_dict(value, fieldpath)
+            return {
+                keydec(key, fieldpath): valdec(val, fieldpath)
+                for key, val in value.items()
+            }
+
+        return _dec_dict
+
+    def _multitype_obj(self, anntype: Any, fieldpath: str, value: Any) -> Any:
+        try:
+            mttype = _get_multitype_type(anntype, fieldpath, value)
+        # NOTE: We may want to tighten this up; ValueError might be
+        # covering more than the missing enum case we intend here.
+        except (ValueError, TypeNotPresentError):
+            if self.lossy:
+                out = anntype.get_unknown_type_fallback()
+                if out is not None:
+                    # Ok; they provided a fallback. Make sure its of our
+                    # expected type and return it.
+                    assert isinstance(out, anntype)
+                    return out
+            raise
+
+        return self.decode_dataclass(mttype, fieldpath, value)
+
+    def _build_dataclass_decoder(self, cls: type) -> _Converter:
+        # pylint: disable=too-many-locals
+        # pylint: disable=too-many-statements
+        prep = PrepSession(explicit=False).prep_dataclass(
+            cls, recursion_level=0
+        )
+        assert prep is not None
+        codec = self.codec
+        allow_unknown_attrs = self.allow_unknown_attrs
+        discard_unknown_attrs = self.discard_unknown_attrs
+
+        fields = dataclasses.fields(cls)
+        fields_by_name = {f.name: f for f in fields}
+
+        # Special case: if this is a multi-type class it probably has a
+        # type attr. Ignore that while parsing since we already have a
+        # definite type and it will just pollute extra-attrs otherwise.
+        type_id_store_name: str | None = None
+        if issubclass(cls, IOMultiType):
+            type_id_store_name = cls.get_type_id_storage_name()
+            if type_id_store_name in fields_by_name:
+                raise RuntimeError(
+                    f"{cls} contains a '{type_id_store_name}' field"
+                    ' which clashes with the type-id-storage-name of'
+                    ' the IOMultiType it inherits from.'
+                )
+
+        # Map both attr-names and storage-names to (attrname, decoder).
+        # Storage-names win on clashes (matching the interpreted path).
+        lookup: dict[str, tuple[str, _Converter]] = {}
+        soft_defaults: list[tuple[str, Any, Any, _Converter]] = []
+        for field in fields:
+            anntype, ioattrs = parse_annotated(prep.annotations[field.name])
+            lookup[field.name] = (
+                field.name,
+                self.build_value_decoder(cls, anntype, ioattrs),
+            )
+            if ioattrs is not None and (
+                ioattrs.soft_default is not ioattrs.MISSING
+                or ioattrs.soft_default_factory is not ioattrs.MISSING
+            ):
+                soft_defaults.append(
+                    (
+                        field.name,
+                        ioattrs.soft_default,
+                        ioattrs.soft_default_factory,
+                        self._soft_default_validators.build_value_encoder(
+                            cls, anntype, None
+                        ),
+                    )
+                )
+        for storagename, attrname in prep.storage_names_to_attr_names.items():
+            lookup[storagename] = lookup[attrname]
+
+        missing = IOAttrs.MISSING
+
+        def _dec_dataclass(values: Any, fieldpath: str) -> Any:
+            # pylint: disable=too-many-branches
+            if not isinstance(values, dict):
+                raise TypeError(
+                    f'Expected a dict for {fieldpath} on {cls.__name__};'
+                    f' got a {type(values)}.'
+                )
+            args: dict[str, Any] = {}
+            extra_attrs: dict[str, Any] = {}
+            for rawkey, value in values.items():
+
+                # Ignore _dciotype or whatnot.
+                if rawkey == type_id_store_name:
+                    continue
+
+                entry = lookup.get(rawkey)
+
+                # Store unknown attrs off to the side (or error if
+                # desired).
+                if entry is None:
+                    if allow_unknown_attrs:
+                        if discard_unknown_attrs:
+                            continue
+
+                        # Treat this like 'Any' data; ensure that it is
+                        # valid raw json.
+                        if not _is_valid_for_codec(value, codec):
+                            raise TypeError(
+                                f'Unknown attr \'{rawkey}\''
+                                f' on {fieldpath} contains data type(s)'
+                                f' not supported by the specified codec'
+                                f' ({codec.name}).'
+                            )
+                        extra_attrs[rawkey] = value
+                    else:
+                        raise AttributeError(
+                            f"'{cls.__name__}' has no '{rawkey}' field."
+                        )
+                else:
+                    attrname, dec = entry
+                    args[attrname] = dec(
+                        value,
+                        f'{fieldpath}.{attrname}' if fieldpath else attrname,
+                    )
+
+            # Inject soft-default values for any such fields not present
+            # in our data.
+            for attrname, soft_default, soft_factory, check in soft_defaults:
+                if attrname in args:
+                    continue
+                if soft_default is not missing:
+                    value = soft_default
+                else:
+                    assert callable(soft_factory)
+                    value = soft_factory()
+
+                # Make sure these values are valid since we didn't run
+                # them through our normal input type checking.
+                check(
+                    value,
+                    f'{fieldpath}.{attrname}' if fieldpath else attrname,
+                )
+                args[attrname] = value
+
+            try:
+                out = cls(**args)
+            except Exception as exc:
+                raise ValueError(
+                    f'Error instantiating class {cls.__name__}'
+                    f' at {fieldpath}: {exc}'
+                ) from exc
+            if extra_attrs:
+                setattr(out, EXTRA_ATTRS_ATTR, extra_attrs)
+            return out
+
+        return _dec_dataclass
+
+
+def _build_dict_key_decoder(
+    cls: type, keyanntype: Any
+) -> Callable[[Any, str], Any]:
+
+    # str keys we just take directly since that's supported by json.
+    if keyanntype is str:
+
+        def _dec_key_str(key: Any, fieldpath: str) -> Any:
+            if not isinstance(key, str):
+                raise TypeError(
+                    f'Got invalid key type {type(key)} for'
+                    f' dict key at \'{fieldpath}\' on {cls.__name__};'
+                    f' expected a str.'
+                )
+            return key
+
+        return _dec_key_str
+
+    # int keys are stored in json as str versions of themselves.
+    if keyanntype is int:
+
+        def _dec_key_int(key: Any, fieldpath: str) -> Any:
+            if not isinstance(key, str):
+                raise TypeError(
+                    f'Got invalid key type {type(key)} for'
+                    f' dict key at \'{fieldpath}\' on {cls.__name__};'
+                    f' expected a str.'
+                )
+            try:
+                return int(key)
+            except ValueError as exc:
+                raise TypeError(
+                    f'Got invalid key value {repr(key)} for'
+                    f' dict key at \'{fieldpath}\' on {cls.__name__};'
+                    f' expected an int in string form.'
+                ) from exc
+
+        return _dec_key_int
+
+    if issubclass(keyanntype, Enum):
+        # In prep, we verified that all these enums' values have the
+        # same type, so we can just look at the first to see if this is
+        # a string enum or an int enum.
+        enumvaltype = type(next(iter(keyanntype)).value)
+        assert enumvaltype in (int, str)
+        if enumvaltype is str:
+
+            def _dec_key_strenum(key: Any, fieldpath: str) -> Any:
+                try:
+                    return keyanntype(key)
+                except ValueError as exc:
+                    raise ValueError(
+                        f'Got invalid key value {repr(key)} for'
+                        f' dict key at \'{fieldpath}\''
+                        f' on {cls.__name__};'
+                        f' expected a value corresponding to'
+                        f' a {keyanntype}.'
+                    ) from exc
+
+            return _dec_key_strenum
+
+        def _dec_key_intenum(key: Any, fieldpath: str) -> Any:
+            try:
+                return keyanntype(int(key))
+            except (ValueError, TypeError) as exc:
+                raise ValueError(
+                    f'Got invalid key value {repr(key)} for'
+                    f' dict key at \'{fieldpath}\''
+                    f' on {cls.__name__};'
+                    f' expected {keyanntype} value (though'
+                    f' in string form).'
+                ) from exc
+
+        return _dec_key_intenum
+
+    raise RuntimeError(f'Unhandled dict in-key-type {keyanntype}')
+
+
+def _build_timedelta_decoder(cls: type) -> _Converter:
+
+    def _dec_timedelta(value: Any, fieldpath: str) -> Any:
+        # We expect a list of 3 ints (exact timedelta value dump) OR a
+        # float/int (seconds).
+        valt = type(value)
+        if valt is float or valt is int:
+            return datetime.timedelta(seconds=value)
+        if valt is not list:
+            raise TypeError(
+                f'Invalid input value for "{fieldpath}"'
+                f' on "{cls.__name__}";'
+                f' expected a number or list, got a {type(value).__name__}'
+            )
+        if len(value) != 3 or not all(isinstance(x, int) for x in value):
+            raise ValueError(
+                f'Invalid input value for "{fieldpath}"'
+                f' on "{cls.__name__}";'
+                f' expected a list of 3 ints,'
+                f' got {[type(v) for v in value]}.'
+            )
+        return datetime.timedelta(
+            days=value[0], seconds=value[1], microseconds=value[2]
+        )
+
+    return _dec_timedelta
+
+
+def _wrap_input_error_handler(
+    cls: type[IOExtendedData], decoder: _Converter
+) -> _Converter:
+
+    def _dec_with_error_handler(values: Any, fieldpath: str) -> Any:
+        try:
+            return decoder(values, fieldpath)
+        except Exception as exc:
+            fallback = cls.handle_input_error(exc)
+            if fallback is None:
+                raise
+            # Make sure fallback gave us the right type.
+            if not isinstance(fallback, cls):
+                raise RuntimeError(
+                    f'handle_input_error() was expected to return a {cls}'
+                    f' but returned a {type(fallback)}.'
+                ) from exc
+            return fallback
+
+    return _dec_with_error_handler
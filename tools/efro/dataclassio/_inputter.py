@@ -290,9 +290,9 @@ class _Inputter:
         """Given input data, returns bytes."""
         import base64
 
-        # For firestore, bytes are passed as-is. Otherwise, they're encoded
-        # as base64.
-        if self._codec is Codec.FIRESTORE:
+        # For firestore and binary, bytes are passed as-is. For json,
+        # they're encoded as base64.
+        if self._codec is not Codec.JSON:
             if not isinstance(value, bytes):
                 raise TypeError(
                     f'Expected a bytes object for {fieldpath}'
@@ -730,8 +730,8 @@ class _Inputter:
     def _datetime_from_input(
         self, cls: type, fieldpath: str, value: Any, ioattrs: IOAttrs | None
     ) -> Any:
-        # For firestore we expect a datetime object.
-        if self._codec is Codec.FIRESTORE:
+        # For firestore and binary we expect a datetime object.
+        if self._codec is not Codec.JSON:
             # Don't compare exact type here, as firestore can give us
             # a subclass with extended precision.
             if not isinstance(value, datetime.datetime):
@@ -468,9 +468,8 @@ class _Outputter:
                 float_times = ioattrs.float_times
             else:
                 float_times = False
-            if self._codec is Codec.FIRESTORE:
+            if self._codec is not Codec.JSON:
                 return value
-            assert self._codec is Codec.JSON
 
             # By default we spit out an array of ints so that we can
             # reconstruct the datetime perfectly. However we now have
@@ -530,11 +529,11 @@ class _Outputter:
         if not self._create:
             return None
 
-        # In JSON we convert to base64, but firestore directly supports bytes.
+        # In JSON we convert to base64, but firestore and binary
+        # directly support bytes.
         if self._codec is Codec.JSON:
             return base64.b64encode(value).decode()
 
-        assert self._codec is Codec.FIRESTORE
         return value
 
     def _process_dict(
@@ -1,16 +1,23 @@
 # Released under the MIT License. See LICENSE for details.
 #
+# pylint: disable=too-many-lines
 """Logging functionality."""
 from __future__ import annotations
 
+import os
+import re
 import sys
+import glob
+import gzip
 import time
 import asyncio
 import logging
+import heapq
 import datetime
 import itertools
 from enum import Enum
 from functools import partial
+from pathlib import Path
 from collections import deque
 from dataclasses import dataclass, field
 from typing import TYPE_CHECKING, Annotated, override
@@ -18,11 +25,24 @@ from threading import Thread, current_thread, Lock
 
 from efro.util import utc_now, strip_exception_tracebacks
 from efro.terminal import Clr, color_enabled
-from efro.dataclassio import ioprepped, IOAttrs, dataclass_to_json
+from efro.dataclassio import (
+    ioprepped,
+    IOAttrs,
+    dataclass_to_json,
+    dataclass_from_json,
+)
 
 if TYPE_CHECKING:
-    from pathlib import Path
-    from typing import Any, Callable, TextIO, Literal
+    from typing import (
+        Any,
+        Callable,
+        TextIO,
+        Literal,
+        Iterator,
+        Iterable,
+        Sequence,
+        Collection,
+    )
 
 
 class LogLevel(Enum):
@@ -111,6 +131,46 @@ class LogArchive:
     entries: Annotated[list[LogEntry], IOAttrs('e')]
 
 
+@dataclass
+class LogRotation:
+    """Rotation/retention settings for a LogHandler's structured log file.
+
+    When rotation is enabled, the live log file is periodically renamed
+    to a numbered segment alongside it ('log.json.000001', etc.) and a
+    fresh file is started in its place. Segments are then (optionally)
+    gzipped in the background and the oldest are deleted to stay within
+    retention limits. Use :func:`read_log_entries` to read entries back
+    out of the full set of files.
+    """
+
+    # Rotate once the live file reaches this many bytes.
+    max_bytes: int | None = None
+
+    # Rotate at multiples of this interval of wall-clock (utc) time
+    # (a value of 1 hour means rotating at the top of each hour, etc.).
+    # This is checked as entries are written, so an idle log will not
+    # rotate until something new comes through.
+    interval: datetime.timedelta | None = None
+
+    # Whether to gzip rotated segments.
+    compress: bool = True
+
+    # Delete the oldest segments to keep at most this many of them
+    # and/or to keep their total size at or under this many bytes.
+    max_archives: int | None = None
+    max_archive_bytes: int | None = None
+
+
+@dataclass
+class _TimeBucket:
+    """A run of cache entries falling (roughly) within a time span."""
+
+    key: int
+    start_index: int
+    min_time: datetime.datetime
+    max_time: datetime.datetime
+
+
 class LogHandler(logging.Handler):
     """Fancy-pants handler for logging output.
 
@@ -120,6 +180,24 @@ class LogHandler(logging.Handler):
 
     _event_loop: asyncio.AbstractEventLoop
 
+    # Structured log file output is buffered and written out once this
+    # many characters have accumulated, once this many seconds have
+    # passed since the oldest unwritten entry, or immediately for
+    # entries of ERROR level or higher.
+    FILE_FLUSH_SIZE = 64 * 1024
+    FILE_FLUSH_INTERVAL = 0.25
+
+    # Rotated segments are compressed this many bytes at a time, with
+    # other log processing allowed to run in between.
+    COMPRESS_CHUNK_SIZE = 256 * 1024
+    COMPRESS_LEVEL = 6
+
+    # How many recent emit() durations we keep around for latency stats.
+    EMIT_LATENCY_SAMPLES = 10000
+
+    # Granularity of the time index we keep for cached entries.
+    CACHE_TIME_BUCKET_SECONDS = 10.0
+
     # IMPORTANT: Any debug prints we do here should ONLY go to echofile.
     # Otherwise we can get infinite loops as those prints come back to us
     # as new log entries.
@@ -134,12 +212,40 @@ class LogHandler(logging.Handler):
         echofile_timestamp_format: Literal['default', 'relative'] = 'default',
         launch_time: float | None = None,
         strict_threads: bool = False,
+        rotation: LogRotation | None = None,
+        echofile_in_thread: bool = False,
+        file_flush_size: int = FILE_FLUSH_SIZE,
+        file_flush_interval: float = FILE_FLUSH_INTERVAL,
     ):
         super().__init__()
+        self._path = None if path is None else Path(path)
+        self._rotation = None if path is None else rotation
+        self._file_buffer: list[str] = []
+        self._file_buffer_size = 0
+        self._file_flush_timer: asyncio.TimerHandle | None = None
+        self._file_flush_size = file_flush_size
+        self._file_flush_interval = file_flush_interval
+        self._segment_index = 0
+        self._next_rotate_time: float | None = None
+        self._pending_compress = deque[Path]()
+        self._compress_task: asyncio.Task | None = None
+        if self._rotation is not None:
+            self._init_rotation()
         # pylint: disable=consider-using-with
-        self._file = None if path is None else open(path, 'w', encoding='utf-8')
+        self._file = (
+            None
+            if self._path is None
+            else open(self._path, 'w', encoding='utf-8')
+        )
         self._echofile = echofile
         self._echofile_timestamp_format = echofile_timestamp_format
+        # By default we echo at the log call site so output shows up
+        # immediately and in order with other prints. In-thread mode
+        # instead does formatting and echo writes in our bg thread,
+        # minimizing the time spent in logging calls.
+        self._echofile_in_thread = echofile_in_thread
+        self._echo_buffer: list[str] = []
+        self._emit_durations = deque[float](maxlen=self.EMIT_LATENCY_SAMPLES)
         self._callbacks: list[Callable[[LogEntry], None]] = []
         self._file_chunks: dict[str, list[str]] = {'stdout': [], 'stderr': []}
         self._file_chunk_ship_task: dict[str, asyncio.Task | None] = {
@@ -153,6 +259,16 @@ class LogHandler(logging.Handler):
         self._cache_time_limit = cache_time_limit
         self._cache = deque[tuple[int, LogEntry]]()
         self._cache_index_offset = 0
+
+        # Secondary indexes for query(). The name and level indexes hold
+        # (index, entry) pairs and the time index holds runs of entries
+        # (entries usually but not always arrive in time order). All
+        # are pruned along with the cache.
+        self._cache_name_index: dict[str, deque[tuple[int, LogEntry]]] = {}
+        self._cache_level_index: dict[LogLevel, deque[tuple[int, LogEntry]]] = (
+            {}
+        )
+        self._cache_time_index = deque[_TimeBucket]()
         self._cache_lock = Lock()
         self._printed_callback_error = False
         if __debug__:
@@ -231,7 +347,17 @@ class LogHandler(logging.Handler):
                 _prunetask = self._event_loop.create_task(
                     self._time_prune_cache()
                 )
+            if self._pending_compress:
+                self._start_compressing()
             self._event_loop.run_forever()
+
+            # We've been shut down; write out anything still pending
+            # and finish any compression we've got in progress so we
+            # leave things tidy on disk.
+            self._flush_echo_buffer()
+            self._flush_file_buffer()
+            if self._compress_task is not None:
+                self._event_loop.run_until_complete(self._compress_task)
         except BaseException:
             # If this ever goes down we're in trouble; we won't be able
             # to log about it though. Try to make some noise however we
@@ -254,9 +380,7 @@ class LogHandler(logging.Handler):
                     self._cache
                     and (now - self._cache[0][1].time) >= self._cache_time_limit
                 ):
-                    popped = self._cache.popleft()
-                    self._cache_size -= popped[0]
-                    self._cache_index_offset += 1
+                    self._pop_cache_entry()
 
     def get_cached(
         self, start_index: int = 0, max_entries: int | None = None
@@ -308,6 +432,223 @@ class LogHandler(logging.Handler):
         cache.rotate(start)
         return slc
 
+    def query(
+        self,
+        *,
+        names: Collection[str] | None = None,
+        min_level: LogLevel | None = None,
+        since: datetime.datetime | None = None,
+        until: datetime.datetime | None = None,
+        start_index: int = 0,
+        max_entries: int | None = None,
+        newest_first: bool = False,
+    ) -> list[tuple[int, LogEntry]]:
+        """Return cached entries matching the given criteria.
+
+        Entries are returned as (index, entry) pairs, with indices
+        matching those used by get_cached(). Names match loggers and
+        their children ('foo' matches 'foo' and 'foo.bar'), and
+        since/until are inclusive. Only entries at or after start_index
+        are considered and at most max_entries are returned; pass
+        newest_first to get the most recent matches first.
+
+        This uses indexes kept alongside the cache, so only entries that
+        can possibly match get visited.
+        """
+        # pylint: disable=too-many-locals
+        if max_entries is not None:
+            assert max_entries >= 0
+        with self._cache_lock:
+            matched_names = (
+                None
+                if names is None
+                else {
+                    name
+                    for name in self._cache_name_index
+                    if any(
+                        name == qname or name.startswith(f'{qname}.')
+                        for qname in names
+                    )
+                }
+            )
+            matched_levels = (
+                None
+                if min_level is None
+                else [
+                    level
+                    for level in self._cache_level_index
+                    if level.value >= min_level.value
+                ]
+            )
+
+            # Pull candidates from whichever index narrows things down
+            # the most and then check everything on those.
+            sources: list[tuple[int, Iterable[tuple[int, LogEntry]]]] = [
+                self._cache_range(
+                    self._cache_index_offset,
+                    self._cache_index_offset + len(self._cache),
+                    newest_first,
+                )
+            ]
+            if matched_names is not None:
+                sources.append(
+                    self._merged_index(
+                        [self._cache_name_index[n] for n in matched_names],
+                        newest_first,
+                    )
+                )
+            if matched_levels is not None:
+                sources.append(
+                    self._merged_index(
+                        [self._cache_level_index[l] for l in matched_levels],
+                        newest_first,
+                    )
+                )
+            if since is not None or until is not None:
+                sources.append(self._time_range(since, until, newest_first))
+            _count, candidates = min(sources, key=lambda s: s[0])
+
+            results: list[tuple[int, LogEntry]] = []
+            for index, entry in candidates:
+                if index < start_index:
+                    if newest_first:
+                        break
+                    continue
+                if max_entries is not None and len(results) >= max_entries:
+                    break
+                if matched_names is not None and (
+                    entry.name not in matched_names
+                ):
+                    continue
+                if min_level is not None and (
+                    entry.level.value < min_level.value
+                ):
+                    continue
+                if (since is not None and entry.time < since) or (
+                    until is not None and entry.time > until
+                ):
+                    continue
+                results.append((index, entry))
+            return results
+
+    def _push_cache_entry(self, entry_size: int, entry: LogEntry) -> None:
+        assert self._cache_lock.locked()
+        index = self._cache_index_offset + len(self._cache)
+        self._cache.append((entry_size, entry))
+        self._cache_size += entry_size
+        item = (index, entry)
+        names = self._cache_name_index.get(entry.name)
+        if names is None:
+            names = self._cache_name_index[entry.name] = deque()
+        names.append(item)
+        levels = self._cache_level_index.get(entry.level)
+        if levels is None:
+            levels = self._cache_level_index[entry.level] = deque()
+        levels.append(item)
+
+        # Entries join the latest bucket unless they're past its span
+        # (so stragglers arriving late stay in order with their
+        # neighbors and just widen the bucket's time range).
+        key = int(entry.time.timestamp() // self.CACHE_TIME_BUCKET_SECONDS)
+        buckets = self._cache_time_index
+        if not buckets or key > buckets[-1].key:
+            buckets.append(_TimeBucket(key, index, entry.time, entry.time))
+        else:
+            bucket = buckets[-1]
+            if entry.time < bucket.min_time:
+                bucket.min_time = entry.time
+            elif entry.time > bucket.max_time:
+                bucket.max_time = entry.time
+
+    def _pop_cache_entry(self) -> None:
+        assert self._cache_lock.locked()
+        entry_size, entry = self._cache.popleft()
+        self._cache_size -= entry_size
+        self._cache_index_offset += 1
+        names = self._cache_name_index[entry.name]
+        names.popleft()
+        if not names:
+            del self._cache_name_index[entry.name]
+        levels = self._cache_level_index[entry.level]
+        levels.popleft()
+        if not levels:
+            del self._cache_level_index[entry.level]
+        buckets = self._cache_time_index
+        if not self._cache:
+            buckets.clear()
+        elif len(buckets) > 1 and buckets[1].start_index <= (
+            self._cache_index_offset
+        ):
+            buckets.popleft()
+
+    def _cache_range(
+        self, start: int, end: int, reverse: bool
+    ) -> tuple[int, Iterable[tuple[int, LogEntry]]]:
+        """Return a count and iterable for a range of cache entries."""
+        assert self._cache_lock.locked()
+        start_pos = start - self._cache_index_offset
+        end_pos = end - self._cache_index_offset
+        if reverse:
+            cachelen = len(self._cache)
+            return end - start, zip(
+                itertools.count(end - 1, -1),
+                (
+                    e[1]
+                    for e in itertools.islice(
+                        reversed(self._cache),
+                        cachelen - end_pos,
+                        cachelen - start_pos,
+                    )
+                ),
+            )
+        return end - start, zip(
+            itertools.count(start),
+            (e[1] for e in itertools.islice(self._cache, start_pos, end_pos)),
+        )
+
+    @staticmethod
+    def _merged_index(
+        items: list[deque[tuple[int, LogEntry]]], reverse: bool
+    ) -> tuple[int, Iterable[tuple[int, LogEntry]]]:
+        """Return a count and iterable for a set of index deques."""
+        count = sum(len(i) for i in items)
+        if len(items) == 1:
+            return count, reversed(items[0]) if reverse else items[0]
+
+        # Note: indices are unique so entries never get compared here.
+        if reverse:
+            return count, heapq.merge(
+                *(reversed(i) for i in items), reverse=True
+            )
+        return count, heapq.merge(*items)
+
+    def _time_range(
+        self,
+        since: datetime.datetime | None,
+        until: datetime.datetime | None,
+        reverse: bool,
+    ) -> tuple[int, Iterable[tuple[int, LogEntry]]]:
+        """Return a count and iterable covering a span of time."""
+        assert self._cache_lock.locked()
+        buckets = self._cache_time_index
+        cache_end = self._cache_index_offset + len(self._cache)
+        start: int | None = None
+        end = self._cache_index_offset
+        for i, bucket in enumerate(buckets):
+            if (since is None or bucket.max_time >= since) and (
+                until is None or bucket.min_time <= until
+            ):
+                if start is None:
+                    start = max(bucket.start_index, self._cache_index_offset)
+                end = (
+                    buckets[i + 1].start_index
+                    if i + 1 < len(buckets)
+                    else cache_end
+                )
+        if start is None:
+            return 0, ()
+        return self._cache_range(start, end, reverse)
+
     @classmethod
     def _is_immutable_log_data(cls, data: Any) -> bool:
         if isinstance(data, (str, bool, int, float, bytes)):
@@ -322,11 +663,7 @@ class LogHandler(logging.Handler):
 
     @override
     def emit(self, record: logging.LogRecord) -> None:
-        # pylint: disable=too-many-branches
-        # pylint: disable=too-many-locals
-
-        if __debug__:
-            starttime = time.monotonic()
+        starttime = time.monotonic()
 
         # Called by logging to send us records.
 
@@ -336,9 +673,8 @@ class LogHandler(logging.Handler):
         # and thus could possibly change between now and then or if we
         # want to do immediate file echoing then we need to bite the
         # bullet and do that stuff here at the call site.
-        fast_path = self._echofile is None and self._is_immutable_log_data(
-            record.args
-        )
+        echo_here = self._echofile is not None and not self._echofile_in_thread
+        fast_path = not echo_here and self._is_immutable_log_data(record.args)
 
         # Note: just assuming types are correct here, but they'll be
         # checked properly when the resulting LogEntry gets exported.
@@ -347,8 +683,7 @@ class LogHandler(logging.Handler):
             labels = {}
 
         if fast_path:
-            if __debug__:
-                formattime = echotime = time.monotonic()
+            formattime = echotime = time.monotonic()
             self._event_loop.call_soon_threadsafe(
                 partial(
                     self._emit_in_thread,
@@ -360,49 +695,27 @@ class LogHandler(logging.Handler):
                 )
             )
         else:
-            # Slow case; do formatting and echoing here at the log call
-            # site.
+            # Slow case; do formatting (and possibly echoing) here at
+            # the log call site.
             msg = self.format(record)
 
-            if __debug__:
-                formattime = time.monotonic()
-
-            # Also immediately print pretty colored output to our echo
-            # file (generally stderr). We do this part here instead of
-            # in our bg thread because the delay can throw off command
-            # line prompts or make tight debugging harder.
-            if self._echofile is not None:
-                if self._echofile_timestamp_format == 'relative':
-                    timestamp = f'{record.created - self._launch_time:.3f}'
-                else:
-                    timestamp = (
-                        datetime.datetime.fromtimestamp(
-                            record.created, tz=datetime.UTC
-                        ).strftime('%H:%M:%S')
-                        + f'.{int(record.msecs):03d}'
+            formattime = time.monotonic()
+
+            # Unless we've been asked to do it in our bg thread, also
+            # immediately print pretty colored output to our echo file
+            # (generally stderr). We do this here by default because the
+            # delay can throw off command line prompts or make tight
+            # debugging harder.
+            if echo_here:
+                assert self._echofile is not None
+                self._echofile.write(
+                    self._format_echo(
+                        record.name, record.levelno, record.created, msg
                     )
-
-                # If color printing is disabled, show level through text
-                # instead of color.
-                lvlnameex = (
-                    ''
-                    if color_enabled
-                    else f' {logging.getLevelName(record.levelno)}'
                 )
-
-                preinfo = (
-                    f'{Clr.WHT}{timestamp}{lvlnameex} {record.name}:'
-                    f'{Clr.RST} '
-                )
-                ends = LEVELNO_COLOR_CODES.get(record.levelno)
-                if ends is not None:
-                    self._echofile.write(f'{preinfo}{ends[0]}{msg}{ends[1]}\n')
-                else:
-                    self._echofile.write(f'{preinfo}{msg}\n')
                 self._echofile.flush()
 
-            if __debug__:
-                echotime = time.monotonic()
+            echotime = time.monotonic()
 
             self._event_loop.call_soon_threadsafe(
                 partial(
@@ -415,16 +728,16 @@ class LogHandler(logging.Handler):
                 )
             )
 
+        now = time.monotonic()
+        duration = now - starttime
+        self._emit_durations.append(duration)
+
         if __debug__:
-            # pylint: disable=used-before-assignment
-            #
             # Make noise if we're taking a significant amount of time
             # here. Limit the noise to once every so often though;
             # otherwise we could get a feedback loop where every log
             # emit results in a warning log which results in another,
             # etc.
-            now = time.monotonic()
-            duration = now - starttime
             format_duration = formattime - starttime
             echo_duration = echotime - formattime
             if duration > 0.05 and (
@@ -448,6 +761,71 @@ class LogHandler(logging.Handler):
                     )
                 )
 
+    def get_emit_latencies(
+        self, percentiles: Sequence[float] = (50.0, 90.0, 99.0, 99.9)
+    ) -> dict[float, float]:
+        """Return recent emit() durations at the given percentiles.
+
+        Durations are in seconds and cover the most recent
+        EMIT_LATENCY_SAMPLES calls. This is the time a logging call
+        spends in our handler on the calling thread, so it is useful for
+        comparing echo modes/etc. Returns an empty dict if nothing has
+        been emitted yet.
+        """
+        # Note: deque.copy() is atomic, so this is safe while other
+        # threads are emitting.
+        samples = sorted(self._emit_durations.copy())
+        if not samples:
+            return {}
+        return {
+            pct: samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+            for pct in percentiles
+        }
+
+    def _format_echo(
+        self, name: str, levelno: int, created: float, msg: str
+    ) -> str:
+        """Build a pretty colored line for our echo file."""
+        if self._echofile_timestamp_format == 'relative':
+            timestamp = f'{created - self._launch_time:.3f}'
+        else:
+            timestamp = datetime.datetime.fromtimestamp(
+                created, tz=datetime.UTC
+            ).strftime('%H:%M:%S.%f')[:-3]
+
+        # If color printing is disabled, show level through text
+        # instead of color.
+        lvlnameex = '' if color_enabled else f' {logging.getLevelName(levelno)}'
+
+        preinfo = f'{Clr.WHT}{timestamp}{lvlnameex} {name}:{Clr.RST} '
+        ends = LEVELNO_COLOR_CODES.get(levelno)
+        if ends is not None:
+            return f'{preinfo}{ends[0]}{msg}{ends[1]}\n'
+        return f'{preinfo}{msg}\n'
+
+    def _echo_in_thread(
+        self, name: str, levelno: int, created: float, msg: str
+    ) -> None:
+        assert current_thread() is self._thread
+        if not self._echo_buffer:
+            # Write out everything that comes in during this loop
+            # iteration in one go.
+            self._event_loop.call_soon(self._flush_echo_buffer)
+        self._echo_buffer.append(self._format_echo(name, levelno, created, msg))
+
+    def _flush_echo_buffer(self) -> None:
+        assert current_thread() is self._thread
+        if self._echofile is None or not self._echo_buffer:
+            return
+        try:
+            self._echofile.write(''.join(self._echo_buffer))
+            self._echofile.flush()
+        except Exception:
+            import traceback
+
+            traceback.print_exc(file=self._echofile)
+        self._echo_buffer = []
+
     def _emit_in_thread(
         self,
         name: str,
@@ -462,6 +840,9 @@ class LogHandler(logging.Handler):
             if isinstance(message, logging.LogRecord):
                 message = self.format(message)
 
+            if self._echofile_in_thread and self._echofile is not None:
+                self._echo_in_thread(name, levelno, created, message)
+
             self._emit_entry(
                 LogEntry(
                     name=name,
@@ -616,26 +997,197 @@ class LogHandler(logging.Handler):
                         entry.time,
                     )
                 )
-                self._cache.append((entry_size, entry))
-                self._cache_size += entry_size
+                self._push_cache_entry(entry_size, entry)
 
                 # Prune old until we are back at or under our limit.
                 while self._cache_size > self._cache_size_limit:
-                    popped = self._cache.popleft()
-                    self._cache_size -= popped[0]
-                    self._cache_index_offset += 1
+                    self._pop_cache_entry()
 
         # Pass to callbacks.
         for call in self._callbacks:
             self._run_callback_on_entry(call, entry)
 
-        # Dump to our structured log file.
-        #
-        # TODO: should set a timer for flushing; don't flush every line.
+        # Dump to our structured log file (buffered).
         if self._file is not None:
-            entry_s = dataclass_to_json(entry)
+            entry_s = dataclass_to_json(entry, compiled=True)
             assert '\n' not in entry_s  # Make sure its a single line.
-            print(entry_s, file=self._file, flush=True)
+            self._file_buffer.append(entry_s)
+            self._file_buffer_size += len(entry_s) + 1
+            if (
+                self._file_buffer_size >= self._file_flush_size
+                or entry.level.value >= LogLevel.ERROR.value
+            ):
+                self._flush_file_buffer()
+            elif self._file_flush_timer is None:
+                self._file_flush_timer = self._event_loop.call_later(
+                    self._file_flush_interval, self._flush_file_buffer
+                )
+
+    def _flush_file_buffer(self) -> None:
+        """Write any buffered entries to our structured log file."""
+        assert current_thread() is self._thread
+        if self._file_flush_timer is not None:
+            self._file_flush_timer.cancel()
+            self._file_flush_timer = None
+        if self._file is None or not self._file_buffer:
+            return
+        self._file_buffer.append('')  # For a trailing newline.
+        try:
+            # Time-based rotation happens before writing so that entries
+            # land in the segment for the interval they were written in;
+            # size-based rotation happens after so segments don't go
+            # (much) past their limit.
+            if (
+                self._next_rotate_time is not None
+                and time.time() >= self._next_rotate_time
+            ):
+                self._rotate_file()
+            self._file.write('\n'.join(self._file_buffer))
+            self._file.flush()
+            if (
+                self._rotation is not None
+                and self._rotation.max_bytes is not None
+                and self._file.tell() >= self._rotation.max_bytes
+            ):
+                self._rotate_file()
+        except Exception:
+            import traceback
+
+            traceback.print_exc(file=self._echofile)
+        self._file_buffer = []
+        self._file_buffer_size = 0
+
+    def _init_rotation(self) -> None:
+        """Get existing segments in order before we start writing."""
+        assert self._path is not None and self._rotation is not None
+
+        # Clear out anything left behind by an interrupted compression.
+        for tmppath in glob.glob(
+            f'{glob.escape(str(self._path))}.[0-9]*.gz.tmp'
+        ):
+            os.unlink(tmppath)
+        segments = _find_log_segments(self._path)
+        for _index, segpath in segments:
+            if segpath.suffix == '.gz':
+                # We may have died between finishing compression and
+                # removing the original.
+                segpath.with_suffix('').unlink(missing_ok=True)
+            elif self._rotation.compress:
+                self._pending_compress.append(segpath)
+        self._segment_index = segments[-1][0] if segments else 0
+
+        # Rather than clobbering a previous run's log, rotate it out.
+        if self._path.exists() and self._path.stat().st_size > 0:
+            self._segment_index += 1
+            segpath = self._segment_path(self._segment_index)
+            os.replace(self._path, segpath)
+            if self._rotation.compress:
+                self._pending_compress.append(segpath)
+        self._update_next_rotate_time()
+        if not self._rotation.compress:
+            self._prune_segments()
+
+    def _segment_path(self, index: int) -> Path:
+        assert self._path is not None
+        return self._path.with_name(f'{self._path.name}.{index:06d}')
+
+    def _update_next_rotate_time(self) -> None:
+        assert self._rotation is not None
+        if self._rotation.interval is None:
+            return
+        interval = self._rotation.interval.total_seconds()
+        assert interval > 0.0
+        self._next_rotate_time = (time.time() // interval + 1.0) * interval
+
+    def _rotate_file(self) -> None:
+        """Move our live log file aside and start a fresh one."""
+        assert current_thread() is self._thread
+        assert self._path is not None and self._rotation is not None
+        assert self._file is not None
+        if self._file.tell() == 0:
+            # Nothing to rotate out.
+            self._update_next_rotate_time()
+            return
+        self._file.close()
+        self._segment_index += 1
+        segpath = self._segment_path(self._segment_index)
+        try:
+            os.replace(self._path, segpath)
+        finally:
+            # If the move failed we'll just keep appending to what's
+            # there and try again next time.
+            # pylint: disable=consider-using-with
+            self._file = open(self._path, 'a', encoding='utf-8')
+        self._update_next_rotate_time()
+        if self._rotation.compress:
+            self._pending_compress.append(segpath)
+            self._start_compressing()
+        else:
+            self._prune_segments()
+
+    def _start_compressing(self) -> None:
+        if self._compress_task is None:
+            self._compress_task = self._event_loop.create_task(
+                self._compress_segments(), name='log compress segments'
+            )
+
+    async def _compress_segments(self) -> None:
+        while self._pending_compress:
+            try:
+                await self._compress_segment(self._pending_compress[0])
+            except Exception:
+                import traceback
+
+                traceback.print_exc(file=self._echofile)
+            self._pending_compress.popleft()
+            self._prune_segments()
+        self._compress_task = None
+
+    async def _compress_segment(self, segpath: Path) -> None:
+        gzpath = segpath.with_name(f'{segpath.name}.gz')
+        tmppath = segpath.with_name(f'{segpath.name}.gz.tmp')
+        with (
+            open(segpath, 'rb') as infile,
+            gzip.open(
+                tmppath, 'wb', compresslevel=self.COMPRESS_LEVEL
+            ) as outfile,
+        ):
+            while chunk := infile.read(self.COMPRESS_CHUNK_SIZE):
+                outfile.write(chunk)
+
+                # Let entries keep flowing while we work.
+                await asyncio.sleep(0)
+        os.replace(tmppath, gzpath)
+        os.unlink(segpath)
+
+    def _prune_segments(self) -> None:
+        """Delete the oldest segments to stay within retention limits."""
+        assert self._path is not None and self._rotation is not None
+        max_archives = self._rotation.max_archives
+        max_archive_bytes = self._rotation.max_archive_bytes
+        if max_archives is None and max_archive_bytes is None:
+            return
+        try:
+            # Leave anything still waiting on compression alone.
+            segments = [
+                (segpath, segpath.stat().st_size)
+                for _index, segpath in _find_log_segments(self._path)
+                if segpath not in self._pending_compress
+            ]
+            total_bytes = sum(size for _segpath, size in segments)
+            for segpath, size in segments:
+                if (max_archives is None or len(segments) <= max_archives) and (
+                    max_archive_bytes is None
+                    or total_bytes <= max_archive_bytes
+                ):
+                    break
+                segpath.unlink(missing_ok=True)
+                segments = segments[1:]
+                total_bytes -= size
+        except Exception:
+            import traceback
+
+            traceback.print_exc(file=self._echofile)
 
     def _run_callback_on_entry(
         self, callback: Callable[[LogEntry], None], entry: LogEntry
@@ -693,6 +1245,8 @@ def setup_logging(
     launch_time: float | None = None,
     strict_threads: bool = False,
     standard_filters: bool = True,
+    log_rotation: LogRotation | None = None,
+    echo_in_thread: bool = False,
 ) -> LogHandler:
     """Set up our logging environment.
 
@@ -728,6 +1282,8 @@ def setup_logging(
         cache_time_limit=cache_time_limit,
         launch_time=launch_time,
         strict_threads=strict_threads,
+        rotation=log_rotation,
+        echofile_in_thread=echo_in_thread,
     )
 
     if standard_filters:
@@ -791,6 +1347,75 @@ def setup_logging(
     return loghandler
 
 
+def get_log_segments(path: str | Path) -> list[Path]:
+    """Return the files making up a structured log, oldest first.
+
+    This includes any rotated segments (see :class:`LogRotation`)
+    followed by the live log file itself if it exists.
+    """
+    path = Path(path)
+    paths = [segpath for _index, segpath in _find_log_segments(path)]
+    if path.exists():
+        paths.append(path)
+    return paths
+
+
+def read_log_entries(path: str | Path) -> Iterator[LogEntry]:
+    """Stream entries from a structured log and its rotated segments.
+
+    Entries are yielded oldest first. Files are read incrementally, so
+    this is fine to use on large logs and on logs that are being
+    actively written/rotated.
+    """
+    for segpath in get_log_segments(path):
+        try:
+            infile = _open_log_segment(segpath)
+        except FileNotFoundError:
+            # It may have been compressed out from under us; otherwise
+            # it has been pruned and we just move on.
+            if segpath.suffix == '.gz' or segpath == Path(path):
+                continue
+            try:
+                infile = _open_log_segment(
+                    segpath.with_name(f'{segpath.name}.gz')
+                )
+            except FileNotFoundError:
+                continue
+        with infile:
+            for line in infile:
+                if line.strip():
+                    yield dataclass_from_json(LogEntry, line, compiled=True)
+
+
+def _open_log_segment(path: Path) -> TextIO:
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def _find_log_segments(path: Path) -> list[tuple[int, Path]]:
+    """Return (index, path) for rotated segments of a log, oldest first.
+
+    Where both a compressed and uncompressed version of a segment exist
+    (compression was interrupted), the compressed one is returned.
+    """
+    segment_re = re.compile(rf'{re.escape(path.name)}\.(\d+)(\.gz)?')
+    segments: dict[int, Path] = {}
+    try:
+        names = os.listdir(path.parent)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        match = segment_re.fullmatch(name)
+        if match is None:
+            continue
+        index = int(match.group(1))
+        if match.group(2) is None and index in segments:
+            continue
+        segments[index] = path.parent / name
+    return sorted(segments.items())
+
+
 def _asyncio_exception_handler(
     loop: asyncio.AbstractEventLoop, context: dict[str, Any]
 ) -> None:
@@ -1,15 +1,20 @@
 # Released under the MIT License. See LICENSE for details.
 #
+# pylint: disable=too-many-lines
 """Remote procedure call related functionality."""
 
 from __future__ import annotations
 
 import time
+import zlib
+import bisect
+import random
+import struct
 import asyncio
 import logging
 from enum import Enum
 from collections import deque
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from threading import current_thread
 from typing import TYPE_CHECKING, Annotated, assert_never
 
@@ -26,7 +31,8 @@ from efro.dataclassio import (
 )
 
 if TYPE_CHECKING:
-    from typing import Literal, Awaitable, Callable
+    from ssl import SSLContext
+    from typing import Any, Literal, Awaitable, Callable
 
 logger = logging.getLogger(__name__)
 
@@ -44,10 +50,23 @@ class _PacketType(Enum):
     RESPONSE = 3
     MESSAGE_BIG = 4
     RESPONSE_BIG = 5
+    MESSAGE_PART = 6
+    RESPONSE_PART = 7
+    # Same layout as MESSAGE/RESPONSE but with zlib compressed data
+    # (which may be the final frame of a series of part packets).
+    MESSAGE_ZLIB = 8
+    RESPONSE_ZLIB = 9
 
 
 _BYTE_ORDER: Literal['big'] = 'big'
 
+# Most packets consist of type (1b), message_id (2b), len (2b), and
+# data. Big ones use a 4 byte len instead.
+_HEADER = struct.Struct('>BHH')
+_HEADER_BIG = struct.Struct('>BHI')
+
+_KEEPALIVE_PACKET = bytes((_PacketType.KEEPALIVE.value,))
+
 
 @ioprepped
 @dataclass
@@ -58,6 +77,11 @@ class _PeerInfo:
     # How often we'll be sending out keepalives (in seconds).
     keepalive_interval: Annotated[float, IOAttrs('k')]
 
+    # Compression methods we accept for incoming data.
+    compression: Annotated[list[str], IOAttrs('c', store_default=False)] = (
+        field(default_factory=list)
+    )
+
 
 # Note: we are expected to be forward and backward compatible; we can
 # increment protocol freely and expect everyone else to still talk to us.
@@ -65,7 +89,42 @@ class _PeerInfo:
 # Protocol history:
 # 1 - initial release
 # 2 - gained big (32-bit len val) package/response packets
-OUR_PROTOCOL = 2
+# 3 - gained part packets; large messages/responses are now sent as a
+#     series of interleaved frames (see _OutStream).
+# 4 - gained compression negotiation and zlib message/response packets.
+OUR_PROTOCOL = 4
+
+
+@dataclass
+class RPCEndpointStats:
+    """Send queue statistics for an :class:`RPCEndpoint`.
+
+    Useful for monitoring how well peers are keeping up with us.
+    """
+
+    # Packets/streams currently waiting to be written.
+    queued_packets: int
+
+    # Bytes currently waiting to be written.
+    queued_bytes: int
+
+    # Highest queue levels seen over the endpoint's lifetime.
+    peak_queued_packets: int
+    peak_queued_bytes: int
+
+    # Total bytes handed to the transport.
+    total_bytes_written: int
+
+    # How many times (and how long in total) the write task had to wait
+    # for the transport to drain.
+    drain_count: int
+    total_drain_time: float
+    max_drain_time: float
+
+    # How many times (and how long in total) senders were suspended due
+    # to the send queue being over its high watermark.
+    backpressure_wait_count: int
+    total_backpressure_wait_time: float
 
 
 def ssl_stream_writer_underlying_transport_info(
@@ -84,26 +143,169 @@ def ssl_stream_writer_underlying_transport_info(
     return '(not found)'
 
 
-class _InFlightMessage:
-    """Represents a message that is out on the wire."""
+class _OutStream:
+    """A large outgoing message or response sent as a series of frames.
+
+    This allows other packets to be interleaved with large transfers
+    instead of getting stuck behind them. If a compression level is
+    passed, data is compressed a frame at a time as it goes out (so
+    compressing a huge payload never stalls everything else).
+    """
+
+    # Max frames worth of input we compress when building one packet.
+    MAX_COMPRESS_INPUT_FRAMES = 8
+
+    def __init__(
+        self,
+        message_id: int,
+        data: bytes,
+        is_response: bool,
+        compress_level: int | None = None,
+    ) -> None:
+        self.message_id = message_id
+        self.data = data
+        self.is_response = is_response
+        self.compressed = compress_level is not None
+        self.offset = 0
+        self.done = False
+        self._view = memoryview(data)
+        self._compressor = (
+            None if compress_level is None else zlib.compressobj(compress_level)
+        )
+        self._zpending = bytearray()
+
+    @property
+    def remaining(self) -> int:
+        """How many bytes of our data have not yet been sent."""
+        return len(self.data) - self.offset
+
+    def next_packet(
+        self, peer_protocol: int, frame_size: int
+    ) -> tuple[bytes, bytes | memoryview] | None:
+        """Return our next packet for sending (or None if unsendable).
+
+        Packets are returned as separate header and payload buffers so
+        they can be assembled into larger writes with a single copy.
+        """
+        assert not self.done
+        data = self.data
+
+        # We only compress for peers that asked for it.
+        assert not self.compressed or peer_protocol >= 4
+        if self._compressor is not None:
+            return self._next_compressed_packet(frame_size)
+
+        # Older peers don't understand parts; send everything in one go.
+        if peer_protocol < 3:
+            self.done = True
+            self.offset = len(data)
+            if len(data) > 65535:
+                # Protocol 1 does not support big packets; it's up to
+                # the sender to error in this case.
+                if peer_protocol == 1:
+                    return None
+                ptype = (
+                    _PacketType.RESPONSE_BIG
+                    if self.is_response
+                    else _PacketType.MESSAGE_BIG
+                )
+                return (
+                    _HEADER_BIG.pack(ptype.value, self.message_id, len(data)),
+                    data,
+                )
+            ptype = (
+                _PacketType.RESPONSE
+                if self.is_response
+                else _PacketType.MESSAGE
+            )
+            return (_HEADER.pack(ptype.value, self.message_id, len(data)), data)
+
+        # Send all but the final frame as part packets and the final
+        # one as a regular message/response packet. The receiver
+        # assembles the full payload when that final packet arrives.
+        start = self.offset
+        remaining = len(data) - start
+        if remaining > frame_size:
+            ptype = (
+                _PacketType.RESPONSE_PART
+                if self.is_response
+                else _PacketType.MESSAGE_PART
+            )
+            end = start + frame_size
+        else:
+            if self.compressed:
+                ptype = (
+                    _PacketType.RESPONSE_ZLIB
+                    if self.is_response
+                    else _PacketType.MESSAGE_ZLIB
+                )
+            else:
+                ptype = (
+                    _PacketType.RESPONSE
+                    if self.is_response
+                    else _PacketType.MESSAGE
+                )
+            end = len(data)
+            self.done = True
+        self.offset = end
 
-    def __init__(self, message_id: int) -> None:
-        self._response: bytes | None = None
-        self._got_response = asyncio.Event()
-        self.wait_task = asyncio.create_task(
-            self._wait(), name=f'rpc in-flight-msg {message_id} wait'
+        return (
+            _HEADER.pack(ptype.value, self.message_id, end - start),
+            self._view[start:end],
         )
 
-    async def _wait(self) -> bytes:
-        await self._got_response.wait()
-        assert self._response is not None
-        return self._response
+    def _next_compressed_packet(
+        self, frame_size: int
+    ) -> tuple[bytes, bytes | memoryview]:
+        compressor = self._compressor
+        assert compressor is not None
+        pending = self._zpending
+        datalen = len(self.data)
+
+        # Feed input until we've got more than a frame of output (so we
+        # know this isn't the final frame) or have run out of input.
+        # Highly compressible data can take lots of input to produce a
+        # frame, so past a point we force out what we've got to bound
+        # the work done per call.
+        fed = 0
+        while len(pending) <= frame_size and self.offset < datalen:
+            if fed >= self.MAX_COMPRESS_INPUT_FRAMES * frame_size:
+                pending += compressor.flush(zlib.Z_SYNC_FLUSH)
+                break
+            end = min(self.offset + frame_size, datalen)
+            pending += compressor.compress(self._view[self.offset : end])
+            fed += end - self.offset
+            self.offset = end
+            if end == datalen:
+                pending += compressor.flush()
+
+        if len(pending) > frame_size or self.offset < datalen:
+            ptype = (
+                _PacketType.RESPONSE_PART
+                if self.is_response
+                else _PacketType.MESSAGE_PART
+            )
+            frame = bytes(pending[:frame_size])
+            del pending[:frame_size]
+            assert frame
+        else:
+            ptype = (
+                _PacketType.RESPONSE_ZLIB
+                if self.is_response
+                else _PacketType.MESSAGE_ZLIB
+            )
+            frame = bytes(pending)
+            pending.clear()
+            self.done = True
+        return _HEADER.pack(ptype.value, self.message_id, len(frame)), frame
 
-    def set_response(self, data: bytes) -> None:
-        """Set response data."""
-        assert self._response is None
-        self._response = data
-        self._got_response.set()
+
+class _InParts:
+    """A large incoming message or response being received in frames."""
+
+    def __init__(self) -> None:
+        self.parts: list[bytes] = []
+        self.size = 0
 
 
 class _KeepaliveTimeoutError(Exception):
@@ -113,16 +315,30 @@ class _KeepaliveTimeoutError(Exception):
 class RPCEndpoint:
     """Facilitates asynchronous multiplexed remote procedure calls.
 
-    Be aware that, while multiple calls can be in flight in either direction
-    simultaneously, packets are still sent serially in a single
-    stream. So excessively long messages/responses will delay all other
-    communication. If/when this becomes an issue we can look into breaking up
-    long messages into multiple packets.
+    Multiple calls can be in flight in either direction simultaneously.
+    Packets are sent serially in a single stream, but (with peers
+    supporting protocol 3 or newer) messages and responses larger than
+    :attr:`FRAME_SIZE` are sent as series of frames interleaved with
+    other traffic, so large transfers don't block smaller calls.
+
+    Messages and responses larger than ``compression_threshold`` bytes
+    are zlib compressed when the peer supports it (protocol 4 or newer)
+    and when doing so actually makes them smaller. Note that messages
+    sent before the peer's handshake has arrived are never compressed.
     """
 
     # Set to True on an instance to test keepalive failures.
     test_suppress_keepalives: bool = False
 
+    # Can be set on an instance before running to test communication
+    # with peers using older protocols.
+    test_protocol: int = OUR_PROTOCOL
+
+    # Max data size for individual frames of large messages/responses.
+    # Other packets can be sent between frames, so this limits how long
+    # large transfers can block other communication.
+    FRAME_SIZE = 32 * 1024
+
     # How long we should wait before giving up on a message by default.
     # Note this includes processing time on the other end.
     DEFAULT_MESSAGE_TIMEOUT = 60.0
@@ -134,6 +350,30 @@ class RPCEndpoint:
     # disconnect.
     DEFAULT_KEEPALIVE_TIMEOUT = 30.0
 
+    # Once our send queue goes above either of these high watermarks,
+    # send_message_with_backpressure() calls will wait until it falls
+    # back below both low watermarks.
+    DEFAULT_SEND_QUEUE_HIGH_WATER_BYTES = 4 * 1024 * 1024
+    DEFAULT_SEND_QUEUE_LOW_WATER_BYTES = 1024 * 1024
+    DEFAULT_SEND_QUEUE_HIGH_WATER_PACKETS = 1000
+    DEFAULT_SEND_QUEUE_LOW_WATER_PACKETS = 250
+
+    # Payloads larger than this are compressed by default (when our
+    # peer supports it). Below this, savings aren't worth the cpu time.
+    DEFAULT_COMPRESSION_THRESHOLD = 64 * 1024
+
+    # We favor speed over ratio; most of the win for typical data comes
+    # at the fastest level.
+    COMPRESSION_LEVEL = 1
+
+    # Incoming messages/responses larger than this are considered a
+    # protocol error and close the connection.
+    DEFAULT_MAX_INCOMING_SIZE = 256 * 1024 * 1024
+
+    # Max number of large incoming messages/responses we'll be partway
+    # through receiving at once before considering it a protocol error.
+    DEFAULT_MAX_INCOMING_PARTIALS = 256
+
     def __init__(
         self,
         handle_raw_message_call: Callable[[bytes], Awaitable[bytes]],
@@ -146,7 +386,20 @@ class RPCEndpoint:
         debug_print_call: Callable[[str], None] | None = None,
         keepalive_interval: float = DEFAULT_KEEPALIVE_INTERVAL,
         keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT,
+        send_queue_high_water_bytes: int = DEFAULT_SEND_QUEUE_HIGH_WATER_BYTES,
+        send_queue_low_water_bytes: int = DEFAULT_SEND_QUEUE_LOW_WATER_BYTES,
+        send_queue_high_water_packets: int = (
+            DEFAULT_SEND_QUEUE_HIGH_WATER_PACKETS
+        ),
+        send_queue_low_water_packets: int = (
+            DEFAULT_SEND_QUEUE_LOW_WATER_PACKETS
+        ),
+        compression_threshold: int | None = DEFAULT_COMPRESSION_THRESHOLD,
+        max_incoming_size: int = DEFAULT_MAX_INCOMING_SIZE,
+        max_incoming_partials: int = DEFAULT_MAX_INCOMING_PARTIALS,
     ) -> None:
+        # pylint: disable=too-many-locals
+        # pylint: disable=too-many-statements
         self._handle_raw_message_call = handle_raw_message_call
         self._reader = reader
         self._writer = writer
@@ -160,7 +413,9 @@ class RPCEndpoint:
         self._closing = False
         self._did_wait_closed = False
         self._event_loop = asyncio.get_running_loop()
-        self._out_packets = deque[bytes]()
+        self._out_buffers: list[bytes | memoryview] = []
+        self._out_packet_count = 0
+        self._out_streams = deque[_OutStream]()
         self._have_out_packets = asyncio.Event()
         self._run_called = False
         self._peer_info: _PeerInfo | None = None
@@ -170,11 +425,48 @@ class RPCEndpoint:
         self._did_wait_closed_writer = False
         self._did_out_packets_buildup_warning = False
         self._total_bytes_read = 0
+        self._compression_threshold = compression_threshold
+        self._max_incoming_size = max_incoming_size
+        self._max_incoming_partials = max_incoming_partials
         self._create_time = time.monotonic()
 
+        # Send queue accounting/backpressure.
+        if send_queue_low_water_bytes > send_queue_high_water_bytes:
+            raise ValueError(
+                'send_queue_low_water_bytes cannot be larger than'
+                ' send_queue_high_water_bytes.'
+            )
+        if send_queue_low_water_packets > send_queue_high_water_packets:
+            raise ValueError(
+                'send_queue_low_water_packets cannot be larger than'
+                ' send_queue_high_water_packets.'
+            )
+        self._send_queue_high_water_bytes = send_queue_high_water_bytes
+        self._send_queue_low_water_bytes = send_queue_low_water_bytes
+        self._send_queue_high_water_packets = send_queue_high_water_packets
+        self._send_queue_low_water_packets = send_queue_low_water_packets
+        self._out_buffer_bytes = 0
+        self._out_stream_bytes = 0
+        self._send_queue_full = False
+        self._send_queue_waiters = deque[asyncio.Future[None]]()
+        self._peak_out_packets = 0
+        self._peak_out_bytes = 0
+        self._total_bytes_written = 0
+        self._drain_count = 0
+        self._total_drain_time = 0.0
+        self._max_drain_time = 0.0
+        self._backpressure_wait_count = 0
+        self._total_backpressure_wait_time = 0.0
+
         # Need to hold weak-refs to these otherwise it creates dep-loops
-        # which keeps us alive.
-        self._tasks: list[asyncio.Task] = []
+        # which keeps us alive. Tasks remove themselves when done.
+        self._tasks: set[asyncio.Task] = set()
+
+        # Completes once we've received our peer's handshake (or once
+        # we've closed).
+        self._handshake_future: asyncio.Future[None] = (
+            self._event_loop.create_future()
+        )
 
         # When we last got a keepalive or equivalent (time.monotonic value)
         self._last_keepalive_receive_time: float | None = None
@@ -182,7 +474,12 @@ class RPCEndpoint:
         # (Start near the end to make sure our looping logic is sound).
         self._next_message_id = 65530
 
-        self._in_flight_messages: dict[int, _InFlightMessage] = {}
+        # Futures for messages awaiting responses by message id.
+        self._in_flight_messages: dict[int, asyncio.Future[bytes]] = {}
+
+        # Partially received large messages/responses by message id.
+        self._in_message_parts: dict[int, _InParts] = {}
+        self._in_response_parts: dict[int, _InParts] = {}
 
         if self.debug_print:
             peername = self._writer.get_extra_info('peername')
@@ -195,6 +492,29 @@ class RPCEndpoint:
         """How many total bytes have been read."""
         return self._total_bytes_read
 
+    def is_send_queue_full(self) -> bool:
+        """Is our send queue currently over its high watermark?
+
+        Once this becomes True it remains so until the queue falls back
+        below its low watermarks.
+        """
+        return self._send_queue_full
+
+    def get_stats(self) -> RPCEndpointStats:
+        """Return current send queue statistics."""
+        return RPCEndpointStats(
+            queued_packets=self._out_packet_count + len(self._out_streams),
+            queued_bytes=self._out_buffer_bytes + self._out_stream_bytes,
+            peak_queued_packets=self._peak_out_packets,
+            peak_queued_bytes=self._peak_out_bytes,
+            total_bytes_written=self._total_bytes_written,
+            drain_count=self._drain_count,
+            total_drain_time=self._total_drain_time,
+            max_drain_time=self._max_drain_time,
+            backpressure_wait_count=self._backpressure_wait_count,
+            total_backpressure_wait_time=self._total_backpressure_wait_time,
+        )
+
     def __del__(self) -> None:
         if self._run_called:
             if not self._did_close_writer:
@@ -253,7 +573,8 @@ class RPCEndpoint:
                 name='rpc write',
             ),
         ]
-        self._tasks += core_tasks
+        for task in core_tasks:
+            self._add_task(task)
 
         # Run our core tasks until they all complete.
         results = await asyncio.gather(*core_tasks, return_exceptions=True)
@@ -337,27 +658,10 @@ class RPCEndpoint:
                 f'{self._label}: will enqueue at {self._tm()}.'
             )
 
-        # FIXME - should handle backpressure (waiting here if there are
-        # enough packets already enqueued).
+        # Note: we never block here; callers wanting to respect our send
+        # queue limits should use send_message_with_backpressure().
 
-        if len(message) > 65535:
-            # Payload consists of type (1b), message_id (2b),
-            # len (4b), and data.
-            self._enqueue_outgoing_packet(
-                _PacketType.MESSAGE_BIG.value.to_bytes(1, _BYTE_ORDER)
-                + message_id.to_bytes(2, _BYTE_ORDER)
-                + len(message).to_bytes(4, _BYTE_ORDER)
-                + message
-            )
-        else:
-            # Payload consists of type (1b), message_id (2b),
-            # len (2b), and data.
-            self._enqueue_outgoing_packet(
-                _PacketType.MESSAGE.value.to_bytes(1, _BYTE_ORDER)
-                + message_id.to_bytes(2, _BYTE_ORDER)
-                + len(message).to_bytes(2, _BYTE_ORDER)
-                + message
-            )
+        self._enqueue_outgoing_payload(message_id, message, is_response=False)
 
         if self.debug_print_io:
             self.debug_print_call(
@@ -367,18 +671,15 @@ class RPCEndpoint:
 
         # Make an entry so we know this message is out there.
         assert message_id not in self._in_flight_messages
-        msgobj = self._in_flight_messages[message_id] = _InFlightMessage(
-            message_id
+        # Our read task completes this future when the response arrives
+        # (and we cancel it if we die).
+        response_future = self._in_flight_messages[message_id] = (
+            self._event_loop.create_future()
         )
 
-        # Also add its task to our list so we properly cancel it if we
-        # die.
-        self._prune_tasks()  # Keep our list from filling with dead tasks.
-        self._tasks.append(msgobj.wait_task)
-
         # Note: we always want to incorporate a timeout. Individual
         # messages may hang or error on the other end and this ensures
-        # we won't build up lots of zombie tasks waiting around for
+        # we won't build up lots of zombie futures waiting around for
         # responses that will never arrive.
         if timeout is None:
             timeout = self.DEFAULT_MESSAGE_TIMEOUT
@@ -386,31 +687,84 @@ class RPCEndpoint:
 
         # Now complete the send asynchronously.
         return self._send_message(
-            message, timeout, close_on_error, msgobj.wait_task, message_id
+            message, timeout, close_on_error, response_future, message_id
+        )
+
+    async def send_message_with_backpressure(
+        self,
+        message: bytes,
+        timeout: float | None = None,
+        close_on_error: bool = True,
+    ) -> bytes:
+        """Send a message to the peer, respecting send queue limits.
+
+        Behaves like :meth:`send_message()` except that, if our send
+        queue is over its high watermark (such as when the peer is not
+        keeping up with us), this waits until the queue drains below its
+        low watermarks before enqueueing the message. Note that this
+        wait does not count towards timeout.
+        """
+        self._check_env()
+
+        # Wait in line if the queue is full (or if others are already
+        # waiting; this keeps things first-come-first-served).
+        if (
+            self._send_queue_full or self._send_queue_waiters
+        ) and not self._closing:
+            self._backpressure_wait_count += 1
+            starttime = time.monotonic()
+            waiter = self._event_loop.create_future()
+            self._send_queue_waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # If we were already woken, pass our turn along;
+                # otherwise just get out of line.
+                if waiter.cancelled():
+                    self._send_queue_waiters.remove(waiter)
+                else:
+                    self._wake_send_queue_waiter()
+                raise
+            finally:
+                self._total_backpressure_wait_time += (
+                    time.monotonic() - starttime
+                )
+
+        # (send_message() will error if we were closed while waiting).
+        response = self.send_message(
+            message, timeout=timeout, close_on_error=close_on_error
         )
 
+        # Waiters are woken one at a time as each enqueues its message
+        # (as opposed to all at once) so that they don't blow past our
+        # high watermark.
+        self._wake_send_queue_waiter()
+
+        return await response
+
     async def _send_message(
         self,
         message: bytes,
         timeout: float | None,
         close_on_error: bool,
-        bytes_awaitable: asyncio.Task[bytes],
+        response_future: asyncio.Future[bytes],
         message_id: int,
     ) -> bytes:
         # pylint: disable=too-many-positional-arguments
         # We need to know their protocol, so if we haven't gotten a handshake
         # from them yet, just wait.
-        while self._peer_info is None:
-            await asyncio.sleep(0.01)
-        assert self._peer_info is not None
+        if self._peer_info is None:
+            await self._handshake_future
+            if self._peer_info is None:
+                # We closed before the handshake arrived.
+                raise CommunicationError('Endpoint closed before handshake.')
 
         if self._peer_info.protocol == 1:
             if len(message) > 65535:
                 raise RuntimeError('Message cannot be larger than 65535 bytes')
 
         try:
-            # print(f'WILL WAIT FOR TASK {bytes_awaitable.get_name()}')
-            return await asyncio.wait_for(bytes_awaitable, timeout=timeout)
+            return await asyncio.wait_for(response_future, timeout=timeout)
         except asyncio.CancelledError as exc:
             # Question: we assume this means the above wait_for() was
             # cancelled; how do we distinguish between this and *us* being
@@ -436,10 +790,12 @@ class RPCEndpoint:
                     )
 
                 # Stop waiting on the response.
-                bytes_awaitable.cancel()
+                response_future.cancel()
 
-                # Remove the record of this message.
-                del self._in_flight_messages[message_id]
+                # Remove the record of this message (if a newer message
+                # hasn't taken over its id already).
+                if self._in_flight_messages.get(message_id) is response_future:
+                    del self._in_flight_messages[message_id]
 
                 if close_on_error:
                     self.close()
@@ -464,6 +820,12 @@ class RPCEndpoint:
 
         self._closing = True
 
+        # Wake anyone waiting on backpressure so they can error out.
+        for waiter in self._send_queue_waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._send_queue_waiters.clear()
+
         # Kill all of our in-flight tasks.
         if self.debug_print:
             self.debug_print_call(f'{self._label}: cancelling tasks...')
@@ -471,6 +833,13 @@ class RPCEndpoint:
         for task in self._get_live_tasks():
             task.cancel()
 
+        # Fail any calls still waiting on responses or on our handshake.
+        for response_future in self._in_flight_messages.values():
+            response_future.cancel()
+        self._in_flight_messages.clear()
+        if not self._handshake_future.done():
+            self._handshake_future.set_result(None)
+
         # Close our writer.
         assert not self._did_close_writer
         if self.debug_print:
@@ -513,7 +882,7 @@ class RPCEndpoint:
 
         # Don't need our task list anymore; this should
         # break any cyclical refs from tasks referring to us.
-        self._tasks = []
+        self._tasks = set()
 
         if self.debug_print:
             self.debug_print_call(
@@ -602,6 +971,7 @@ class RPCEndpoint:
 
     async def _run_read_task(self) -> None:
         """Read from the peer."""
+        # pylint: disable=too-many-branches
         self._check_env()
         assert self._peer_info is None
 
@@ -621,6 +991,12 @@ class RPCEndpoint:
                 f'{self._label}: received handshake at {self._tm()}.'
             )
 
+        # Outgoing messages and streams may have been waiting on this.
+        if not self._handshake_future.done():
+            self._handshake_future.set_result(None)
+        if self._out_streams:
+            self._have_out_packets.set()
+
         # Now just sit and handle stuff as it comes in.
         while True:
             if self._closing:
@@ -651,18 +1027,85 @@ class RPCEndpoint:
             elif mtype is _PacketType.RESPONSE_BIG:
                 await self._handle_response_packet(big=True)
 
+            elif mtype is _PacketType.MESSAGE_PART:
+                await self._handle_part_packet(self._in_message_parts)
+
+            elif mtype is _PacketType.RESPONSE_PART:
+                await self._handle_part_packet(self._in_response_parts)
+
+            elif mtype is _PacketType.MESSAGE_ZLIB:
+                await self._handle_message_packet(big=False, compressed=True)
+
+            elif mtype is _PacketType.RESPONSE_ZLIB:
+                await self._handle_response_packet(big=False, compressed=True)
+
             else:
                 assert_never(mtype)
 
-    async def _handle_message_packet(self, big: bool) -> None:
+    async def _handle_part_packet(self, parts: dict[int, _InParts]) -> None:
+        msgid = await self._read_int_16()
+        partlen = await self._read_int_16()
+        part = await self._reader.readexactly(partlen)
+        self._total_bytes_read += partlen
+        inparts = parts.get(msgid)
+        if inparts is None:
+            if len(parts) >= self._max_incoming_partials:
+                raise RuntimeError(
+                    f'Peer exceeded {self._max_incoming_partials}'
+                    f' partially received messages/responses.'
+                )
+            inparts = parts[msgid] = _InParts()
+        self._check_incoming_size(inparts.size + partlen)
+        inparts.parts.append(part)
+        inparts.size += partlen
+
+    def _decompress(self, data: bytes) -> bytes:
+        # Bound our output so a tiny compressed payload can't expand
+        # into something huge.
+        decompressor = zlib.decompressobj()
+        out = decompressor.decompress(data, self._max_incoming_size)
+        if decompressor.unconsumed_tail:
+            raise RuntimeError(
+                f'Peer sent compressed message/response larger than'
+                f' {self._max_incoming_size} bytes.'
+            )
+        if not decompressor.eof:
+            raise RuntimeError('Peer sent incomplete compressed data.')
+        return out
+
+    def _check_incoming_size(self, size: int) -> None:
+        if size > self._max_incoming_size:
+            raise RuntimeError(
+                f'Peer sent message/response larger than'
+                f' {self._max_incoming_size} bytes.'
+            )
+
+    async def _handle_message_packet(
+        self, big: bool, compressed: bool = False
+    ) -> None:
         assert self._peer_info is not None
         msgid = await self._read_int_16()
         if big:
             msglen = await self._read_int_32()
         else:
             msglen = await self._read_int_16()
+
+        # If this is the final frame of a large message, assemble it.
+        inparts = self._in_message_parts.pop(msgid, None)
+        self._check_incoming_size(
+            msglen if inparts is None else inparts.size + msglen
+        )
         msg = await self._reader.readexactly(msglen)
         self._total_bytes_read += msglen
+        if inparts is not None:
+            inparts.parts.append(msg)
+            msg = b''.join(inparts.parts)
+            msglen = len(msg)
+
+        if compressed:
+            msg = self._decompress(msg)
+            msglen = len(msg)
+
         if self.debug_print_io:
             self.debug_print_call(
                 f'{self._label}: received message {msgid}'
@@ -672,8 +1115,7 @@ class RPCEndpoint:
         # Create a message-task to handle this message and return
         # a response (we don't want to block while that happens).
         assert not self._closing
-        self._prune_tasks()  # Keep from filling with dead tasks.
-        self._tasks.append(
+        self._add_task(
             asyncio.create_task(
                 self._handle_raw_message(message_id=msgid, message=msg),
                 name='efro rpc message handle',
@@ -684,7 +1126,9 @@ class RPCEndpoint:
                 f'{self._label}: done handling message at {self._tm()}.'
             )
 
-    async def _handle_response_packet(self, big: bool) -> None:
+    async def _handle_response_packet(
+        self, big: bool, compressed: bool = False
+    ) -> None:
         assert self._peer_info is not None
         msgid = await self._read_int_16()
         # Protocol 2 gained 32 bit data lengths.
@@ -697,10 +1141,22 @@ class RPCEndpoint:
                 f'{self._label}: received response {msgid}'
                 f' of size {rsplen} at {self._tm()}.'
             )
+        # If this is the final frame of a large response, assemble it.
+        inparts = self._in_response_parts.pop(msgid, None)
+        self._check_incoming_size(
+            rsplen if inparts is None else inparts.size + rsplen
+        )
         rsp = await self._reader.readexactly(rsplen)
         self._total_bytes_read += rsplen
-        msgobj = self._in_flight_messages.get(msgid)
-        if msgobj is None:
+        if inparts is not None:
+            inparts.parts.append(rsp)
+            rsp = b''.join(inparts.parts)
+
+        if compressed:
+            rsp = self._decompress(rsp)
+
+        response_future = self._in_flight_messages.pop(msgid, None)
+        if response_future is None:
             # It's possible for us to get a response to a message
             # that has timed out. In this case we will have no local
             # record of it.
@@ -709,8 +1165,8 @@ class RPCEndpoint:
                     f'{self._label}: got response for nonexistent'
                     f' message id {msgid}; perhaps it timed out?'
                 )
-        else:
-            msgobj.set_response(rsp)
+        elif not response_future.done():
+            response_future.set_result(rsp)
 
     async def _run_write_task(self) -> None:
         """Write to the peer."""
@@ -720,8 +1176,9 @@ class RPCEndpoint:
         # Introduce ourself so our peer knows how it can talk to us.
         data = dataclass_to_json(
             _PeerInfo(
-                protocol=OUR_PROTOCOL,
+                protocol=self.test_protocol,
                 keepalive_interval=self._keepalive_interval,
+                compression=['zlib'] if self.test_protocol >= 4 else [],
             )
         ).encode()
         self._writer.write(len(data).to_bytes(4, _BYTE_ORDER) + data)
@@ -731,31 +1188,33 @@ class RPCEndpoint:
             # Wait until some data comes in.
             await self._have_out_packets.wait()
 
-            assert self._out_packets
-            data = self._out_packets.popleft()
+            # Write everything we've got in one go; this keeps syscalls
+            # and drain() calls to a minimum when lots of small packets
+            # are flowing.
+            buffers = self._take_out_buffers()
 
-            # Important: only clear this once all packets are sent.
-            if not self._out_packets:
+            # Important: only clear this once we've got nothing left to
+            # send.
+            if not buffers:
                 self._have_out_packets.clear()
+                continue
 
-            self._writer.write(data)
+            # Note: we join buffers ourself instead of using
+            # writelines(), as the latter skips flow control (pausing
+            # for drain) on some Python versions.
+            self._writer.write(
+                buffers[0] if len(buffers) == 1 else b''.join(buffers)
+            )
 
             # This should keep our writer from buffering huge amounts
-            # of outgoing data. We must remember though that we also
-            # need to prevent _out_packets from growing too large and
-            # that part's on us.
+            # of outgoing data. Keeping our own send queue in check is
+            # handled via our watermarks.
+            starttime = time.monotonic()
             await self._writer.drain()
-
-            # For now we're not applying backpressure, but let's make
-            # noise if this gets out of hand.
-            if len(self._out_packets) > 200:
-                if not self._did_out_packets_buildup_warning:
-                    logger.warning(
-                        '_out_packets building up too'
-                        ' much on RPCEndpoint %s.',
-                        id(self),
-                    )
-                    self._did_out_packets_buildup_warning = True
+            duration = time.monotonic() - starttime
+            self._drain_count += 1
+            self._total_drain_time += duration
+            self._max_drain_time = max(self._max_drain_time, duration)
 
     async def _run_keepalive_task(self) -> None:
         """Send periodic keepalive packets."""
@@ -774,9 +1233,7 @@ class RPCEndpoint:
 
             await asyncio.sleep(self._keepalive_interval)
             if not self.test_suppress_keepalives:
-                self._enqueue_outgoing_packet(
-                    _PacketType.KEEPALIVE.value.to_bytes(1, _BYTE_ORDER)
-                )
+                self._enqueue_outgoing_packet(_KEEPALIVE_PACKET)
 
             # Also go ahead and handle dropping the connection if we
             # haven't heard from the peer in a while.
@@ -852,21 +1309,7 @@ class RPCEndpoint:
                 raise RuntimeError('Response cannot be larger than 65535 bytes')
 
         # Now send back our response.
-        # Payload consists of type (1b), msgid (2b), len (2b), and data.
-        if len(response) > 65535:
-            self._enqueue_outgoing_packet(
-                _PacketType.RESPONSE_BIG.value.to_bytes(1, _BYTE_ORDER)
-                + message_id.to_bytes(2, _BYTE_ORDER)
-                + len(response).to_bytes(4, _BYTE_ORDER)
-                + response
-            )
-        else:
-            self._enqueue_outgoing_packet(
-                _PacketType.RESPONSE.value.to_bytes(1, _BYTE_ORDER)
-                + message_id.to_bytes(2, _BYTE_ORDER)
-                + len(response).to_bytes(2, _BYTE_ORDER)
-                + response
-            )
+        self._enqueue_outgoing_payload(message_id, response, is_response=True)
 
     async def _read_int_8(self) -> int:
         out = int.from_bytes(await self._reader.readexactly(1), _BYTE_ORDER)
@@ -906,22 +1349,530 @@ class RPCEndpoint:
         # This should always be the case if thread is the same.
         assert asyncio.get_running_loop() is self._event_loop
 
-    def _enqueue_outgoing_packet(self, data: bytes) -> None:
-        """Enqueue a raw packet to be sent. Must be called from our loop."""
+    def _enqueue_outgoing_packet(
+        self, header: bytes, payload: bytes | None = None
+    ) -> None:
+        """Enqueue a raw packet to be sent. Must be called from our loop.
+
+        Header and payload are kept as separate buffers so they can be
+        assembled into larger writes with a single copy.
+        """
         self._check_env()
 
         if self.debug_print_io:
             self.debug_print_call(
                 f'{self._label}: enqueueing outgoing packet'
-                f' {data[:50]!r} at {self._tm()}.'
+                f' {header!r} with payload size'
+                f' {0 if payload is None else len(payload)} at {self._tm()}.'
             )
 
         # Add the data and let our write task know about it.
-        self._out_packets.append(data)
+        self._out_buffers.append(header)
+        self._out_buffer_bytes += len(header)
+        if payload is not None:
+            self._out_buffers.append(payload)
+            self._out_buffer_bytes += len(payload)
+        self._out_packet_count += 1
+        self._update_send_queue_levels()
+        self._have_out_packets.set()
+
+    def _enqueue_outgoing_payload(
+        self, message_id: int, payload: bytes, is_response: bool
+    ) -> None:
+        """Enqueue a message/response, compressing it if worthwhile."""
+        compressed = False
+        threshold = self._compression_threshold
+        if (
+            threshold is not None
+            and len(payload) > threshold
+            and self._peer_info is not None
+            and 'zlib' in self._peer_info.compression
+        ):
+            # Large payloads get compressed a frame at a time as they
+            # go out so we never stall on compressing the whole thing
+            # here. Just check a sample up front to make sure it's
+            # worthwhile (incompressible data can grow; we send that
+            # as-is).
+            if len(payload) > self.FRAME_SIZE:
+                sample = payload[: self.FRAME_SIZE]
+                zsample = zlib.compress(sample, self.COMPRESSION_LEVEL)
+                if len(zsample) < len(sample):
+                    self._enqueue_outgoing_stream(
+                        _OutStream(
+                            message_id,
+                            payload,
+                            is_response,
+                            compress_level=self.COMPRESSION_LEVEL,
+                        )
+                    )
+                    return
+            else:
+                zpayload = zlib.compress(payload, self.COMPRESSION_LEVEL)
+                if len(zpayload) < len(payload):
+                    if self.debug_print_io:
+                        self.debug_print_call(
+                            f'{self._label}: compressed payload'
+                            f' from {len(payload)} to {len(zpayload)} bytes.'
+                        )
+                    payload = zpayload
+                    compressed = True
+
+        if len(payload) > self.FRAME_SIZE:
+            # Large payloads get sent in frames interleaved with other
+            # traffic (or in one big packet if our peer is too old for
+            # that).
+            self._enqueue_outgoing_stream(
+                _OutStream(message_id, payload, is_response)
+            )
+            return
+
+        if compressed:
+            ptype = (
+                _PacketType.RESPONSE_ZLIB
+                if is_response
+                else _PacketType.MESSAGE_ZLIB
+            )
+        else:
+            ptype = _PacketType.RESPONSE if is_response else _PacketType.MESSAGE
+        self._enqueue_outgoing_packet(
+            _HEADER.pack(ptype.value, message_id, len(payload)), payload
+        )
+
+    def _enqueue_outgoing_stream(self, stream: _OutStream) -> None:
+        """Enqueue a large message/response to be sent in frames."""
+        self._check_env()
+
+        if self.debug_print_io:
+            self.debug_print_call(
+                f'{self._label}: enqueueing outgoing stream'
+                f' of size {len(stream.data)} at {self._tm()}.'
+            )
+
+        self._out_streams.append(stream)
+        self._out_stream_bytes += stream.remaining
+        self._update_send_queue_levels()
         self._have_out_packets.set()
 
-    def _prune_tasks(self) -> None:
-        self._tasks = self._get_live_tasks()
+    def _take_out_buffers(self) -> list[bytes | memoryview]:
+        """Pull all buffers we should write next from our send queue.
+
+        This includes all individual packets plus at most around
+        FRAME_SIZE worth of frames from any in-progress streams. So
+        individual packets always take priority, and we round-robin
+        between streams. This bounds how long any packet can get stuck
+        behind large transfers.
+        """
+        buffers = self._out_buffers
+        nbytes = self._out_buffer_bytes
+        self._out_buffers = []
+        self._out_buffer_bytes = 0
+        self._out_packet_count = 0
+
+        # Streams need to know our peer's protocol, so they wait for its
+        # handshake.
+        streambytes = 0
+        while (
+            self._out_streams
+            and self._peer_info is not None
+            and streambytes < self.FRAME_SIZE
+        ):
+            stream = self._out_streams.popleft()
+            remaining = stream.remaining
+            packet = stream.next_packet(
+                self._peer_info.protocol, self.FRAME_SIZE
+            )
+            streambytes += remaining - stream.remaining
+            if not stream.done:
+                self._out_streams.append(stream)
+            if packet is not None:
+                header, payload = packet
+                buffers.append(header)
+                buffers.append(payload)
+                nbytes += len(header) + len(payload)
+
+        self._out_stream_bytes -= streambytes
+        self._total_bytes_written += nbytes
+        self._update_send_queue_levels()
+        return buffers
+
+    def _update_send_queue_levels(self) -> None:
+        """Update stats and backpressure state for our send queue."""
+        packets = self._out_packet_count + len(self._out_streams)
+        nbytes = self._out_buffer_bytes + self._out_stream_bytes
+        self._peak_out_packets = max(self._peak_out_packets, packets)
+        self._peak_out_bytes = max(self._peak_out_bytes, nbytes)
+
+        if not self._send_queue_full:
+            if (
+                nbytes > self._send_queue_high_water_bytes
+                or packets > self._send_queue_high_water_packets
+            ) and not self._closing:
+                self._send_queue_full = True
+
+                # Make some noise the first time this happens in case
+                # it's unexpected.
+                if not self._did_out_packets_buildup_warning:
+                    self._did_out_packets_buildup_warning = True
+                    logger.info(
+                        'Send queue for %s rpc over high watermark'
+                        ' (%d packets, %d bytes).',
+                        self._label,
+                        packets,
+                        nbytes,
+                    )
+        elif (
+            nbytes <= self._send_queue_low_water_bytes
+            and packets <= self._send_queue_low_water_packets
+        ):
+            self._send_queue_full = False
+            self._wake_send_queue_waiter()
+
+    def _wake_send_queue_waiter(self) -> None:
+        """Let the next backpressure waiter in line proceed (if any)."""
+        if self._send_queue_full:
+            return
+        while self._send_queue_waiters:
+            waiter = self._send_queue_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def _add_task(self, task: asyncio.Task) -> None:
+        """Keep track of a task so we can cancel it when we close."""
+        tasks = self._tasks
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
 
     def _get_live_tasks(self) -> list[asyncio.Task]:
         return [t for t in self._tasks if not t.done()]
+
+
+@dataclass
+class RPCPoolStats:
+    """Statistics for an :class:`RPCPool`."""
+
+    # Endpoints currently connected (out of the pool's size).
+    connected_endpoints: int
+
+    # Calls currently awaiting responses.
+    in_flight: int
+
+    # Calls completed successfully and calls that raised errors.
+    call_count: int
+    error_count: int
+
+    # Connections that went down and had to be re-established.
+    reconnect_count: int
+
+    # Histogram of successful call latencies (in seconds). Each count
+    # covers latencies up to the corresponding bound (and above the
+    # previous one); the final count covers everything beyond the last
+    # bound.
+    latency_bounds: list[float]
+    latency_counts: list[int]
+    latency_sum: float
+
+
+class _PoolSlot:
+    """A single connection maintained by an RPCPool."""
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.endpoint: RPCEndpoint | None = None
+        self.in_flight = 0
+        self.task: asyncio.Task | None = None
+
+
+class RPCPool:
+    """Maintains a set of :class:`RPCEndpoint` connections to a peer.
+
+    Calls are sent over whichever connected endpoint has the fewest
+    calls in flight. Endpoints that go down (due to keepalive timeouts,
+    communication errors, etc.) are reconnected in the background with
+    exponential backoff.
+
+    Call :meth:`start()` to begin connecting and :meth:`close()`
+    followed by :meth:`wait_closed()` to shut down.
+    """
+
+    # Upper bounds of our latency histogram buckets (in seconds).
+    LATENCY_BOUNDS = (
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+        5.0,
+        10.0,
+    )
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        label: str,
+        *,
+        size: int = 4,
+        handle_raw_message_call: (
+            Callable[[bytes], Awaitable[bytes]] | None
+        ) = None,
+        ssl: SSLContext | None = None,
+        connect_timeout: float = 10.0,
+        reconnect_min_delay: float = 0.5,
+        reconnect_max_delay: float = 30.0,
+        endpoint_kwargs: dict[str, Any] | None = None,
+    ) -> None:
+        if size < 1:
+            raise ValueError('size must be at least 1.')
+        if reconnect_min_delay > reconnect_max_delay:
+            raise ValueError(
+                'reconnect_min_delay cannot be larger than'
+                ' reconnect_max_delay.'
+            )
+        self._host = host
+        self._port = port
+        self._label = label
+        self._handle_raw_message_call = handle_raw_message_call
+        self._ssl = ssl
+        self._connect_timeout = connect_timeout
+        self._reconnect_min_delay = reconnect_min_delay
+        self._reconnect_max_delay = reconnect_max_delay
+        self._endpoint_kwargs = (
+            {} if endpoint_kwargs is None else endpoint_kwargs
+        )
+        self._slots = [_PoolSlot(i) for i in range(size)]
+        self._started = False
+        self._closing = False
+        self._have_endpoints = asyncio.Event()
+        self._call_count = 0
+        self._error_count = 0
+        self._reconnect_count = 0
+        self._latency_counts = [0] * (len(self.LATENCY_BOUNDS) + 1)
+        self._latency_sum = 0.0
+
+    def start(self) -> None:
+        """Begin connecting our endpoints."""
+        if self._started:
+            raise RuntimeError('start() can be called only once per pool.')
+        self._started = True
+        for slot in self._slots:
+            slot.task = asyncio.create_task(
+                self._run_slot(slot), name=f'{self._label} slot {slot.index}'
+            )
+
+    async def send_message(
+        self,
+        message: bytes,
+        timeout: float | None = None,
+        close_on_error: bool = True,
+    ) -> bytes:
+        """Send a message over one of our endpoints and return a response.
+
+        Waits for an endpoint to become available if none currently are
+        (counting against the timeout). Raises a CommunicationError if
+        the round trip is not completed for any reason. See
+        :meth:`RPCEndpoint.send_message()` for more details.
+        """
+        if timeout is None:
+            timeout = RPCEndpoint.DEFAULT_MESSAGE_TIMEOUT
+        starttime = time.monotonic()
+
+        slot = self._pick_slot()
+        if slot is None:
+            try:
+                async with asyncio.timeout(timeout):
+                    while slot is None:
+                        if self._closing:
+                            break
+                        await self._have_endpoints.wait()
+                        slot = self._pick_slot()
+
+                        # Our endpoints may have started closing since
+                        # the event was set; keep it accurate so we
+                        # don't spin.
+                        self._update_have_endpoints()
+            except TimeoutError:
+                pass
+            if slot is None:
+                self._error_count += 1
+                raise CommunicationError(
+                    f'{self._label}: no connected endpoints.'
+                )
+        endpoint = slot.endpoint
+        assert endpoint is not None
+
+        # If waiting used up our whole budget, bail now; sending with
+        # no time left would just time out and (by default) take down
+        # a perfectly healthy endpoint.
+        remaining = timeout - (time.monotonic() - starttime)
+        if remaining <= 0.0:
+            self._error_count += 1
+            raise CommunicationError(
+                f'{self._label}: timed out waiting for an endpoint.'
+            )
+
+        slot.in_flight += 1
+        try:
+            response = await endpoint.send_message(
+                message, timeout=remaining, close_on_error=close_on_error
+            )
+        except Exception:
+            self._error_count += 1
+            raise
+        finally:
+            slot.in_flight -= 1
+
+        latency = time.monotonic() - starttime
+        self._call_count += 1
+        self._latency_sum += latency
+        self._latency_counts[
+            bisect.bisect_left(self.LATENCY_BOUNDS, latency)
+        ] += 1
+        return response
+
+    def get_stats(self) -> RPCPoolStats:
+        """Return current statistics for the pool."""
+        return RPCPoolStats(
+            connected_endpoints=sum(
+                1
+                for slot in self._slots
+                if slot.endpoint is not None and not slot.endpoint.is_closing()
+            ),
+            in_flight=sum(slot.in_flight for slot in self._slots),
+            call_count=self._call_count,
+            error_count=self._error_count,
+            reconnect_count=self._reconnect_count,
+            latency_bounds=list(self.LATENCY_BOUNDS),
+            latency_counts=list(self._latency_counts),
+            latency_sum=self._latency_sum,
+        )
+
+    def close(self) -> None:
+        """Shut down all of our endpoints and stop reconnecting."""
+        if self._closing:
+            return
+        self._closing = True
+
+        # Wake anyone waiting on endpoints so they can error out.
+        self._have_endpoints.set()
+
+        for slot in self._slots:
+            if slot.endpoint is not None:
+                # Our slot task will exit once the endpoint finishes
+                # going down.
+                slot.endpoint.close()
+            elif slot.task is not None:
+                # We're connecting or waiting to reconnect; just stop.
+                slot.task.cancel()
+
+    def is_closing(self) -> bool:
+        """Have we begun the process of closing?"""
+        return self._closing
+
+    async def wait_closed(self) -> None:
+        """Wait for the pool to finish closing."""
+        if not self._closing:
+            raise RuntimeError('Must be called after close()')
+        await asyncio.gather(
+            *[slot.task for slot in self._slots if slot.task is not None],
+            return_exceptions=True,
+        )
+
+    def _pick_slot(self) -> _PoolSlot | None:
+        best: _PoolSlot | None = None
+        for slot in self._slots:
+            endpoint = slot.endpoint
+            if endpoint is None or endpoint.is_closing():
+                continue
+            if best is None or slot.in_flight < best.in_flight:
+                best = slot
+        return best
+
+    def _update_have_endpoints(self) -> None:
+        if self._closing or self._pick_slot() is not None:
+            self._have_endpoints.set()
+        else:
+            self._have_endpoints.clear()
+
+    async def _handle_unexpected_message(self, message: bytes) -> bytes:
+        raise RuntimeError(
+            f'{self._label}: got unexpected message of size {len(message)}'
+            ' (pool has no handle_raw_message_call).'
+        )
+
+    async def _run_slot(self, slot: _PoolSlot) -> None:
+        """Keep a single endpoint connected until we close."""
+        delay = self._reconnect_min_delay
+        connected = False
+        while not self.is_closing():
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(
+                        self._host, self._port, ssl=self._ssl
+                    ),
+                    timeout=self._connect_timeout,
+                )
+            except (OSError, TimeoutError) as exc:
+                logger.info(
+                    '%s: connect to %s:%d failed (%s); retrying in %.1fs.',
+                    self._label,
+                    self._host,
+                    self._port,
+                    exc,
+                    delay,
+                )
+                await self._backoff(delay)
+                delay = min(delay * 2.0, self._reconnect_max_delay)
+                continue
+
+            # Only count reconnects that actually succeed (not each
+            # failed attempt while backing off).
+            if connected:
+                self._reconnect_count += 1
+            handler = self._handle_raw_message_call
+            endpoint = slot.endpoint = RPCEndpoint(
+                (
+                    self._handle_unexpected_message
+                    if handler is None
+                    else handler
+                ),
+                reader,
+                writer,
+                f'{self._label} {slot.index}',
+                **self._endpoint_kwargs,
+            )
+            connected = True
+            self._update_have_endpoints()
+            connecttime = time.monotonic()
+            try:
+                await endpoint.run()
+            finally:
+                slot.endpoint = None
+                self._update_have_endpoints()
+
+            if self.is_closing():
+                break
+
+            # Connections that stayed up a good while reset our backoff;
+            # ones that keep dropping quickly back off further.
+            if time.monotonic() - connecttime >= self._reconnect_max_delay:
+                delay = self._reconnect_min_delay
+            logger.info(
+                '%s: endpoint %d went down; reconnecting in %.1fs.',
+                self._label,
+                slot.index,
+                delay,
+            )
+            await self._backoff(delay)
+            delay = min(delay * 2.0, self._reconnect_max_delay)
+
+    async def _backoff(self, delay: float) -> None:
+        # Add some jitter so a fleet of clients doesn't reconnect in
+        # lockstep.
+        await asyncio.sleep(delay * random.uniform(0.5, 1.0))
@@ -12,6 +12,7 @@ import tempfile
 import datetime
 import subprocess
 from pathlib import Path
+from dataclasses import dataclass
 from typing import TYPE_CHECKING
 
 from efro.error import CleanError
@@ -504,6 +505,22 @@ def _dirty_dep_check(
     return dirty
 
 
+# Don't bother sharding pylint runs with fewer dirty files than this per
+# process; startup and re-parsing shared deps would eat any gains.
+PYLINT_MIN_SHARD_SIZE = 8
+
+
+@dataclass
+class _PylintResult:
+    """The parts of a pylint run we care about (picklable)."""
+
+    msg_status: int
+    cycles: int
+    dependencies: dict[str, set[str]]
+    by_module: dict[str, dict[str, object]]
+    output: str = ''
+
+
 def _run_pylint(
     projroot: Path,
     pylintrc: Path | str,
@@ -511,33 +528,38 @@ def _run_pylint(
     dirtyfiles: list[str],
     allfiles: list[str] | None,
 ) -> dict[str, Any]:
-    from pylint import lint
     from efro.terminal import Clr
 
     start_time = time.monotonic()
-    args = ['--rcfile', str(pylintrc), '--output-format=colorized']
-
-    args += dirtyfiles
     name = f'{len(dirtyfiles)} file(s)'
-    run = lint.Run(args, exit=False)
+
+    shards = [] if cache is None else _shard_pylint_files(dirtyfiles, cache)
+    if len(shards) > 1:
+        result = _run_pylint_shards(str(pylintrc), shards)
+        name += f' in {len(shards)} shards'
+    else:
+        result = _run_pylint_files(
+            str(pylintrc), dirtyfiles, capture_output=False
+        )
+
     if cache is not None:
         assert allfiles is not None
-        result = _apply_pylint_run_to_cache(
-            projroot, run, dirtyfiles, allfiles, cache
+        errcount = _apply_pylint_run_to_cache(
+            projroot, result, dirtyfiles, allfiles, cache
         )
-        if result != 0:
-            raise CleanError(f'Pylint failed for {result} file(s).')
+        if errcount != 0:
+            raise CleanError(f'Pylint failed for {errcount} file(s).')
 
         # Sanity check: when the linter fails we should always be
         # failing too. If not, it means we're probably missing something
         # and incorrectly marking a failed file as clean.
-        if run.linter.msg_status != 0 and result == 0:
+        if result.msg_status != 0 and errcount == 0:
             raise RuntimeError(
                 'Pylint linter returned non-zero result'
                 ' but we did not; this is probably a bug.'
             )
     else:
-        if run.linter.msg_status != 0:
+        if result.msg_status != 0:
             raise CleanError('Pylint failed.')
 
     duration = time.monotonic() - start_time
@@ -549,26 +571,187 @@ def _run_pylint(
     return {'f': dirtyfiles, 't': duration}
 
 
-def _apply_pylint_run_to_cache(
-    projroot: Path,
-    run: Any,
-    dirtyfiles: list[str],
-    allfiles: list[str],
-    cache: FileCache,
-) -> int:
+def _run_pylint_files(
+    pylintrc: str, files: list[str], capture_output: bool = True
+) -> _PylintResult:
+    """Run pylint in-process on some files and return what we need."""
+    import io
+    import contextlib
+
+    from pylint import lint
+
+    args = ['--rcfile', pylintrc, '--output-format=colorized', *files]
+    if capture_output:
+        # Output from parallel runs would be interleaved garbage, so we
+        # capture it and print each run's output in one go when done.
+        outbuf = io.StringIO()
+        with contextlib.redirect_stdout(outbuf):
+            run = lint.Run(args, exit=False)
+        output = outbuf.getvalue()
+    else:
+        run = lint.Run(args, exit=False)
+        output = ''
+    stats = run.linter.stats
+    return _PylintResult(
+        msg_status=run.linter.msg_status,
+        cycles=stats.by_msg.get('cyclic-import', 0),
+        dependencies={key: set(val) for key, val in stats.dependencies.items()},
+        by_module={
+            key: dict(val.items()) for key, val in stats.by_module.items()
+        },
+        output=output,
+    )
+
+
+def _shard_pylint_files(
+    dirtyfiles: list[str], cache: FileCache
+) -> list[list[str]]:
+    """Split files into shards to be linted in parallel.
+
+    Files that import each other in a cycle (going by the deps in our
+    cache) are always kept in the same shard since pylint can only
+    detect cyclic imports between modules it lints together. Groups are
+    then spread over shards to balance total source size.
+    """
+    from multiprocessing import cpu_count
+
+    shardcount = min(cpu_count(), len(dirtyfiles) // PYLINT_MIN_SHARD_SIZE)
+    if shardcount < 2:
+        return [dirtyfiles]
+
+    dirtyset = set(dirtyfiles)
+    edges = {
+        fname: [
+            dep
+            for dep in cache.entries.get(fname, {}).get('deps', [])
+            if dep in dirtyset
+        ]
+        for fname in dirtyfiles
+    }
+    groups = _strongly_connected(dirtyfiles, edges)
+
+    # Greedily hand out the biggest groups first to the lightest shard.
+    sizes = {fname: os.path.getsize(fname) for fname in dirtyfiles}
+    groups.sort(key=lambda g: sum(sizes[f] for f in g), reverse=True)
+    shards: list[list[str]] = [[] for _ in range(shardcount)]
+    weights = [0] * shardcount
+    for group in groups:
+        index = weights.index(min(weights))
+        shards[index] += group
+        weights[index] += sum(sizes[f] for f in group)
+
+    # Keep our original (most recently modified first) order in each.
+    order = {fname: i for i, fname in enumerate(dirtyfiles)}
+    return [sorted(s, key=order.__getitem__) for s in shards if s]
+
+
+def _strongly_connected(
+    nodes: list[str], edges: dict[str, list[str]]
+) -> list[list[str]]:
+    """Return strongly connected components of a graph (Tarjan's)."""
     # pylint: disable=too-many-locals
-    # pylint: disable=too-many-branches
-    # pylint: disable=too-many-statements
+    index: dict[str, int] = {}
+    lowlink: dict[str, int] = {}
+    stack: list[str] = []
+    onstack: set[str] = set()
+    components: list[list[str]] = []
+
+    for root in nodes:
+        if root in index:
+            continue
+        # Iterative to avoid recursion limits on long import chains.
+        work: list[tuple[str, int]] = [(root, 0)]
+        while work:
+            node, edgeindex = work.pop()
+            if edgeindex == 0:
+                index[node] = lowlink[node] = len(index)
+                stack.append(node)
+                onstack.add(node)
+            nodeedges = edges.get(node, [])
+            if edgeindex < len(nodeedges):
+                work.append((node, edgeindex + 1))
+                target = nodeedges[edgeindex]
+                if target not in index:
+                    work.append((target, 0))
+                elif target in onstack:
+                    lowlink[node] = min(lowlink[node], index[target])
+                continue
+            if lowlink[node] == index[node]:
+                component: list[str] = []
+                while True:
+                    member = stack.pop()
+                    onstack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+    return components
 
-    from astroid import modutils
 
-    from efrotools.project import getprojectconfig
+def _run_pylint_shards(pylintrc: str, shards: list[list[str]]) -> _PylintResult:
+    """Lint shards in a process pool and merge the results."""
+    # pylint: disable=too-many-locals
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    result = _PylintResult(
+        msg_status=0, cycles=0, dependencies={}, by_module={}
+    )
+    with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+        futures = [
+            executor.submit(_run_pylint_files, pylintrc, shard)
+            for shard in shards
+        ]
+        for future in as_completed(futures):
+            shardresult = future.result()
+            print(shardresult.output, end='', flush=True)
+            _merge_pylint_result(result, shardresult)
+
+    # Our shards keep import cycles together going by the deps we knew
+    # about beforehand, but new imports may have created cycles spanning
+    # shards. Re-lint any of those together so pylint can see them.
+    shardindices = {
+        fname: i for i, shard in enumerate(shards) for fname in shard
+    }
+    names = _module_names(list(shardindices))
+    paths = {name: path for path, name in names.items()}
+    edges: dict[str, list[str]] = {}
+    for mname, importers in result.dependencies.items():
+        if mname in paths:
+            for importer in importers:
+                if importer in paths:
+                    edges.setdefault(paths[importer], []).append(paths[mname])
+    spanning = [
+        fname
+        for group in _strongly_connected(list(shardindices), edges)
+        if len({shardindices[f] for f in group}) > 1
+        for fname in group
+    ]
+    if spanning:
+        rerun = _run_pylint_files(pylintrc, spanning)
+        print(rerun.output, end='', flush=True)
+        _merge_pylint_result(result, rerun)
+    return result
+
+
+def _merge_pylint_result(result: _PylintResult, other: _PylintResult) -> None:
+    result.msg_status |= other.msg_status
+    result.cycles += other.cycles
+    for key, val in other.dependencies.items():
+        result.dependencies.setdefault(key, set()).update(val)
+
+    # Later results for a module (re-runs) replace earlier ones.
+    result.by_module.update(other.by_module)
+
+
+def _module_names(files: list[str]) -> dict[str, str]:
+    """Map file paths to the module names pylint knows them by."""
+    from astroid import modutils
 
-    # First off, build a map of dirtyfiles to module names (and the
-    # corresponding reverse map).
     paths_to_names: dict[str, str] = {}
-    names_to_paths: dict[str, str] = {}
-    for fname in allfiles:
+    for fname in files:
         try:
             mpath = modutils.modpath_from_file(fname)
             mpath = _filter_module_name('.'.join(mpath))
@@ -579,6 +762,26 @@ def _apply_pylint_run_to_cache(
             # (seems to be what pylint does)
             dummyname = os.path.splitext(os.path.basename(fname))[0]
             paths_to_names[fname] = dummyname
+    return paths_to_names
+
+
+def _apply_pylint_run_to_cache(
+    projroot: Path,
+    result: _PylintResult,
+    dirtyfiles: list[str],
+    allfiles: list[str],
+    cache: FileCache,
+) -> int:
+    # pylint: disable=too-many-locals
+    # pylint: disable=too-many-branches
+    # pylint: disable=too-many-statements
+
+    from efrotools.project import getprojectconfig
+
+    # First off, build a map of dirtyfiles to module names (and the
+    # corresponding reverse map).
+    paths_to_names = _module_names(allfiles)
+    names_to_paths: dict[str, str] = {}
     for key, val in paths_to_names.items():
         names_to_paths[val] = key
 
@@ -586,7 +789,7 @@ def _apply_pylint_run_to_cache(
     # don't want to add the logic to figure out which ones the cycles
     # cover since they all seems to appear as errors for the last file
     # in the list.
-    cycles: int = run.linter.stats.by_msg.get('cyclic-import', 0)
+    cycles = result.cycles
     have_dep_cycles: bool = cycles > 0
     if have_dep_cycles:
         print(f'Found {cycles} cycle-errors; keeping all dirty files dirty.')
@@ -599,8 +802,8 @@ def _apply_pylint_run_to_cache(
     reversedeps = {}
 
     # Make sure these are all proper module names; no foo.bar.__init__ stuff.
-    for key, val in run.linter.stats.dependencies.items():
-        sval = [_filter_module_name(m) for m in val]
+    for key, importers in result.dependencies.items():
+        sval = [_filter_module_name(m) for m in importers]
         reversedeps[_filter_module_name(key)] = sval
     deps: dict[str, set[str]] = {}
     untracked_deps = set()
@@ -738,8 +941,7 @@ def _apply_pylint_run_to_cache(
 
     # Once again need to convert any foo.bar.__init__ to foo.bar.
     stats_by_module: dict[str, Any] = {
-        _filter_module_name(key): val
-        for key, val in run.linter.stats.by_module.items()
+        _filter_module_name(key): val for key, val in result.by_module.items()
     }
     errcount = 0
 
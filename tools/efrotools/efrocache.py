@@ -1,5 +1,6 @@
 # Released under the MIT License. See LICENSE for details.
 #
+# pylint: disable=too-many-lines
 """A simple cloud caching system for making built binaries & assets.
 
 The basic idea here is the ballistica-internal project can flag file
@@ -7,6 +8,17 @@ targets in its Makefiles as 'cached', and the public version of those
 Makefiles will be filtered to contain cache downloads in place of the
 original build commands. Cached files are gathered and uploaded as part
 of the pubsync process.
+
+Large files can optionally be stored in chunked form (set
+EFROCACHE_CHUNKED=1 when running update_cache()). In that case the cache
+file for the entry is a small manifest listing content-defined chunks,
+which are stored by hash under a shared 'chunks' dir. Successive
+versions of a large file that differ only slightly then share most of
+their chunks, so only the changed ones need to be uploaded, downloaded,
+or stored locally. Chunked entries are hashed with their own header so
+they never share a cache file with a regular entry for the same data
+(older checkouts that only understand regular entries can always still
+fetch those).
 """
 
 from __future__ import annotations
@@ -15,7 +27,12 @@ import os
 import json
 import zlib
 import subprocess
+import threading
+import uuid
+import hashlib
+import functools
 from typing import TYPE_CHECKING, Annotated
+from contextlib import contextmanager
 from dataclasses import dataclass
 from multiprocessing import cpu_count
 from concurrent.futures import ThreadPoolExecutor
@@ -30,6 +47,10 @@ from efro.terminal import Clr
 
 
 if TYPE_CHECKING:
+    from typing import Callable, Iterator
+
+    import urllib3
+
     import efro.terminal
 
 
@@ -39,10 +60,34 @@ CACHE_MAP_NAME = '.efrocachemap'
 
 UPLOAD_STATE_CACHE_FILE = '.cache/efrocache_upload_state'
 
+# Max number of cache entries we fetch in parallel (and the size of our
+# http connection pool).
+MAX_FETCH_WORKERS = 16
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 256
+
 # Cache file consists of these header bytes, single metadata length byte,
 # metadata utf8 bytes, compressed data bytes.
 CACHE_HEADER = b'efca'
 
+# Chunked cache files have the same layout but with these header bytes
+# and a json chunk manifest in place of the compressed data.
+CHUNKED_CACHE_HEADER = b'efcc'
+
+# Dir (on the server and in our local cache) where chunks live.
+CHUNKS_DIR_NAME = 'chunks'
+
+# Files smaller than this are never chunked.
+CHUNKED_MIN_FILE_SIZE = 1024 * 1024
+
+# Chunk size bounds. Boundaries are placed where the rolling hash
+# matches CHUNK_MASK, giving an average chunk size of around
+# CHUNK_MIN_SIZE + 128k. Note that changing any of this will change
+# where boundaries fall and thus invalidate existing chunks.
+CHUNK_MIN_SIZE = 1024 * 32
+CHUNK_MAX_SIZE = 1024 * 512
+CHUNK_MASK = 0x1FFFF << 47
+
 
 @ioprepped
 @dataclass
@@ -52,9 +97,24 @@ class CacheMetadata:
     executable: Annotated[bool, IOAttrs('e')]
 
 
+@ioprepped
+@dataclass
+class CacheChunkManifest:
+    """Lists the chunks making up a chunked cache file, in order."""
+
+    chunks: Annotated[list[str], IOAttrs('c')]
+
+
 g_cache_prefix_noexec: bytes | None = None
 g_cache_prefix_exec: bytes | None = None
 
+g_cache_map: dict[str, str] | None = None
+g_cache_map_key: tuple[str, int, int] | None = None
+g_cache_map_lock = threading.Lock()
+
+g_http_pool: urllib3.PoolManager | None = None
+g_http_pool_lock = threading.Lock()
+
 
 def get_local_cache_dir() -> str:
     """Where we store local efrocache files we've downloaded.
@@ -89,8 +149,6 @@ def get_repository_base_url() -> str:
 
 def get_existing_file_hash(path: str) -> str:
     """Return the hash used for caching."""
-    import hashlib
-
     prefix = _cache_prefix_for_file(path)
     md5 = hashlib.md5()
     with open(path, 'rb') as infile:
@@ -98,6 +156,20 @@ def get_existing_file_hash(path: str) -> str:
     return md5.hexdigest()
 
 
+def _existing_file_matches(path: str, hashval: str) -> bool:
+    """Return whether an existing file matches a regular or chunked hash."""
+    prefix = _cache_prefix_for_file(path)
+    with open(path, 'rb') as infile:
+        data = infile.read()
+    for header in (CACHE_HEADER, CHUNKED_CACHE_HEADER):
+        md5 = hashlib.md5(header)
+        md5.update(prefix[4:])
+        md5.update(data)
+        if md5.hexdigest() == hashval:
+            return True
+    return False
+
+
 def _project_centric_path(path: str) -> str:
     """Convert something like foo/../bar to simply bar."""
 
@@ -113,23 +185,39 @@ def _project_centric_path(path: str) -> str:
     return abspath[len(projpath) :]
 
 
-def get_target(path: str, batch: bool, clr: type[efro.terminal.ClrBase]) -> str:
-    """Fetch a target path from the cache, downloading if need be."""
-    # pylint: disable=too-many-locals
-    # pylint: disable=too-many-statements
-    # pylint: disable=too-many-branches
-    import tempfile
+def get_cache_map() -> dict[str, str]:
+    """Return the contents of the cache map (assumes cwd is project root).
 
-    from efro.error import CleanError
+    The parsed map is kept around for the life of the process and only
+    re-read when the file's mtime or size changes, so long-lived
+    processes (pcommandbatch servers, etc.) don't have to re-parse it
+    for every target they fetch. Treat the returned dict as read-only.
+    """
+    # pylint: disable=global-statement
+    global g_cache_map, g_cache_map_key
 
-    output_lines: list[str] = []
+    mappath = os.path.abspath(CACHE_MAP_NAME)
+    with g_cache_map_lock:
+        stat = os.stat(mappath)
+        key = (mappath, stat.st_mtime_ns, stat.st_size)
+        if g_cache_map is None or g_cache_map_key != key:
+            with open(mappath, encoding='utf-8') as infile:
+                g_cache_map = json.loads(infile.read())
+            g_cache_map_key = key
+        return g_cache_map
 
-    local_cache_dir = get_local_cache_dir()
 
-    path = _project_centric_path(path)
+@dataclass
+class _CacheEntry:
+    """A resolved cache-map entry for a target path."""
+
+    path: str
+    hashval: str
+    subpath: str
+
 
-    with open(CACHE_MAP_NAME, encoding='utf-8') as infile:
-        efrocachemap = json.loads(infile.read())
+def _resolve_entry(path: str, efrocachemap: dict[str, str]) -> _CacheEntry:
+    path = _project_centric_path(path)
     if path not in efrocachemap:
         raise RuntimeError(f'Path not found in efrocache: {path}')
 
@@ -139,27 +227,102 @@ def get_target(path: str, batch: bool, clr: type[efro.terminal.ClrBase]) -> str:
     assert not hashval.startswith('https:')
     assert '/' not in hashval
 
+    return _CacheEntry(
+        path=path, hashval=hashval, subpath=_subpath_from_hash(hashval)
+    )
+
+
+def _subpath_from_hash(hashval: str) -> str:
     # If our hash is 'abcdefghijkl', our subpath is 'ab/cd/efghijkl'.
-    subpath = '/'.join([hashval[:2], hashval[2:4], hashval[4:]])
+    return '/'.join([hashval[:2], hashval[2:4], hashval[4:]])
+
+
+def get_target(path: str, batch: bool, clr: type[efro.terminal.ClrBase]) -> str:
+    """Fetch a target path from the cache, downloading if need be."""
+    output_lines: list[str] = []
+    entry = _resolve_entry(path, get_cache_map())
+    _fetch_entry(
+        entry,
+        repo=get_repository_base_url(),
+        local_cache_dir=get_local_cache_dir(),
+        emit=output_lines.append if batch else print,
+        clr=clr,
+    )
+    return '\n'.join(output_lines)
+
+
+def get_targets(
+    paths: list[str], batch: bool, clr: type[efro.terminal.ClrBase]
+) -> str:
+    """Fetch many target paths from the cache, downloading if need be.
+
+    All paths are resolved against the cache map up front (so a bad
+    path fails before any work is done) and are then refreshed,
+    downloaded, and extracted in parallel using a bounded thread pool.
+    Output is returned in the order paths were passed.
+    """
+    efrocachemap = get_cache_map()
+    entries: dict[str, _CacheEntry] = {}
+    for path in paths:
+        entry = _resolve_entry(path, efrocachemap)
+        entries.setdefault(entry.path, entry)
+    if not entries:
+        return ''
 
     repo = get_repository_base_url()
-    url = f'{repo}/{subpath}'
+    local_cache_dir = get_local_cache_dir()
+
+    # Targets with identical contents share a hash; handle those in a
+    # single job so we don't download the same cache file twice at once.
+    groups: dict[str, list[_CacheEntry]] = {}
+    for entry in entries.values():
+        groups.setdefault(entry.hashval, []).append(entry)
+
+    outputs: dict[str, list[str]] = {path: [] for path in entries}
+
+    def _fetch_group(group: list[_CacheEntry]) -> None:
+        for gentry in group:
+            _fetch_entry(
+                gentry,
+                repo=repo,
+                local_cache_dir=local_cache_dir,
+                emit=outputs[gentry.path].append if batch else print,
+                clr=clr,
+            )
 
-    local_cache_path = os.path.join(local_cache_dir, subpath)
+    # This is mostly network and disk bound so go a bit wider than our
+    # core count, but keep it bounded to be nice to the server.
+    max_workers = min(len(groups), cpu_count() * 2, MAX_FETCH_WORKERS)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Converting to a list propagates any errors.
+        list(executor.map(_fetch_group, groups.values()))
+
+    return '\n'.join(line for lines in outputs.values() for line in lines)
+
+
+def _fetch_entry(
+    entry: _CacheEntry,
+    repo: str,
+    local_cache_dir: str,
+    emit: Callable[[str], None],
+    clr: type[efro.terminal.ClrBase],
+) -> None:
+    """Refresh, download, and/or extract a single resolved entry."""
+    # pylint: disable=too-many-locals
+    from efro.error import CleanError
+
+    path = entry.path
+    url = f'{repo}/{entry.subpath}'
+    local_cache_path = os.path.join(local_cache_dir, entry.subpath)
 
     # First off: if there's already a file in place, check its hash. If
     # its calced hash matches the hash-map's value for it, we can just
     # update its timestamp and call it a day.
     if os.path.isfile(path):
-        existing_hash = get_existing_file_hash(path)
-        if existing_hash == hashval:
+        if _existing_file_matches(path, entry.hashval):
             os.utime(path, None)
-            msg = f'Refreshing from cache: {path}'
-            if batch:
-                output_lines.append(msg)
-            else:
-                print(msg)
-            return '\n'.join(output_lines)
+            emit(f'Refreshing from cache: {path}')
+            return
 
     # Ok we need to download the cache file.
     # Ok there's not a valid file in place already. Clear out whatever
@@ -169,87 +332,233 @@ def get_target(path: str, batch: bool, clr: type[efro.terminal.ClrBase]) -> str:
 
     # Now, if we don't have this entry in our local cache, download it.
     if not os.path.exists(local_cache_path):
-        with tempfile.TemporaryDirectory() as tmpdir:
-            local_cache_dl_path = os.path.join(tmpdir, 'dl')
-            msg = f'Downloading: {clr.BLU}{path}{clr.RST}'
-            if batch:
-                output_lines.append(msg)
-            else:
-                print(msg)
-            result = subprocess.run(
-                [
-                    'curl',
-                    '--fail',
-                    '--silent',
-                    url,
-                    '--output',
-                    local_cache_dl_path,
-                ],
-                check=False,
-            )
-
-            # We prune old cache files on the server, so its possible for
-            # one to be trying to build something the server can no longer
-            # provide. try to explain the situation.
-            if result.returncode == 22:
-                raise CleanError(
-                    'Server gave an error. Old build files may no longer'
-                    ' be available on the server; make sure you are using'
-                    ' a recent commit.\n'
-                    'Note that build files will remain available'
-                    ' indefinitely once downloaded, even if deleted by the'
-                    f' server. So as long as your {local_cache_dir} directory'
-                    ' stays intact you should be able to repeat any builds you'
-                    ' have run before.'
-                )
-            if result.returncode != 0:
-                raise CleanError('Download failed; is your internet working?')
-
-            # Ok; cache download finished. Lastly move it in place to be
-            # as atomic as possible.
-            os.makedirs(os.path.dirname(local_cache_path), exist_ok=True)
-            subprocess.run(
-                ['mv', local_cache_dl_path, local_cache_path], check=True
-            )
+        emit(f'Downloading: {clr.BLU}{path}{clr.RST}')
+        _download(url, local_cache_path, local_cache_dir)
 
     # Ok we should have a valid file in our cache dir at this point.
     # Just expand it to the target path.
 
-    msg = f'Extracting: {path}'
-    if batch:
-        output_lines.append(msg)
-    else:
-        print(msg)
-
-    # Extract and stage the file in a temp dir before doing a final move
-    # to the target location to be as atomic as possible.
-    with tempfile.TemporaryDirectory() as tmpdir:
-        with open(local_cache_path, 'rb') as infileb:
-            data = infileb.read()
-        header = data[:4]
-        if header != CACHE_HEADER:
-            raise RuntimeError('Invalid cache header.')
-        metalen = data[4]
-        metabytes = data[5 : 5 + metalen]
-        datac = data[5 + metalen :]
-        metajson = metabytes.decode()
-        metadata = dataclass_from_json(CacheMetadata, metajson)
+    emit(f'Extracting: {path}')
+
+    with open(local_cache_path, 'rb') as infileb:
+        data = infileb.read()
+    header = data[:4]
+    if header not in (CACHE_HEADER, CHUNKED_CACHE_HEADER):
+        raise RuntimeError('Invalid cache header.')
+    metalen = data[4]
+    metabytes = data[5 : 5 + metalen]
+    datac = data[5 + metalen :]
+    metajson = metabytes.decode()
+    metadata = dataclass_from_json(CacheMetadata, metajson)
+    if header == CACHE_HEADER:
         data = zlib.decompress(datac)
+    else:
+        data = _assemble_chunks(
+            dataclass_from_json(CacheChunkManifest, datac.decode()),
+            repo=repo,
+            local_cache_dir=local_cache_dir,
+            emit=emit,
+            clr=clr,
+            path=path,
+        )
+
+        # Our chunks are verified only by name so make sure the end
+        # result is what we expect before putting it in place.
+        md5 = hashlib.md5()
+        md5.update(CHUNKED_CACHE_HEADER + bytes([metalen]) + metabytes)
+        md5.update(data)
+        if md5.hexdigest() != entry.hashval:
+            raise CleanError(
+                f'Chunked cache entry for {path} did not match its hash;'
+                f' try clearing {local_cache_dir}/{CHUNKS_DIR_NAME}.'
+            )
 
-        tmppath = os.path.join(tmpdir, 'out')
+    # Write the file next to its final location before doing a final
+    # move into place to be as atomic as possible.
+    with _staged_file(path) as tmppath:
         with open(tmppath, 'wb') as outfile:
             outfile.write(data)
         if metadata.executable:
-            subprocess.run(['chmod', '+x', tmppath], check=True)
-
-        # Ok; we wrote the file. Now move it into its final place.
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        subprocess.run(['mv', tmppath, path], check=True)
+            # Equivalent of 'chmod +x'; add exec wherever we have read.
+            mode = os.stat(tmppath).st_mode
+            os.chmod(tmppath, mode | (mode & 0o444) >> 2)
 
     if not os.path.exists(path):
         raise RuntimeError(f'File {path} did not wind up as expected.')
 
-    return '\n'.join(output_lines)
+
+def _assemble_chunks(
+    manifest: CacheChunkManifest,
+    *,
+    repo: str,
+    local_cache_dir: str,
+    emit: Callable[[str], None],
+    clr: type[efro.terminal.ClrBase],
+    path: str,
+) -> bytes:
+    """Return the data for a chunked entry, downloading chunks as needed."""
+    chunkpaths = {
+        chash: os.path.join(
+            local_cache_dir, CHUNKS_DIR_NAME, _path_from_hash(chash)
+        )
+        for chash in manifest.chunks
+    }
+    missing = [
+        chash
+        for chash, cpath in chunkpaths.items()
+        if not os.path.exists(cpath)
+    ]
+    if missing:
+        emit(
+            f'Downloading: {clr.BLU}{path}{clr.RST}'
+            f' ({len(missing)} of {len(chunkpaths)} chunks)'
+        )
+
+        def _download_chunk(chash: str) -> None:
+            _download(
+                f'{repo}/{CHUNKS_DIR_NAME}/{_subpath_from_hash(chash)}',
+                chunkpaths[chash],
+                local_cache_dir,
+            )
+
+        with ThreadPoolExecutor(
+            max_workers=min(len(missing), MAX_FETCH_WORKERS)
+        ) as executor:
+            # Converting to a list propagates any errors.
+            list(executor.map(_download_chunk, missing))
+
+    parts: list[bytes] = []
+    for chash in manifest.chunks:
+        with open(chunkpaths[chash], 'rb') as infile:
+            parts.append(zlib.decompress(infile.read()))
+    return b''.join(parts)
+
+
+@functools.cache
+def _get_gear_table() -> list[int]:
+    # Fixed pseudo-random 64 bit values for each byte value. These must
+    # never change (see CHUNK_MASK).
+    return [
+        int.from_bytes(hashlib.md5(bytes([i])).digest()[:8], 'little')
+        for i in range(256)
+    ]
+
+
+def _chunk_ends(data: bytes) -> list[int]:
+    """Return content-defined chunk end offsets for some data.
+
+    Uses a 'gear' rolling hash; since each byte shifts the hash left by
+    one, the high bits we test against depend only on the last 64 or so
+    bytes, so boundaries stay put when data elsewhere changes. We skip
+    hashing the first CHUNK_MIN_SIZE bytes of each chunk since no
+    boundary can fall there anyway.
+    """
+    gear = _get_gear_table()
+    mask = CHUNK_MASK
+    ends: list[int] = []
+    pos = 0
+    datalen = len(data)
+    while datalen - pos > CHUNK_MIN_SIZE:
+        start = pos + CHUNK_MIN_SIZE
+        end = min(pos + CHUNK_MAX_SIZE, datalen)
+        hval = 0
+        i = start
+        for byte in data[start:end]:
+            i += 1
+            hval = ((hval << 1) + gear[byte]) & 0xFFFFFFFFFFFFFFFF
+            if not hval & mask:
+                end = i
+                break
+        ends.append(end)
+        pos = end
+    if pos < datalen:
+        ends.append(datalen)
+    return ends
+
+
+@contextmanager
+def _staged_file(path: str) -> Iterator[str]:
+    """Provide a temp path that gets moved atomically to path on success.
+
+    The temp file lives in the same directory as the final path so the
+    final os.replace() never has to cross filesystems.
+    """
+    dirname = os.path.dirname(path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    tmppath = os.path.join(
+        dirname, f'.{os.path.basename(path)}.{uuid.uuid4().hex}.tmp'
+    )
+    try:
+        yield tmppath
+        os.replace(tmppath, path)
+    finally:
+        if os.path.exists(tmppath):
+            os.remove(tmppath)
+
+
+def _get_http_pool() -> urllib3.PoolManager:
+    """Return our shared http connection pool (creating if need be).
+
+    Connections are kept alive and reused between downloads, so
+    fetching lots of files only pays for connection/TLS setup once per
+    worker thread instead of once per file.
+    """
+    # pylint: disable=global-statement
+    global g_http_pool
+    import urllib3
+
+    with g_http_pool_lock:
+        if g_http_pool is None:
+            g_http_pool = urllib3.PoolManager(
+                maxsize=MAX_FETCH_WORKERS,
+                block=True,
+                retries=urllib3.Retry(
+                    total=3, status=0, redirect=3, backoff_factor=0.25
+                ),
+                timeout=urllib3.Timeout(connect=10.0, read=60.0),
+            )
+        return g_http_pool
+
+
+def _download(url: str, local_cache_path: str, local_cache_dir: str) -> None:
+    """Download a cache file from the server into our local cache."""
+    import urllib3
+
+    from efro.error import CleanError
+
+    try:
+        with _staged_file(local_cache_path) as tmppath:
+            response = _get_http_pool().request(
+                'GET', url, preload_content=False
+            )
+            try:
+                # We prune old cache files on the server, so its
+                # possible for one to be trying to build something the
+                # server can no longer provide. try to explain the
+                # situation.
+                if response.status >= 400:
+                    raise CleanError(
+                        f'Server gave an error ({response.status}).'
+                        ' Old build files may no longer'
+                        ' be available on the server; make sure you are'
+                        ' using a recent commit.\n'
+                        'Note that build files will remain available'
+                        ' indefinitely once downloaded, even if deleted by'
+                        ' the server. So as long as your'
+                        f' {local_cache_dir} directory stays intact you'
+                        ' should be able to repeat any builds you have'
+                        ' run before.'
+                    )
+                with open(tmppath, 'wb') as outfile:
+                    for chunk in response.stream(DOWNLOAD_CHUNK_SIZE):
+                        outfile.write(chunk)
+            finally:
+                response.release_conn()
+    except urllib3.exceptions.HTTPError as exc:
+        raise CleanError(
+            f'Download failed ({exc}); is your internet working?'
+        ) from exc
 
 
 def filter_makefile(makefile_dir: str, contents: str) -> str:
@@ -449,8 +758,6 @@ def update_cache(makefile_dirs: list[str]) -> None:
 
 
 def _gen_complete_state_hashes(fnames: list[str]) -> str:
-    import hashlib
-
     def _get_simple_file_hash(fname: str) -> tuple[str, str]:
         md5 = hashlib.md5()
         with open(fname, mode='rb') as infile:
@@ -554,27 +861,33 @@ def _gather_cache_files(
     mapping_file: str,
 ) -> None:
     # pylint: disable=too-many-locals
-    import functools
-
     fhashpaths_all: set[str] = set()
     names_to_hashes: dict[str, str] = {}
-    names_to_hashpaths: dict[str, str] = {}
-    writecall = functools.partial(_write_cache_file, staging_dir)
+    names_to_hashpaths: dict[str, list[str]] = {}
+    chunked = os.environ.get('EFROCACHE_CHUNKED') == '1'
+    if chunked:
+        print(f'{Clr.SBLU}Storing large files in chunked form.{Clr.RST}')
+    writecall = functools.partial(
+        _write_cache_file, staging_dir, chunked=chunked
+    )
 
-    # Calc hashes and hash-paths for all cache files.
+    # Calc hashes and hash-paths for all cache files (plus the paths of
+    # any chunks they use, which need to travel with them).
     with ThreadPoolExecutor(max_workers=cpu_count()) as executor:
-        for fname, fhash, fhashpath in executor.map(writecall, fnames_all):
+        for fname, fhash, fhashpath, chunkpaths in executor.map(
+            writecall, fnames_all
+        ):
             names_to_hashes[fname] = fhash
-            names_to_hashpaths[fname] = fhashpath
-            fhashpaths_all.add(fhashpath)
+            names_to_hashpaths[fname] = [fhashpath, *chunkpaths]
+            fhashpaths_all.update(names_to_hashpaths[fname])
 
     # Now calc hashpaths for our starter file sets.
     fhashpaths_starter_gui: set[str] = set()
     for fname in fnames_starter_gui:
-        fhashpaths_starter_gui.add(names_to_hashpaths[fname])
+        fhashpaths_starter_gui.update(names_to_hashpaths[fname])
     fhashpaths_starter_server: set[str] = set()
     for fname in fnames_starter_server:
-        fhashpaths_starter_server.add(names_to_hashpaths[fname])
+        fhashpaths_starter_server.update(names_to_hashpaths[fname])
 
     # We want the server to have a startercache(server).tar.xz files
     # which contain the entire subsets we were passed. It is much more
@@ -632,9 +945,10 @@ def _path_from_hash(hashstr: str) -> str:
     return os.path.join(hashstr[:2], hashstr[2:4], hashstr[4:])
 
 
-def _write_cache_file(staging_dir: str, fname: str) -> tuple[str, str, str]:
-    import hashlib
-
+def _write_cache_file(
+    staging_dir: str, fname: str, chunked: bool = False
+) -> tuple[str, str, str, list[str]]:
+    # pylint: disable=too-many-locals
     print(f'Caching {fname}')
 
     prefix = _cache_prefix_for_file(fname)
@@ -642,6 +956,13 @@ def _write_cache_file(staging_dir: str, fname: str) -> tuple[str, str, str]:
     with open(fname, 'rb') as infile:
         fdataraw = infile.read()
 
+    # Chunked entries get their own header, which is included in their
+    # hash. This keeps them from ever replacing a regular cache file
+    # for the same data which older checkouts may still be fetching.
+    chunked = chunked and len(fdataraw) >= CHUNKED_MIN_FILE_SIZE
+    if chunked:
+        prefix = CHUNKED_CACHE_HEADER + prefix[4:]
+
     # Calc a hash of the prefix plus the raw file contents. We want to
     # hash the *uncompressed* file since we'll need to calc this for
     # lots of existing files when seeing if they need to be updated.
@@ -655,10 +976,38 @@ def _write_cache_file(staging_dir: str, fname: str) -> tuple[str, str, str]:
     path = os.path.join(staging_dir, hashpath)
     os.makedirs(os.path.dirname(path), exist_ok=True)
 
+    if not chunked:
+        with open(path, 'wb') as outfile:
+            outfile.write(prefix + zlib.compress(fdataraw))
+        return fname, finalhash, hashpath, []
+
+    # Chunked form: store each chunk by the hash of its raw contents
+    # (shared across all entries) and write a manifest listing them.
+    chunkhashes: list[str] = []
+    chunkhashpaths: list[str] = []
+    pos = 0
+    for end in _chunk_ends(fdataraw):
+        chunk = fdataraw[pos:end]
+        pos = end
+        chunkhash = hashlib.md5(chunk).hexdigest()
+        chunkhashpath = os.path.join(
+            CHUNKS_DIR_NAME, _path_from_hash(chunkhash)
+        )
+        chunkhashes.append(chunkhash)
+        chunkhashpaths.append(chunkhashpath)
+
+        # Other files (or this one) may share this chunk.
+        chunkpath = os.path.join(staging_dir, chunkhashpath)
+        if not os.path.exists(chunkpath):
+            with _staged_file(chunkpath) as tmppath:
+                with open(tmppath, 'wb') as outfile:
+                    outfile.write(zlib.compress(chunk))
+
+    manifest = dataclass_to_json(CacheChunkManifest(chunks=chunkhashes))
     with open(path, 'wb') as outfile:
-        outfile.write(prefix + zlib.compress(fdataraw))
+        outfile.write(prefix + manifest.encode())
 
-    return fname, finalhash, hashpath
+    return fname, finalhash, hashpath, sorted(set(chunkhashpaths))
 
 
 def _cache_prefix_for_file(fname: str) -> bytes:
@@ -714,7 +1063,7 @@ def _check_warm_start_entry(entry: tuple[str, str]) -> None:
 
     # If the file still matches the hash value we have for it,
     # go ahead and update its timestamp.
-    if get_existing_file_hash(fname) == filehash:
+    if _existing_file_matches(fname, filehash):
         os.utime(fname, None)
 
 
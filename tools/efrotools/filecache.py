@@ -6,13 +6,16 @@ from __future__ import annotations
 
 import json
 import os
+import time
 from typing import TYPE_CHECKING
+from multiprocessing import cpu_count
+from concurrent.futures import ThreadPoolExecutor
 
 # Pylint's preferred import order here seems non-deterministic (as of 2.10.1).
 # pylint: disable=useless-suppression
 # pylint: disable=wrong-import-order
 from efro.terminal import Clr
-from efrotools.util import get_files_hash
+from efrotools.util import get_files_hash, get_string_hash
 
 # pylint: enable=wrong-import-order
 # pylint: enable=useless-suppression
@@ -23,7 +26,17 @@ if TYPE_CHECKING:
 
 
 class FileCache:
-    """A cache of file hashes/etc. used in linting/formatting/etc."""
+    """A cache of file hashes/etc. used in linting/formatting/etc.
+
+    Along with its hash, each entry stores the size, mtime, and inode
+    its file had when last hashed; files are only re-read and re-hashed
+    when those change.
+    """
+
+    # Don't trust stat info for files modified this recently (in
+    # nanoseconds) when we hash them; a further change within the same
+    # mtime tick could otherwise go unnoticed.
+    RACY_WINDOW_NS = 2_000_000_000
 
     def __init__(self, path: Path):
         self._path = path
@@ -44,31 +57,54 @@ class FileCache:
         files will be cleared as well.
         """
 
-        # First, completely prune entries for nonexistent files.
+        filenameset = set(filenames)
+
+        # First, completely prune entries for nonexistent files or
+        # ones not in our passed list.
         self.entries = {
             path: val
             for path, val in self.entries.items()
-            if os.path.isfile(path)
-        }
-
-        # Also remove any not in our passed list.
-        self.entries = {
-            path: val for path, val in self.entries.items() if path in filenames
+            if path in filenameset and os.path.isfile(path)
         }
 
-        # Add empty entries for files that lack them.
-        # Also check and store current hashes for all files and clear
-        # any entry hashes that differ so we know they're dirty.
+        # Add empty entries for files that lack them. Also stat all
+        # files and gather the ones whose contents need to be hashed.
+        stats: dict[str, list[int]] = {}
+        tohash: list[str] = []
         for filename in filenames:
-            if filename not in self.entries:
-                self.entries[filename] = {}
-            self.curhashes[filename] = curhash = get_files_hash(
-                [filename], extrahash
-            )
+            entry = self.entries.setdefault(filename, {})
+            stat = os.stat(filename)
+            stats[filename] = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
             # Also store modtimes; we'll abort cache writes if
             # anything changed.
-            self.mtimes[filename] = os.path.getmtime(filename)
+            self.mtimes[filename] = stat.st_mtime
+            if entry.get('stat') != stats[filename] or 'chash' not in entry:
+                tohash.append(filename)
+
+        # Hash contents for anything that changed (using all procs).
+        if tohash:
+            with ThreadPoolExecutor(max_workers=cpu_count()) as executor:
+                chashes = executor.map(
+                    lambda fname: get_files_hash([fname]), tohash
+                )
+                now = time.time_ns()
+                for filename, chash in zip(tohash, chashes):
+                    entry = self.entries[filename]
+                    entry['chash'] = chash
+                    if now - stats[filename][1] > self.RACY_WINDOW_NS:
+                        entry['stat'] = stats[filename]
+                    else:
+                        entry.pop('stat', None)
+
+        # Now calc current hashes for all files (incorporating
+        # extrahash) and clear any entry hashes that differ so we know
+        # they're dirty.
+        for filename in filenames:
             entry = self.entries[filename]
+            self.curhashes[filename] = curhash = get_string_hash(
+                entry['chash'] + extrahash
+            )
             if 'hash' in entry and entry['hash'] != curhash:
                 del entry['hash']
 